@@ -0,0 +1,159 @@
+import logging
+import os
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import pyarrow.orc
+except ImportError:
+    pass   # orc is not built into every pyarrow wheel (e.g. windows)
+
+# Columnar file types read through arrow, they carry their own column types so they are not sniffed
+columnar_extensions = ['.parquet', '.pq', '.feather', '.arrow', '.orc']
+
+# Bytes of a csv file parsed per block (and per thread)
+csv_block_size = 16 * 1024 * 1024
+
+
+# Tells if arrow can be used, logs a warning when it can not
+def is_available():
+    if pyarrow is None:
+        logging.warning('pyarrow is not installed, arrow reader engine and columnar files are not available')
+        return False
+    return True
+
+# This function returns a dataframe read from a columnar (parquet, feather, orc) file with arrow backed dtypes.
+# Only the given columns are read when columns is set, all threads are used to decode the file.
+def read_columnar_file(file_path, columns=None):
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension in ['.parquet', '.pq']:
+        table = pyarrow.parquet.read_table(file_path, columns=columns, use_threads=True, memory_map=True)
+    elif file_extension in ['.feather', '.arrow']:
+        table = pyarrow.feather.read_table(file_path, columns=columns, use_threads=True, memory_map=True)
+    else:
+        table = pyarrow.orc.ORCFile(file_path).read(columns=columns)
+
+    return to_dataframe(table)
+
+# Reader that gives a columnar file as dataframes, one per parquet row group (in batches of batch_size rows), feather record batch or orc stripe.
+# It is used like a pandas chunk reader.
+class ColumnarReader:
+    def __init__(self, file_path, columns=None, batch_size=100000):
+        self.file_path = file_path
+        self.columns = columns
+        self.batch_size = batch_size
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        file_extension = os.path.splitext(self.file_path)[1].lower()
+
+        if file_extension in ['.parquet', '.pq']:
+            self.file = pyarrow.parquet.ParquetFile(self.file_path, memory_map=True)
+            for batch in self.file.iter_batches(batch_size=self.batch_size, columns=self.columns, use_threads=True):
+                yield to_dataframe(batch)
+
+        elif file_extension in ['.feather', '.arrow']:
+            self.file = pyarrow.memory_map(self.file_path)
+            batches = pyarrow.ipc.open_file(self.file)
+            for i in range(batches.num_record_batches):
+                batch = batches.get_batch(i)
+                yield to_dataframe(batch.select(self.columns) if self.columns is not None else batch)
+
+        else:
+            orc_file = pyarrow.orc.ORCFile(self.file_path)
+            for i in range(orc_file.nstripes):
+                yield to_dataframe(orc_file.read_stripe(i, columns=self.columns))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# Arrow csv options from a sniffed dialect. The encoding is transcoded by arrow, a utf-8 byte order mark is skipped by arrow itself.
+def get_csv_options(dialect, column_names=None):
+    encoding = 'utf8' if dialect['encoding'] in ['utf-8', 'utf-8-sig'] else dialect['encoding']
+
+    read_options = pyarrow.csv.ReadOptions(use_threads=True
+                                           , block_size=csv_block_size
+                                           , encoding=encoding
+                                           , column_names=column_names)
+    parse_options = pyarrow.csv.ParseOptions(delimiter=dialect['delimiter']
+                                             , quote_char=dialect['quotechar']
+                                             , newlines_in_values=True)
+    convert_options = pyarrow.csv.ConvertOptions(strings_can_be_null=True)
+
+    return {'read_options': read_options, 'parse_options': parse_options, 'convert_options': convert_options}
+
+# Read a whole csv file (path or file object) with arrow's multi-threaded parser
+def read_csv(source, csv_options):
+    return to_dataframe(pyarrow.csv.read_csv(source, **csv_options))
+
+# Reader that parses a csv file (path or file object) block by block with arrow and gives a dataframe per block, used like a pandas chunk reader
+class CsvReader:
+    def __init__(self, source, csv_options):
+        self.reader = pyarrow.csv.open_csv(source, **csv_options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for batch in self.reader:
+            yield to_dataframe(batch)
+
+    def close(self):
+        self.reader.close()
+
+# Arrow table (or record batch) to dataframe. Text is kept in arrow memory as string[pyarrow], other columns get arrow backed dtypes.
+def to_dataframe(table):
+    return table.to_pandas(types_mapper=get_pandas_dtype)
+
+def get_pandas_dtype(arrow_type):
+    if pyarrow.types.is_string(arrow_type) or pyarrow.types.is_large_string(arrow_type):
+        return pd.StringDtype('pyarrow')
+    return pd.ArrowDtype(arrow_type)
+
+# Column projection: the columns of a columnar file that are read. Once a table has recorded columns only those are read,
+# columns of the file the table does not have are left out (and logged).
+def get_projection(file_path, table_schema):
+    if table_schema is None:
+        return None
+
+    file_columns = get_columnar_file_columns(file_path)
+    recorded_columns = {column.lower() for column in table_schema['columns']}
+    projection = [column for column in file_columns if column.strip().lower() in recorded_columns]
+
+    if len(projection) != len(recorded_columns):
+        return None   # file misses some columns of the table, read it as it is
+    if len(projection) != len(file_columns):
+        logging.warning('Columns %s of %s are not in the table and are not loaded', [column for column in file_columns if column not in projection], file_path)
+
+    return projection
+
+# Column names from the schema of a columnar file, without reading its data
+def get_columnar_file_columns(file_path):
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension in ['.parquet', '.pq']:
+        return pyarrow.parquet.read_schema(file_path, memory_map=True).names
+    if file_extension in ['.feather', '.arrow']:
+        with pyarrow.memory_map(file_path) as source:
+            return pyarrow.ipc.open_file(source).schema.names
+    return pyarrow.orc.ORCFile(file_path).schema.names
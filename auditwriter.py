@@ -0,0 +1,117 @@
+import collections
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+import sqlalchemy
+
+# Rows of the log tables are written by a single thread, a batch per statement (executemany) instead of a transaction per row.
+# Batches are written every flush_seconds, once batch_size rows are waiting, or right away when a caller waits on a flush.
+audit_queue = queue.Queue()
+writer_lock = threading.Lock()
+writer_thread = None
+
+
+# This function starts the writer thread (once)
+def start_audit_writer(connection, flush_seconds=1, batch_size=500):
+    global writer_thread
+
+    with writer_lock:
+        if writer_thread is None or not writer_thread.is_alive():
+            writer_thread = threading.Thread(target=run_audit_writer,
+                                             name='datafilestage_audit_writer',
+                                             args=(connection, flush_seconds, batch_size),
+                                             daemon=True)
+            writer_thread.start()
+
+# Tells if log rows go through the writer, when it is not running they are written by the caller
+def is_running():
+    return writer_thread is not None and writer_thread.is_alive()
+
+# Queue a row for _admin.<table_name>. Returns a future that completes once the row is committed, or holds the exception if it could not be.
+def submit_insert(table_name, row):
+    future = concurrent.futures.Future()
+    row = {column: value.item() if hasattr(value, 'item') else value for column, value in row.items()}   # numpy numbers to python numbers
+    audit_queue.put(('insert', table_name, row, future))
+    return future
+
+# Queue an update of the datafilestagelog row of a load attempt, values holds the columns to set
+def submit_update(profile_hk, load_attempt, values):
+    future = concurrent.futures.Future()
+    audit_queue.put(('update', 'datafilestagelog', dict(values, datafilestagehk=profile_hk, loadattempt=load_attempt), future))
+    return future
+
+# Write everything queued so far and wait for it, rows queued before the call are committed (or failed) once it returns
+def flush():
+    future = concurrent.futures.Future()
+    audit_queue.put(('flush', None, None, future))
+    future.result()
+
+# Number of rows waiting to be written
+def get_queue_depth():
+    return audit_queue.qsize()
+
+# Writer loop, rows are collected until the flush interval passed, the batch is full or a flush is asked for
+def run_audit_writer(connection, flush_seconds, batch_size):
+    pending = []
+    first_item_time = None
+
+    while True:
+        timeout = None
+        if pending:
+            timeout = max(first_item_time + flush_seconds - time.monotonic(), 0)
+
+        try:
+            item = audit_queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        waiters = []
+        if item is not None and item[0] == 'flush':
+            waiters.append(item[3])
+        elif item is not None:
+            if not pending:
+                first_item_time = time.monotonic()
+            pending.append(item)
+
+        if pending and (waiters or item is None or len(pending) >= batch_size or time.monotonic() - first_item_time >= flush_seconds):
+            write_batch(connection, pending)
+            pending = []
+
+        for waiter in waiters:
+            waiter.set_result(True)
+
+# Write a batch in one transaction, inserts before updates so that the row of a load exists before its status is set.
+# Rows with the same table and columns share one statement. If the batch fails the rows are written one at a time, so one bad row does not fail the others.
+def write_batch(connection, items):
+    items = sorted(items, key=lambda item: item[0] != 'insert')
+    statements = collections.OrderedDict()   # (kind, table, columns) -> items
+    for item in items:
+        statements.setdefault((item[0], item[1], tuple(item[2].keys())), []).append(item)
+
+    try:
+        conn = connection[0].connect()
+        try:
+            for (kind, table_name, columns), statement_items in statements.items():
+                conn.execute(sqlalchemy.text(get_statement(kind, table_name, columns)), [item[2] for item in statement_items])
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        if len(items) == 1:
+            logging.error('An exception occurred while writing to _admin.%s: %s', items[0][1], e)
+            items[0][3].set_exception(e)
+            return
+        logging.warning('Writing %s log rows together failed, writing them one at a time: %s', len(items), e)
+        for item in items:
+            write_batch(connection, [item])
+        return
+
+    for item in items:
+        item[3].set_result(True)
+
+def get_statement(kind, table_name, columns):
+    if kind == 'insert':
+        return "INSERT INTO _admin.{} ({}) VALUES ({})".format(table_name, ', '.join(columns), ', '.join(':' + column for column in columns))
+    return "UPDATE _admin.{} SET {} WHERE datafilestagehk=:datafilestagehk AND loadattempt=:loadattempt".format(table_name, ', '.join('{}=:{}'.format(column, column) for column in columns if column not in ['datafilestagehk', 'loadattempt']))
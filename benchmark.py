@@ -0,0 +1,351 @@
+import argparse
+import concurrent.futures
+import configparser
+import csv
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None   # not on windows, psutil is used there
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Benchmark scenarios, each one a synthetic drop file that is loaded end to end. rows are scaled with --scale.
+scenarios = [{'name': 'csv_narrow', 'format': 'csv', 'rows': 200000, 'columns': 10, 'delimiter': ',', 'quoting': 'minimal', 'encoding': 'utf-8'},
+             {'name': 'csv_wide', 'format': 'csv', 'rows': 20000, 'columns': 200, 'delimiter': '|', 'quoting': 'minimal', 'encoding': 'utf-8'},
+             {'name': 'csv_quoted_cp1252', 'format': 'csv', 'rows': 100000, 'columns': 20, 'delimiter': ';', 'quoting': 'all', 'encoding': 'cp1252'},
+             {'name': 'tsv_utf16', 'format': 'csv', 'rows': 50000, 'columns': 20, 'delimiter': '\t', 'quoting': 'minimal', 'encoding': 'utf-16'},
+             {'name': 'xlsx', 'format': 'xlsx', 'rows': 20000, 'columns': 20},
+             {'name': 'json', 'format': 'json', 'rows': 100000, 'columns': 10},
+             {'name': 'xml', 'format': 'xml', 'rows': 50000, 'columns': 10}]
+
+# Column types of the generated files, in turn
+column_types = ['int', 'text', 'float', 'date', 'code']
+
+words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliett', 'café', 'crème', 'naïve']
+
+schema_name = 'bench'
+
+# Throughput may drop (and peak memory grow) by this many percent against the baseline before it is reported as a regression
+default_threshold = 10
+default_rss_threshold = 20
+
+
+# This function writes a synthetic drop file. Values only depend on the seed, so the same scenario always gives the same file.
+def generate_file(file_path, rows, columns, file_format='csv', delimiter=',', quoting='minimal', encoding='utf-8', seed=0):
+    generator = random.Random(seed)
+    header = ['{}_{}'.format(column_types[i % len(column_types)], i + 1) for i in range(columns)]
+    records = (get_record(generator, columns, row) for row in range(rows))
+
+    if file_format == 'csv':
+        quoting_mode = {'minimal': csv.QUOTE_MINIMAL, 'all': csv.QUOTE_ALL, 'none': csv.QUOTE_NONE}[quoting]
+        with open(file_path, 'w', newline='', encoding=encoding, errors='replace') as file:
+            writer = csv.writer(file, delimiter=delimiter, quoting=quoting_mode, escapechar='\\' if quoting == 'none' else None)
+            writer.writerow(header)
+            writer.writerows(records)
+
+    elif file_format == 'json':
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(dict(zip(header, record)), ensure_ascii=False) + '\n')
+
+    elif file_format == 'xml':
+        with open(file_path, 'w', encoding='utf-8') as file:
+            file.write('<?xml version="1.0" encoding="utf-8"?>\n<records>\n')
+            for record in records:
+                file.write('<record>' + ''.join('<{0}>{1}</{0}>'.format(name, escape(str(value))) for name, value in zip(header, record)) + '</record>\n')
+            file.write('</records>\n')
+
+    elif file_format == 'xlsx':
+        if openpyxl is None:
+            raise ImportError('openpyxl is needed to write excel files')
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(header)
+        for record in records:
+            sheet.append(record)
+        workbook.save(file_path)
+
+    else:
+        raise ValueError('Unknown file format {}'.format(file_format))
+
+    return file_path
+
+def get_record(generator, columns, row):
+    record = []
+    for i in range(columns):
+        column_type = column_types[i % len(column_types)]
+        if column_type == 'int':
+            record.append(row * columns + i)
+        elif column_type == 'text':
+            record.append(' '.join(generator.choice(words) for _ in range(generator.randint(1, 4))) + (', "quoted"' if generator.random() < 0.05 else ''))
+        elif column_type == 'float':
+            record.append(round(generator.uniform(-10000, 10000), 2))
+        elif column_type == 'date':
+            record.append((date(2020, 1, 1) + timedelta(days=generator.randint(0, 2000))).isoformat())
+        else:
+            record.append(generator.choice(['A', 'B', 'C', 'D']) + str(generator.randint(1, 50)))
+    return record
+
+def get_file_name(scenario):
+    return scenario['name'] + '.' + scenario['format']
+
+# Scenarios from a json file, a list of scenarios with the keys of the built-in ones (delimiter, quoting and encoding can be left out)
+def read_scenario_file(file_path):
+    with open(file_path) as file:
+        file_scenarios = json.load(file)
+
+    for scenario in file_scenarios:
+        missing = [key for key in ['name', 'format', 'rows', 'columns'] if key not in scenario]
+        if missing:
+            raise ValueError('Scenario {} in {} has no {}'.format(scenario.get('name', '?'), file_path, ', '.join(missing)))
+    return file_scenarios
+
+# File settings given on the command line, they replace the settings of every scenario that is run
+def get_overrides(arguments):
+    overrides = {'format': arguments.format,
+                 'rows': arguments.rows,
+                 'columns': arguments.columns,
+                 'delimiter': arguments.delimiter.encode('utf-8').decode('unicode_escape') if arguments.delimiter else None,   # e.g. \t for tab
+                 'quoting': arguments.quoting,
+                 'encoding': arguments.encoding}
+    return {key: value for key, value in overrides.items() if value is not None}
+
+# Peak resident memory of this process in bytes, None when it can not be read
+def get_peak_rss():
+    if resource is not None:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    if psutil is not None:
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, 'peak_wset', memory_info.rss)
+    return None
+
+# Set up the local sqlite stand-in: a main database, the _admin schema (tables from the sqlite part of the DDL script) and the benchmark schema
+def create_sqlite_database(folder):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datastagerplusddl.sql')) as file:
+        ddl_script = file.read().split('-- SQLITE', 1)[1].split('\n', 1)[1]
+    ddl_script = ddl_script.replace("'_admin.db'", "'{}'".format(os.path.join(folder, '_admin.db').replace("'", "''")))
+
+    sqlite3.connect(os.path.join(folder, schema_name + '.db')).close()
+    conn = sqlite3.connect(os.path.join(folder, 'datafilestage.db'))
+    try:
+        conn.executescript(ddl_script)
+    finally:
+        conn.close()
+
+    return ['sqlite', urllib.parse.quote(folder), 'datafilestage', 'ODBC', '', '']
+
+# Database settings from the DATABASE_SERVER section of a configuration file (e.g. a local postgres), the bench schema has to exist there
+def get_config_database(config):
+    return [config['DATABASE_SERVER']['RDMS'],
+            urllib.parse.quote(config['DATABASE_SERVER']['SERVER']),
+            config['DATABASE_SERVER']['DATABASE'],
+            config['DATABASE_SERVER']['CONNECTIONTYPE'],
+            config['DATABASE_SERVER']['USER'],
+            urllib.parse.quote(config['DATABASE_SERVER']['PASSWORD'])]
+
+# This function loads one file end to end (prep_file, write_profile_data, load_data and the load status) and returns its measurements.
+# It is run in a fresh process for each run, so that peak memory is that of the one load.
+def run_load(file_path, table_name, database, config_file):
+    import datastagerplus
+    import catalogcache
+    import ddlcoordinator
+    import fileprocessing
+    import stagetimer
+
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    load_options = datastagerplus.get_load_options(config)
+    delimiters = urllib.parse.quote(config.get('SUPPORTED_DELIMITERS', 'DELIMITERS', fallback=',~\\t~;~|').strip()).split('~')
+
+    connection = fileprocessing.getdbconnection(database[1], database[2], database[3], database[0], database[4], database[5])
+    ddlcoordinator.ddl_listeners.append(catalogcache.invalidate_table)
+    ddlcoordinator.start_ddl_coordinator(connection)
+
+    timing = stagetimer.create_timing(file_path)
+    stagetimer.set_current(timing)
+    start = time.perf_counter()
+
+    with stagetimer.stage('parse') as stage_counts:
+        stage_counts['bytes'] = os.path.getsize(file_path)
+        data_object = fileprocessing.prep_file(file_path, delimiters, load_options)
+    df, meta_data = data_object
+    if isinstance(df, int):
+        raise ValueError('File {} could not be read'.format(file_path))
+
+    status = fileprocessing.write_profile_data(df, meta_data, file_path, table_name, schema_name, connection)
+    if status[0] != 0:
+        raise status[1]
+    status = datastagerplus.load_data(df, file_path, table_name, schema_name, connection, load_options, meta_data.get('lazy_stats'))
+    if status[0] != 0:
+        raise status[1] if len(status) > 1 and isinstance(status[1], Exception) else RuntimeError('Load of {} failed: {}'.format(file_path, status))
+    load_stats = status[2]
+    datastagerplus.close_load(meta_data['profile_hk'], os.path.basename(file_path), schema_name, table_name, load_stats, meta_data, connection)
+
+    seconds = time.perf_counter() - start
+    stagetimer.set_current(None)
+
+    # Leave the database as it was, so that every run creates the table
+    ddlcoordinator.submit_ddl('DROP TABLE IF EXISTS {}.{}'.format(schema_name, table_name), schema_name, table_name).result()
+
+    return {'seconds': seconds,
+            'records': load_stats.get('totalrecords'),
+            'bytes': os.path.getsize(file_path),
+            'peakrss': get_peak_rss(),
+            'stages': {row['stagename']: row['seconds'] for row in stagetimer.get_stage_rows(timing)}}
+
+# Run a scenario repeats times and summarise it, medians are used so that a single slow run does not count
+def run_scenario(scenario, file_path, database, config_file, repeats):
+    runs = []
+    for _ in range(repeats):
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            runs.append(executor.submit(run_load, file_path, scenario['name'], database, config_file).result())
+
+    seconds = statistics.median(run['seconds'] for run in runs)
+    records = runs[0]['records'] or scenario['rows']
+    stage_names = list(dict.fromkeys(name for run in runs for name in run['stages']))
+    peak_rss = [run['peakrss'] for run in runs if run['peakrss'] is not None]
+
+    return {'seconds': round(seconds, 3),
+            'records': records,
+            'rowspersecond': round(records / seconds, 1),
+            'mbpersecond': round(runs[0]['bytes'] / 1024 / 1024 / seconds, 2),
+            'peakrssmb': round(max(peak_rss) / 1024 / 1024, 1) if peak_rss else None,
+            'stages': {name: round(statistics.median(run['stages'].get(name, 0) for run in runs), 3) for name in stage_names}}
+
+# Compare results with the baseline, returns the regressions as messages
+def compare_results(results, baseline, threshold, rss_threshold):
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['rowspersecond'] < expected['rowspersecond'] * (1 - threshold / 100):
+            regressions.append('{}: {} rows/sec, baseline {} rows/sec'.format(name, result['rowspersecond'], expected['rowspersecond']))
+        if result['peakrssmb'] and expected.get('peakrssmb') and result['peakrssmb'] > expected['peakrssmb'] * (1 + rss_threshold / 100):
+            regressions.append('{}: peak memory {} MB, baseline {} MB'.format(name, result['peakrssmb'], expected['peakrssmb']))
+
+    return regressions
+
+def print_results(results, baseline):
+    print('{:<20} {:>10} {:>12} {:>8} {:>10} {:>10}  {}'.format('scenario', 'records', 'rows/sec', 'MB/sec', 'peak MB', 'baseline', 'stages (seconds)'))
+    for name, result in results.items():
+        expected = baseline.get(name, {}).get('rowspersecond', '')
+        stages = ', '.join('{} {}'.format(stage, seconds) for stage, seconds in result['stages'].items())
+        print('{:<20} {:>10} {:>12} {:>8} {:>10} {:>10}  {}'.format(name, result['records'], result['rowspersecond'], result['mbpersecond'], str(result['peakrssmb']), expected, stages))
+
+# Main Function Entry
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate synthetic drop files and load them end to end to measure load performance.')
+    parser.add_argument('--config', default='setting.cfg', help='configuration file with the load options to benchmark')
+    parser.add_argument('--database', choices=['sqlite', 'config'], default='sqlite', help='local sqlite stand-in, or the database of the configuration file')
+    parser.add_argument('--scenarios', help='comma separated scenarios to run, all by default')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier for the rows of each scenario')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=default_threshold, help='allowed drop in rows/sec against the baseline, in percent')
+    parser.add_argument('--rss-threshold', type=float, default=default_rss_threshold, help='allowed growth of peak memory against the baseline, in percent')
+    parser.add_argument('--generate-only', help='only write the scenario files to this folder')
+    parser.add_argument('--scenario-file', help='json file with the scenarios to use instead of the built-in ones')
+    # File settings for an ad hoc run, they replace those of the selected scenarios (which are then not compared with the baseline)
+    parser.add_argument('--format', choices=['csv', 'json', 'xml', 'xlsx'], help='file format')
+    parser.add_argument('--rows', type=int, help='records per file (before --scale)')
+    parser.add_argument('--columns', type=int, help='columns per file')
+    parser.add_argument('--delimiter', help='delimiter of csv files, escapes like \\t can be used')
+    parser.add_argument('--quoting', choices=['minimal', 'all', 'none'], help='quoting of csv files')
+    parser.add_argument('--encoding', help='encoding of csv files, e.g. utf-8, cp1252, utf-16')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if arguments.scenario_file:
+        scenarios = read_scenario_file(arguments.scenario_file)
+    overrides = get_overrides(arguments)
+    selected = [dict(scenario, **overrides) for scenario in scenarios
+                if arguments.scenarios is None or scenario['name'] in arguments.scenarios.split(',')]
+    if openpyxl is None:
+        logging.warning('openpyxl is not installed, skipping excel scenarios')
+        selected = [scenario for scenario in selected if scenario['format'] != 'xlsx']
+
+    work_folder = arguments.generate_only or tempfile.mkdtemp(prefix='datastagerplus_benchmark_')
+    os.makedirs(work_folder, exist_ok=True)
+
+    # Files are put in a <schema>/<table> folder, as in the drop folder
+    files = {}
+    for scenario in selected:
+        scenario = dict(scenario, rows=int(scenario['rows'] * arguments.scale))
+        folder = os.path.join(work_folder, schema_name, scenario['name'])
+        os.makedirs(folder, exist_ok=True)
+        files[scenario['name']] = (scenario, generate_file(os.path.join(folder, get_file_name(scenario))
+                                                           , scenario['rows']
+                                                           , scenario['columns']
+                                                           , scenario['format']
+                                                           , scenario.get('delimiter', ',')
+                                                           , scenario.get('quoting', 'minimal')
+                                                           , scenario.get('encoding', 'utf-8')))
+
+    if arguments.generate_only:
+        print('Files written to {}'.format(work_folder))
+        sys.exit(0)
+
+    try:
+        if arguments.database == 'sqlite':
+            database_folder = os.path.join(work_folder, 'database')
+            os.makedirs(database_folder)
+            database = create_sqlite_database(database_folder)
+        else:
+            config = configparser.ConfigParser()
+            config.read(arguments.config)
+            database = get_config_database(config)
+
+        results = {}
+        for name, (scenario, file_path) in files.items():
+            results[name] = run_scenario(scenario, file_path, database, arguments.config, arguments.repeats)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    baseline = {}
+    if os.path.isfile(arguments.baseline) and not overrides:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+
+    print_results(results, baseline)
+
+    if overrides:
+        print('Scenarios were run with {}, they are not compared with the baseline'.format(', '.join('{}={!r}'.format(key, value) for key, value in overrides.items())))
+        sys.exit(0)
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, 'w') as file:
+            json.dump(dict(baseline, **results), file, indent=2)
+        print('Baseline saved to {}'.format(arguments.baseline))
+        sys.exit(0)
+
+    regressions = compare_results(results, baseline, arguments.threshold, arguments.rss_threshold)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,134 @@
+import threading
+import time
+import sqlalchemy
+
+# Seconds cached catalog information is trusted before it is read from the database again
+ttl_seconds = 300
+
+catalog_lock = threading.Lock()
+schema_cache = {}   # schema -> time all tables of the schema were listed
+table_cache = {}    # (schema, table) -> [exists (None when unknown), time checked]
+column_cache = {}   # (schema, table) -> [list of column definitions, time read]
+
+
+# This function tells if schema.table exists. The tables of a schema are listed once per ttl, tables changed by our own DDL are checked on their own.
+def table_exists(schema_name, table_name, connection):
+    key = (schema_name.lower(), table_name.lower())
+    now = time.monotonic()
+
+    with catalog_lock:
+        entry = table_cache.get(key)
+        schema_loaded = schema_cache.get(key[0])
+
+    if entry is not None and entry[0] is not None and now - entry[1] < ttl_seconds:
+        return entry[0]
+
+    # Known to have changed (our own DDL), just check this table
+    if entry is not None and entry[0] is None and schema_loaded is not None and now - schema_loaded < ttl_seconds:
+        exists = query_table_exists(schema_name, table_name, connection)
+        with catalog_lock:
+            table_cache[key] = [exists, now]
+        return exists
+
+    load_schema_tables(schema_name, connection)
+
+    with catalog_lock:
+        entry = table_cache.get(key)
+        if entry is None or entry[1] < now:
+            table_cache[key] = [False, now]
+            return False
+        return bool(entry[0])
+
+# Returns column definitions of schema.table as a list of dictionaries with name, data_type, position and type_definition, ordered by position
+def get_table_columns(schema_name, table_name, connection):
+    key = (schema_name.lower(), table_name.lower())
+    now = time.monotonic()
+
+    with catalog_lock:
+        entry = column_cache.get(key)
+    if entry is not None and now - entry[1] < ttl_seconds:
+        return entry[0]
+
+    columns = query_table_columns(schema_name, table_name, connection)
+    with catalog_lock:
+        column_cache[key] = [columns, now]
+    return columns
+
+# Called after DDL on a table committed (or failed). exists is True/False when the outcome is known, None when the table has to be checked again.
+def invalidate_table(schema_name, table_name, exists=None):
+    key = (schema_name.lower(), table_name.lower())
+    with catalog_lock:
+        table_cache[key] = [exists, time.monotonic()]
+        column_cache.pop(key, None)
+
+# Read all tables of a schema into the cache
+def load_schema_tables(schema_name, connection):
+    now = time.monotonic()
+
+    conn = connection[0].connect()
+    try:
+        if connection[2] == 'sqlite':
+            tablelist = conn.execute(sqlalchemy.text("SELECT name "
+                                                     "FROM \"{}\".sqlite_master "
+                                                     "WHERE type='table'".format(schema_name))).fetchall()
+        else:
+            tablelist = conn.execute(sqlalchemy.text("SELECT TABLE_NAME "
+                                                     "FROM INFORMATION_SCHEMA.TABLES "
+                                                     "WHERE TABLE_SCHEMA =:schema"), {'schema': schema_name}).fetchall()
+    finally:
+        conn.close()
+
+    with catalog_lock:
+        # Tables that were listed before but are gone now
+        for key in list(table_cache):
+            if key[0] == schema_name.lower() and table_cache[key][1] < now:
+                table_cache[key] = [False, now]
+        for row in tablelist:
+            table_cache[(schema_name.lower(), str(row[0]).lower())] = [True, now]
+        schema_cache[schema_name.lower()] = now
+
+# Check a single table in the database
+def query_table_exists(schema_name, table_name, connection):
+    conn = connection[0].connect()
+    try:
+        if connection[2] == 'sqlite':
+            tablelist = conn.execute(sqlalchemy.text("SELECT name "
+                                                     "FROM \"{}\".sqlite_master "
+                                                     "WHERE type='table' "
+                                                     "AND lower(name)=lower(:id)".format(schema_name)), {'id': table_name}).fetchall()
+        else:
+            tablelist = conn.execute(sqlalchemy.text("SELECT TABLE_NAME "
+                                                     "FROM INFORMATION_SCHEMA.TABLES "
+                                                     "WHERE TABLE_SCHEMA =:schema "
+                                                     "AND lower(TABLE_NAME)=lower(:id)"), {'id': table_name, 'schema': schema_name}).fetchall()
+    finally:
+        conn.close()
+    return len(tablelist) > 0
+
+# Read column definitions of a table from the database
+def query_table_columns(schema_name, table_name, connection):
+    conn = connection[0].connect()
+    try:
+        if connection[2] == 'sqlite':
+            rows = conn.execute(sqlalchemy.text("PRAGMA \"{}\".table_info(\"{}\")".format(schema_name, table_name))).fetchall()
+            columns = [{'name': row[1], 'data_type': str(row[2]).lower(), 'position': row[0] + 1, 'type_definition': str(row[2])} for row in rows]
+        else:
+            rows = conn.execute(sqlalchemy.text("SELECT COLUMN_NAME, DATA_TYPE, ORDINAL_POSITION, "
+                                                "CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE "
+                                                "FROM INFORMATION_SCHEMA.COLUMNS "
+                                                "WHERE TABLE_SCHEMA =:schema "
+                                                "AND lower(TABLE_NAME)=lower(:id) "
+                                                "ORDER BY ORDINAL_POSITION"), {'id': table_name, 'schema': schema_name}).fetchall()
+            columns = [{'name': row[0], 'data_type': str(row[1]).lower(), 'position': row[2], 'type_definition': get_type_definition(row[1], row[3], row[4], row[5])} for row in rows]
+    finally:
+        conn.close()
+    return columns
+
+# Full type of a column as used in a create table statement (e.g. varchar(255), decimal(18,2)) from its information schema columns
+def get_type_definition(data_type, character_length, numeric_precision, numeric_scale):
+    data_type = str(data_type)
+    if character_length is not None and data_type.lower() not in ['text', 'ntext', 'xml', 'image']:
+        return '{}({})'.format(data_type, 'max' if character_length == -1 else character_length)
+    if data_type.lower() in ['decimal', 'numeric'] and numeric_precision is not None:
+        return '{}({},{})'.format(data_type, numeric_precision, numeric_scale or 0)
+    return data_type
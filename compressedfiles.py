@@ -0,0 +1,82 @@
+import bz2
+import gzip
+import os
+import shutil
+import time
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed single file formats, they are decompressed while they are read
+compressed_extensions = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+
+# Bytes copied per read when a zip member is extracted
+copy_buffer_bytes = 16 * 1024 * 1024
+
+
+# Compression of a file from its extension, None when the file is not compressed (zip archives are expanded, not decompressed)
+def get_compression(file_path):
+    return compressed_extensions.get(os.path.splitext(file_path)[1].lower())
+
+# Extension of the data in a file, e.g. .csv for data.csv.gz
+def get_data_extension(file_path):
+    if get_compression(file_path) is not None:
+        file_path = os.path.splitext(file_path)[0]
+    return os.path.splitext(file_path)[1].lower()
+
+def is_zip(file_path):
+    return os.path.splitext(file_path)[1].lower() == '.zip'
+
+# Wrap a binary file object so that reads give the decompressed data. The file object itself is not closed with the wrapper.
+def decompress(file, compression):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    if compression == 'bz2':
+        return bz2.BZ2File(file, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is needed to read .zst files')
+        return zstandard.ZstdDecompressor().stream_reader(file, closefd=False)
+    return file
+
+# Source for a reader: paths are given as they are (pandas and arrow decompress paths from their extension), file objects are wrapped
+def get_data_source(source, compression):
+    if isinstance(source, str):
+        return source
+    return decompress(source, compression)
+
+# Open a file for reading its (decompressed) data as bytes
+def open_data_file(file_path):
+    compression = get_compression(file_path)
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstandard is needed to read .zst files')
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+    return open(file_path, 'rb')
+
+# This function extracts the files of a zip archive into folder, each member is its own load. Members are named <archive>_<member>
+# so that they do not clash with members of other archives of the table. Returns the paths of the extracted files, in archive order.
+def expand_zip(zip_path, folder):
+    os.makedirs(folder, exist_ok=True)
+    archive_name = os.path.splitext(os.path.basename(zip_path))[0]
+    member_paths = []
+
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            member_path = os.path.join(folder, archive_name + '_' + os.path.basename(member.filename))
+            with archive.open(member) as source, open(member_path, 'wb') as target:
+                shutil.copyfileobj(source, target, copy_buffer_bytes)
+            member_time = time.mktime(member.date_time + (0, 0, -1))
+            os.utime(member_path, (member_time, member_time))
+            member_paths.append(member_path)
+
+    return member_paths
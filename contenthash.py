@@ -0,0 +1,68 @@
+import hashlib
+import io
+import mmap
+import os
+import stagetimer
+
+# Bytes read per call when hashing
+block_size = 8 * 1024 * 1024
+
+
+# This function returns the sha256 of a file's content, the file is memory-mapped and hashed in large sequential blocks
+def hash_file(file_path):
+    content_hash = hashlib.sha256()
+
+    with open(file_path, 'rb') as file, stagetimer.stage('hash') as stage_counts:
+        stage_counts['bytes'] = os.fstat(file.fileno()).st_size
+        if stage_counts['bytes'] == 0:
+            return content_hash.hexdigest()
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            view = memoryview(mapped_file)
+            try:
+                for start in range(0, len(mapped_file), block_size):
+                    content_hash.update(view[start:start + block_size])
+            finally:
+                view.release()
+
+    return content_hash.hexdigest()
+
+# Open a file for reading so that its content is hashed while it is parsed (the file is only read once).
+# Call get_hash on the returned object once parsing is done.
+def open_hashing_file(file_path):
+    return io.BufferedReader(HashingReader(open(file_path, 'rb')), buffer_size=block_size)
+
+# Hash of a file opened with open_hashing_file, whatever was not read by the parser yet is read first. The file is closed.
+def get_hash(hashing_file):
+    reader = hashing_file.raw
+    if not reader.closed:
+        buffer = bytearray(block_size)
+        while reader.readinto(buffer):
+            pass
+        hashing_file.close()
+    return reader.content_hash.hexdigest()
+
+# Raw file reader that hashes all bytes going through it
+class HashingReader(io.RawIOBase):
+    def __init__(self, file):
+        self.file = file
+        self.content_hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.file.readinto(buffer)
+        if size:
+            self.content_hash.update(memoryview(buffer)[:size])
+        return size
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+# Load key derived from the content and the table it is loaded into, the same content loaded into the same table always gets the same key.
+# Attempts to load it are told apart by their loadattempt (see fileprocessing.get_load_attempt).
+def get_content_key(content_hash, file_path):
+    table_folder = os.path.basename(os.path.dirname(os.path.dirname(file_path))) + '.' + os.path.basename(os.path.dirname(file_path))
+    return hashlib.md5((table_folder.lower() + ':' + content_hash).encode('utf-8')).hexdigest()
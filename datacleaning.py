@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# Control characters other than tab, line feed and carriage return
+control_characters = r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]'
+
+# Default cleaning applied when no options are configured, this is the trimming that was always done
+default_cleaning_options = {'trim': True,
+                            'emptytonull': False,
+                            'scrubcontrolcharacters': False}
+
+
+# This function normalizes the text columns of a dataframe (or chunk of a dataframe) with vectorized string operations.
+# Returns the cleaned dataframe and the number of records that had control characters in them.
+def clean_dataframe(df_object, cleaning_options=None):
+    if cleaning_options is None:
+        cleaning_options = default_cleaning_options
+
+    invalid_records = pd.Series(False, index=df_object.index)
+
+    for column in df_object.select_dtypes(include=['object', 'string', 'category']).columns:
+        if isinstance(df_object[column].dtype, pd.CategoricalDtype):
+            mod_object = clean_categories(df_object[column], cleaning_options)
+        else:
+            mod_object = clean_values(df_object[column], cleaning_options)
+        df_object[column] = mod_object[0]
+        invalid_records |= mod_object[1]
+
+    return [df_object, int(invalid_records.sum())]
+
+# Clean a text column, returns the cleaned values and which of them had control characters.
+# Only text cells are cleaned, an object column can hold other values too (e.g. True/False with blanks, numbers in an excel column).
+def clean_values(values, cleaning_options):
+    invalid_values = pd.Series(False, index=values.index)
+    is_text = get_text_cells(values)
+    text = values if is_text is None else values[is_text]
+
+    if cleaning_options.get('scrubcontrolcharacters'):
+        invalid_values = put_text(invalid_values, is_text, text.str.contains(control_characters, regex=True, na=False).astype(bool))
+        text = keep_non_text(text.str.replace(control_characters, '', regex=True), text)
+
+    if cleaning_options.get('trim'):
+        text = keep_non_text(text.str.strip(), text)
+
+    values = put_text(values, is_text, text)
+
+    if cleaning_options.get('emptytonull'):
+        values = values.mask(values == '')
+
+    return [values, invalid_values]
+
+# Clean a categorical column by cleaning its categories only, categories that become the same after cleaning are merged
+def clean_categories(values, cleaning_options):
+    if len(values.cat.categories) == 0:
+        return [values, pd.Series(False, index=values.index)]
+
+    mod_object = clean_values(pd.Series(values.cat.categories.to_numpy(dtype=object)), cleaning_options)
+
+    # Codes of the cleaned categories, missing (e.g. emptied) categories get code -1
+    category_codes, categories = pd.factorize(mod_object[0])
+    codes = values.cat.codes.to_numpy()
+    is_value = codes >= 0
+    new_codes = np.where(is_value, category_codes[codes], -1)
+    invalid_values = pd.Series(is_value & mod_object[1].to_numpy()[codes], index=values.index)
+
+    values = pd.Series(pd.Categorical.from_codes(new_codes, categories=categories), index=values.index)
+    return [values, invalid_values]
+
+# Number of records of a dataframe (or partition) that have control characters in them, the dataframe is not changed
+def count_invalid_records(df_object):
+    invalid_records = pd.Series(False, index=df_object.index)
+
+    for column in df_object.select_dtypes(include=['object', 'string']).columns:
+        values = df_object[column]
+        is_text = get_text_cells(values)
+        text = values if is_text is None else values[is_text]
+        invalid_records |= put_text(pd.Series(False, index=values.index), is_text, text.str.contains(control_characters, regex=True, na=False).astype(bool))
+
+    return int(invalid_records.sum())
+
+# Text cells of a column, None when the column only holds text (and missing values) and .str can be used on all of it
+def get_text_cells(values):
+    if isinstance(values.dtype, pd.StringDtype) or pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        return None
+    return values.map(lambda value: isinstance(value, str)).astype(bool)
+
+# Put cleaned text cells (text of get_text_cells) back into their column, by position
+def put_text(values, is_text, text):
+    if is_text is None:
+        return text
+    values = values.copy()
+    values[is_text.to_numpy()] = text.to_numpy()
+    return values
+
+# .str operations return missing values for cells that are not text (e.g. numbers in an excel column), put the original values back for those
+def keep_non_text(cleaned_values, values):
+    return cleaned_values.where(cleaned_values.notna(), values)
@@ -0,0 +1,207 @@
+import math
+import numpy as np
+import pandas as pd
+import stagetimer
+
+# Row hashes kept for exact duplicate counting, above this the duplicate count is estimated from a sketch
+max_hashes = 10000000
+
+# Precision of the distinct count sketches (hyperloglog), 2^precision one byte registers per sketch (about 1% error)
+sketch_precision = 14
+
+# Longest min/max text stored for a column
+max_value_length = 255
+
+
+# This function sets up an empty profile. Chunks of a file are added with profile_chunk, the profile is complete once all chunks are added.
+def create_profile(hash_limit=None):
+    return {'totalrecords': 0,
+            'hash_limit': max_hashes if hash_limit is None else hash_limit,
+            'row_hashes': np.empty(0, dtype=np.uint64),   # sorted unique row hashes
+            'pending_hashes': [],                         # unique row hashes of chunks not merged into row_hashes yet
+            'pending_count': 0,
+            'approximate': False,
+            'row_sketch': create_sketch(),
+            'columns': {}}                                # column name -> column statistics, in column order
+
+# Add a dataframe (or chunk of a dataframe) to the profile. Every column is hashed once, the column hashes are used for
+# the column distinct sketch and are combined into a 64 bit hash per row. skip_columns (e.g. meta data columns) are not profiled.
+@stagetimer.timed('profile')
+def profile_chunk(profile, df_object, skip_columns=()):
+    row_hash = np.zeros(len(df_object), dtype=np.uint64)
+
+    for column in df_object.columns:
+        if column in skip_columns:
+            continue
+        values = df_object[column]
+        column_hash = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        row_hash = (row_hash * np.uint64(0x100000001B3)) ^ column_hash
+
+        statistics = profile['columns'].setdefault(str(column), create_column_statistics(values))
+        add_column_statistics(statistics, values, column_hash)
+
+    profile['totalrecords'] += len(df_object)
+    add_sketch(profile['row_sketch'], row_hash)
+
+    if not profile['approximate']:
+        chunk_hashes = np.unique(row_hash)
+        profile['pending_hashes'].append(chunk_hashes)
+        profile['pending_count'] += len(chunk_hashes)
+        # Merge once pending hashes outgrow the merged ones, so each hash is sorted a bounded number of times
+        if profile['pending_count'] >= len(profile['row_hashes']):
+            merge_row_hashes(profile)
+
+    return profile
+
+# Profile of a whole dataframe (e.g. a partition of a dask dataframe)
+def profile_dataframe(df_object, hash_limit=None, skip_columns=()):
+    return profile_chunk(create_profile(hash_limit), df_object, skip_columns)
+
+# Combine profiles of parts of the same file (e.g. partitions of a dask dataframe) into one
+def merge_profiles(profiles):
+    merged = None
+
+    for profile in profiles:
+        if merged is None:
+            merged = profile
+            continue
+        merged['totalrecords'] += profile['totalrecords']
+        merged['row_sketch'] = np.maximum(merged['row_sketch'], profile['row_sketch'])
+        merged['approximate'] = merged['approximate'] or profile['approximate']
+        if merged['approximate']:
+            merged['row_hashes'] = np.empty(0, dtype=np.uint64)
+            merged['pending_hashes'] = []
+            merged['pending_count'] = 0
+        else:
+            merged['pending_hashes'] += [profile['row_hashes']] + profile['pending_hashes']
+            merged['pending_count'] += len(profile['row_hashes']) + profile['pending_count']
+            merge_row_hashes(merged)
+
+        for column, statistics in profile['columns'].items():
+            if column not in merged['columns']:
+                merged['columns'][column] = statistics
+                continue
+            merged_statistics = merged['columns'][column]
+            merged_statistics['nullcount'] += statistics['nullcount']
+            merged_statistics['sketch'] = np.maximum(merged_statistics['sketch'], statistics['sketch'])
+            merged_statistics['minvalue'] = combine_values(merged_statistics['minvalue'], statistics['minvalue'], min)
+            merged_statistics['maxvalue'] = combine_values(merged_statistics['maxvalue'], statistics['maxvalue'], max)
+            merged_statistics['maxlength'] = combine_values(merged_statistics['maxlength'], statistics['maxlength'], max)
+
+    return merged if merged is not None else create_profile()
+
+# Number of duplicate records, exact while all row hashes fit in the hash limit, otherwise estimated
+def get_duplicate_count(profile):
+    if not profile['approximate']:
+        merge_row_hashes(profile)
+        return profile['totalrecords'] - len(profile['row_hashes'])
+
+    distinct_records = min(estimate_distinct(profile['row_sketch']), profile['totalrecords'])
+    return profile['totalrecords'] - distinct_records
+
+# Work out the duplicate count of a complete profile and free its row hashes, the profile only keeps the statistics after this
+def finish_profile(profile):
+    profile['duplicaterecords'] = get_duplicate_count(profile)
+    profile['row_hashes'] = np.empty(0, dtype=np.uint64)
+    profile['pending_hashes'] = []
+    profile['pending_count'] = 0
+    return profile
+
+# Column statistics as a list of rows (one per column) for the column profile table
+def get_column_rows(profile):
+    rows = []
+
+    for position, (column, statistics) in enumerate(profile['columns'].items(), start=1):
+        rows.append({'columnname': column[:max_value_length],
+                     'ordinalposition': position,
+                     'datatype': statistics['datatype'],
+                     'nullcount': statistics['nullcount'],
+                     'distinctestimate': min(estimate_distinct(statistics['sketch']), profile['totalrecords'] - statistics['nullcount']),
+                     'minvalue': format_value(statistics['minvalue']),
+                     'maxvalue': format_value(statistics['maxvalue']),
+                     'maxlength': statistics['maxlength']})
+
+    return rows
+
+# Merge pending row hashes into the sorted unique row hashes, switch to the sketch only once the limit is passed
+def merge_row_hashes(profile):
+    if profile['pending_hashes']:
+        profile['row_hashes'] = np.unique(np.concatenate([profile['row_hashes']] + profile['pending_hashes']))
+        profile['pending_hashes'] = []
+        profile['pending_count'] = 0
+
+    if len(profile['row_hashes']) > profile['hash_limit']:
+        profile['approximate'] = True
+        profile['row_hashes'] = np.empty(0, dtype=np.uint64)
+
+def create_column_statistics(values):
+    return {'datatype': str(values.dtype),
+            'nullcount': 0,
+            'sketch': create_sketch(),
+            'minvalue': None,
+            'maxvalue': None,
+            'maxlength': None}
+
+# Add null count, min/max, text length and distinct sketch of a column chunk to its statistics
+def add_column_statistics(statistics, values, column_hash):
+    not_null = values.notna()
+    statistics['nullcount'] += int(len(values) - not_null.sum())
+    add_sketch(statistics['sketch'], column_hash[not_null.to_numpy()])
+
+    values = values[not_null]
+    if len(values) == 0:
+        return
+
+    if values.dtype.kind == 'O':
+        text_values = values.astype(str)
+        statistics['maxlength'] = combine_values(statistics['maxlength'], int(text_values.str.len().max()), max)
+        values = text_values
+
+    statistics['minvalue'] = combine_values(statistics['minvalue'], values.min(), min)
+    statistics['maxvalue'] = combine_values(statistics['maxvalue'], values.max(), max)
+
+# min/max of two values where either can be missing, values that can not be compared (e.g. text and number) are compared as text
+def combine_values(left, right, function):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    try:
+        return function(left, right)
+    except TypeError:
+        return function(str(left), str(right))
+
+def format_value(value):
+    if value is None:
+        return None
+    return str(value)[:max_value_length]
+
+def create_sketch():
+    return np.zeros(2 ** sketch_precision, dtype=np.uint8)
+
+# Add 64 bit hashes to a hyperloglog sketch, the top bits pick the register and the rest give the rank (leading zeros + 1)
+def add_sketch(sketch, hashes):
+    if len(hashes) == 0:
+        return
+
+    remaining_bits = 64 - sketch_precision
+    registers = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+    remainders = hashes & np.uint64((1 << remaining_bits) - 1)
+
+    ranks = np.full(len(hashes), remaining_bits + 1, dtype=np.uint8)
+    non_zero = remainders > 0
+    ranks[non_zero] = (remaining_bits - np.floor(np.log2(remainders[non_zero].astype(np.float64)))).astype(np.uint8)
+
+    np.maximum.at(sketch, registers, ranks)
+
+# Distinct count estimate of a hyperloglog sketch, small counts use linear counting
+def estimate_distinct(sketch):
+    registers = len(sketch)
+    alpha = 0.7213 / (1 + 1.079 / registers)
+    estimate = alpha * registers * registers / float(np.sum(np.power(2.0, -sketch.astype(np.float64))))
+
+    empty_registers = int(np.count_nonzero(sketch == 0))
+    if estimate <= 2.5 * registers and empty_registers > 0:
+        estimate = registers * math.log(registers / empty_registers)
+
+    return int(round(estimate))
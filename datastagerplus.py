@@ -1,200 +1,674 @@
 import fileprocessing
+import filesniffer
+import folderwatcher
+import loadscheduler
+import ddlcoordinator
+import catalogcache
+import fileledger
+import schemaregistry
+import contenthash
+import filesplitter
+import compressedfiles
+import filespool
+import filemover
+import stagetimer
+import memorygovernor
+import fileoffsets
+import auditwriter
+import filebatcher
+import dbwriters
 import logging
 import os
-import glob
 import time
 import threading
 import pandas as pd
 import sqlalchemy
+import dask
 import dask.dataframe as dd
 import configparser
 import urllib.parse
 import json
-import queue
-
-# This function will be called in thread to process all files in a folder. So each folder will be processed in a different thread. Note here that each folder also maps to a single table.
-def process_folder_files(thread, monitor_folder, dir_path, supported_delimiters, server, database, schema_name, connectiontype, rdms_name, usr, pwd): 
-    logging.warning("Thread %s: starting", thread)
-    connection = fileprocessing.getdbconnection(server
-                                            , database
-                                            , connectiontype
-                                            , rdms_name
-                                            , usr
-                                            , pwd)
-    # get list of files to process
-    files = glob.glob(os.path.join(dir_path, '*'))
-
-    # process each file into target table
-    for file in files:
-        if os.path.isfile(file):
+import types
+from datetime import datetime
+import functools
+import multiprocessing
+
+# This function processes a single file of a folder into its target table. It is run by the scheduler on a worker thread. Note here that each folder maps to a single table.
+# The file is read from a local copy when spooling is on, a zip archive is expanded and each of its files is loaded on its own.
+# Moving the file to the archive or error folder is left to the file mover, the worker goes on with its next file right away.
+# scheduler is the scheduler running the load, whole files are parsed in its parse process pool (None parses on the calling thread).
+def process_file(file, monitor_folder, dir_path, supported_delimiters, schema_name, connection, load_options, scheduler=None):
+    if not os.path.isfile(file) or filemover.is_pending(file):
+        return
+
+    archive_folder = monitor_folder + '/archive/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
+    error_folder = monitor_folder + '/error/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
+    target_table = os.path.basename(dir_path).lower()
+    timing_enabled = stagetimer.is_enabled(schema_name, target_table)
+
+    # Files of incremental folders stay in the drop folder, only records appended since the last load are loaded
+    if fileoffsets.is_incremental(schema_name, target_table) and fileoffsets.is_incremental_file(file):
+        load_increments(file, supported_delimiters, schema_name, target_table, connection, load_options)
+        return
+
+    spool_start = time.perf_counter()
+    try:
+        if compressedfiles.is_zip(file):
+            local_files = compressedfiles.expand_zip(file, filespool.get_local_folder(schema_name, target_table))
+        else:
+            local_files = [filespool.spool_file(file, schema_name, target_table)]
+    except Exception as e:
+        logging.error('An exception occurred while reading file %s to local disk: %s', file, e)
+        fileprocessing.generate_error_log_entry(os.path.basename(file), target_table, str(e), connection)
+        filemover.submit_error(file, error_folder)
+        return
 
-            file_name = os.path.basename(file)
-            archive_folder = monitor_folder + '/archive/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
-            error_folder = monitor_folder + '/error/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
-            target_table = os.path.basename(dir_path).lower()
+    spool_seconds = time.perf_counter() - spool_start
 
-            # Check that file is not being used (in flight...)
-            if not fileprocessing.check_file_status(file):
+    # Load each file, the load status does not wait for the file to be moved. Stages of each load are timed when timing is on for the folder.
+    outcomes = []
+    timings = []
+    try:
+        for local_file in local_files:
+            timing = stagetimer.create_timing(local_file) if timing_enabled else None
+            if timing is not None and local_file != file:
+                stagetimer.add_stage(timing, 'spool', spool_seconds / len(local_files), bytes=os.path.getsize(local_file))
+            timings.append(timing)
+            stagetimer.set_current(timing)
+            # Wait for memory to load the file, it is streamed when it does not fit as a whole
+            with stagetimer.stage('memorywait'):
+                grant = memorygovernor.admit(local_file, schema_name, target_table, load_options)
+            try:
+                outcomes.append(load_file(local_file, supported_delimiters, schema_name, target_table, connection, grant['load_options'], scheduler))
+            finally:
+                memorygovernor.release(grant)
+                stagetimer.set_current(None)
+    finally:
+        for local_file in local_files:
+            filespool.remove_local_file(local_file, file)
+
+    for outcome, timing in zip(outcomes, timings):
+        if outcome[1] is not None:
+            stagetimer.set_current(timing)
+            try:
+                outcome[1]()
+            finally:
+                stagetimer.set_current(None)
+
+    # Loaded files are in the ledger now, a file that is not moved (e.g. the process stops first) is archived when it is seen again
+    move = None
+    if any(outcome[0] == 'error' for outcome in outcomes):
+        move = filemover.submit_error(file, error_folder, timings)
+    elif all(outcome[0] == 'loaded' for outcome in outcomes):
+        move = filemover.submit_archive(file, archive_folder, timings)  # Archive the file
+    # otherwise the file is left in the drop folder and tried again, files of it that were loaded are skipped then
+
+    # Stage timings are written once the move (timed as well) is done
+    if timing_enabled and move is not None:
+        move.add_done_callback(functools.partial(write_stage_timings, timings, target_table, connection))
+    elif timing_enabled:
+        write_stage_timings(timings, target_table, connection)
+
+# Write the stage timings of the loads of a drop file. Called with the move of the file (a future) when it is done, the move is not needed here.
+def write_stage_timings(timings, target_table, connection, move=None):
+    for timing in timings:
+        if timing is not None and timing['profile_hk'] is not None:
+            fileprocessing.write_stage_timing(timing['profile_hk'], target_table, timing, connection)
+
+# This function loads a batch of small files of a folder (see filebatcher). Each file is parsed on its own and keeps its own log row and
+# filename/datafilestagehk values, files with the same columns are then loaded together through one load table in one transaction.
+# Files that need more than a plain load (not read into a dataframe, part of a batch that failed) are loaded one at a time by process_file.
+def process_batch(files, monitor_folder, dir_path, supported_delimiters, schema_name, connection, load_options, scheduler=None):
+    process_single = functools.partial(process_file
+                                       , monitor_folder=monitor_folder
+                                       , dir_path=dir_path
+                                       , supported_delimiters=supported_delimiters
+                                       , schema_name=schema_name
+                                       , connection=connection
+                                       , load_options=load_options
+                                       , scheduler=scheduler)
+    files = [file for file in files if os.path.isfile(file) and not filemover.is_pending(file)]
+
+    archive_folder = monitor_folder + '/archive/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
+    error_folder = monitor_folder + '/error/'+schema_name+'/'+str(os.path.basename(dir_path))+'/'
+    target_table = os.path.basename(dir_path).lower()
+    timing_enabled = stagetimer.is_enabled(schema_name, target_table)
+    batch_options = dict(load_options, streaming=False)   # small files are read as a whole
+
+    # The batch is admitted as one load, when it does not fit as a whole its files are loaded one at a time
+    grant = memorygovernor.admit(files[0], schema_name, target_table, batch_options, sum(loadscheduler.get_file_size(file) for file in files)) if files else None
+    if grant is None or grant['mode'] != 'whole':
+        if grant is not None:
+            memorygovernor.release(grant)
+        process_single_files(files, process_single)
+        return
+
+    parsed = []        # [drop file, dataframe, meta data, local file, timing]
+    single_files = []
+    local_files = []
+    content_hashes = set()
+    try:
+        for file in files:
+            timing = stagetimer.create_timing(file) if timing_enabled else None
+            stagetimer.set_current(timing)
+            try:
+                local_file = filespool.spool_file(file, schema_name, target_table)
+                local_files.append((local_file, file))
+                data_object = read_file(local_file, supported_delimiters, schema_name, target_table, connection, batch_options, scheduler)
+            except Exception as e:
+                logging.warning('Could not read %s with its batch, loading it on its own: %s', file, e)
+                single_files.append(file)
                 continue
-
-            # Check that file is not already loaded
-            if fileprocessing.is_file_loaded(file_name
-                                             , target_table
-                                             , connection):
-                fileprocessing.archive_file(file, archive_folder)  # Archive the file
+            finally:
+                stagetimer.set_current(None)
+
+            if data_object is None:  # already loaded
+                filemover.submit_archive(file, archive_folder)
+            elif data_object[1] is None:  # could not be parsed, the error is logged already
+                filemover.submit_error(file, error_folder)
+            elif not isinstance(data_object[0], pd.DataFrame) or (load_options.get('contentdedup') and data_object[1]['contenthash'] in content_hashes):
+                single_files.append(file)   # with content dedup a copy of a file of the batch is skipped by the ledger once the batch is loaded
+            else:
+                content_hashes.add(data_object[1]['contenthash'])
+                parsed.append([file, data_object[0], data_object[1], local_file, timing])
+
+        for group in filebatcher.group_files(parsed):
+            single_files.extend(load_batch(group, schema_name, target_table, archive_folder, connection, batch_options))
+    finally:
+        memorygovernor.release(grant)
+        for local_file, file in local_files:
+            filespool.remove_local_file(local_file, file)
+
+    process_single_files(single_files, process_single)
+
+# Load files one at a time, an exception of one file is logged and the others are still loaded (as a scheduler worker does)
+def process_single_files(files, process_single):
+    for file in files:
+        try:
+            process_single(file)
+        except Exception as e:
+            logging.exception('An exception occurred while processing file %s: %s', file, e)
+
+# This function loads a group of parsed files of a batch through one load. Returns the files that are to be loaded on their own instead.
+# The load is timed with the first file of the group, each file gets its own load status and is archived on its own.
+def load_batch(group, schema_name, target_table, archive_folder, connection, load_options):
+    entries = []
+    single_files = []
+    for entry in group:
+        stagetimer.set_current(entry[4])
+        try:
+            if fileprocessing.write_profile_data(entry[1], entry[2], entry[3], target_table, schema_name, connection)[0] == 0:
+                entries.append(entry)
+            else:
+                single_files.append(entry[0])   # a file whose log row could not be written is loaded on its own right after the batch
+        finally:
+            stagetimer.set_current(None)
+    if not entries:
+        return single_files
+
+    stagetimer.set_current(entries[0][4])
+    try:
+        status = load_data(pd.concat([entry[1] for entry in entries], ignore_index=True)
+                           , entries[0][3]
+                           , target_table
+                           , schema_name
+                           , connection
+                           , load_options
+                           , load_name='batch_' + entries[0][2]['profile_hk'][:12])
+    finally:
+        stagetimer.set_current(None)
+
+    # The log rows written for the batch are closed with an error entry, each file gets a new log row when it is loaded on its own
+    if status[0] == 1:
+        logging.warning('Loading a batch of %s files into %s.%s failed, loading them one at a time: %s', len(entries), schema_name, target_table, status[1])
+        for entry in entries:
+            fileprocessing.generate_error_log_entry(entry[2]['profile_hk'], target_table, 'Batch load failed, file is loaded on its own: ' + str(status[1]), connection)
+        return single_files + [entry[0] for entry in entries]
+    if status[0] == 2:  # load table of an earlier attempt is still there, the files are tried again later
+        return single_files
+
+    if status[1] not in ['NEW.TABLE', 'DIRECT.APPEND']:
+        ddlcoordinator.submit_drop(*str(status[1]).split('.'))
+
+    for file, df, meta_data, local_file, timing in entries:
+        stagetimer.set_current(timing)
+        try:
+            close_load(meta_data['profile_hk'], os.path.basename(local_file), schema_name, target_table, dict(status[2], totalrecords=len(df)), meta_data, connection)
+        finally:
+            stagetimer.set_current(None)
+        move = filemover.submit_archive(file, archive_folder, [timing])
+        if timing is not None:
+            move.add_done_callback(functools.partial(write_stage_timings, [timing], target_table, connection))
+
+    return single_files
+
+# Archive files left in the drop folder that are already loaded (by name), e.g. because the process stopped before they were moved
+def reconcile_drop_folder(monitor_folder, connection):
+    drop_folder = os.path.join(monitor_folder, 'drop')
+    archived = 0
+
+    for schema_name in os.listdir(drop_folder):
+        if not os.path.isdir(os.path.join(drop_folder, schema_name)):
+            continue
+        for table_folder in os.listdir(os.path.join(drop_folder, schema_name)):
+            dir_path = os.path.join(drop_folder, schema_name, table_folder)
+            if not os.path.isdir(dir_path) or fileoffsets.is_incremental(schema_name, table_folder):
                 continue
+            archive_folder = monitor_folder + '/archive/'+schema_name+'/'+table_folder+'/'
+            for file_name in os.listdir(dir_path):
+                file = os.path.join(dir_path, file_name)
+                if os.path.isfile(file) and fileprocessing.is_file_loaded(file_name, table_folder.lower(), connection):
+                    filemover.submit_archive(file, archive_folder)
+                    archived += 1
+
+    if archived > 0:
+        logging.info('Archiving %s loaded files left in the drop folder', archived)
+
+# This function loads the records appended to a file since its last load, in increments of at most max_increment_bytes. The byte offset
+# loaded up to is committed in the same transaction as the records, so a failed increment is loaded again and no record is loaded twice.
+def load_increments(file, supported_delimiters, schema_name, target_table, connection, load_options):
+    file_name = os.path.basename(file)
+    dialect = filesniffer.sniff_file(file, supported_delimiters, load_options.get('sniffbytes'), load_options.get('dialectcache', True))
+    if dialect['encoding'] not in filesplitter.splittable_encodings:
+        logging.error('File %s is %s encoded, it can not be loaded incrementally', file, dialect['encoding'])
+        return
+
+    table_schema = schemaregistry.get_table_schema(schema_name, target_table) if load_options.get('typedparsing') else None
+    read_options = fileprocessing.get_read_options(dialect, table_schema)
+    checkpoint = fileoffsets.get_checkpoint(file_name, target_table, connection)
 
-            # Attemp to create panda from file and figure out the delimiter used in file
-            data_object = fileprocessing.prep_file(file, supported_delimiters)
-            df = data_object[0]  # process file i.e. read into dataframe
-            meta_data = data_object[1]
-            profile_hk = meta_data['profile_hk']
-            
-            if isinstance(df, pd.DataFrame) or isinstance(df, dd.DataFrame):  # if a dataframe was returned
-                status = fileprocessing.write_profile_data(df
-                                                           , meta_data
-                                                           , file
-                                                           , target_table
-                                                           , schema_name
-                                                           , connection)  # write date profile
-
-                if status[0] == 1:  # if profile was not written skip this file
-                    continue
-                status = load_data(df
-                                , file
-                                , target_table
-                                , schema_name
-                                , connection)  # load data to target database
-
-                if status[0] == 1:  # if not able to load data, move file to error folder
-                    status = fileprocessing.generate_error_log_entry(profile_hk
-                                                                     , target_table
-                                                                     , str(status[1])
-                                                                     , connection)
-                    fileprocessing.error_file(file, error_folder)
-                    continue
-                # if previous file was not processed to schema or data issues skip the file
-                if status[0] == 2:  # if not able to load data, move file to error folder
-                    continue
-                 
-                deletetablequeue.put(status[1])
-                fileprocessing.archive_file(file, archive_folder)  # Archive the file
-
-                # only move to next file if file archiving is done
-                while os.path.isfile(file):
-                    time.sleep(5)
-                # Close File load status
-                fileprocessing.set_file_processed_status(profile_hk, connection)
-            else:  # data was not processed into dataframe
-                message = 'Error reading file into a dataframe...Make sure format is supported.'
-                status = fileprocessing.generate_error_log_entry(file_name
-                                                                 , target_table
-                                                                 , message
-                                                                 , connection)
-                fileprocessing.error_file(file, error_folder)
-
-    connection[0].dispose()
-        
-    logging.warning("Thread %s: Ending", thread)
-
-
-# This function writes dataframe to target database table
-def load_data(df_object, file_path, targettablename, schemaname, connection):
+    while True:
+        increment = fileoffsets.get_increment(file, checkpoint, dialect['quotechar'], dialect['header'])
+        if increment is None or increment['end'] <= increment['start']:
+            return
+
+        start_time = datetime.now()
+        try:
+            df = filesplitter.read_range(file, increment['start'], increment['end'], increment['header_bytes'], read_options)
+        except Exception as e:
+            if table_schema is None:
+                get_parse_error(file, target_table, e, connection)
+                return  # the file stays where it is, the increment is tried again next time
+            logging.warning('Increment of %s does not parse with the recorded types of %s.%s, parsing it with type inference: %s', file, schema_name, target_table, e)
+            schemaregistry.forget_table(schema_name, target_table)
+            table_schema = None
+            read_options = fileprocessing.get_read_options(dialect)
+            continue
+        df, meta_data = fileprocessing.add_meta_data(df, dialect['delimiter'], file, start_time, load_options)
+        profile_hk = meta_data['profile_hk']
+
+        status = fileprocessing.write_profile_data(df, meta_data, file, target_table, schema_name, connection)
+        if status[0] == 1:
+            return
+        status = load_data(df
+                           , file
+                           , target_table
+                           , schema_name
+                           , connection
+                           , load_options
+                           , checkpoint=functools.partial(fileoffsets.save_checkpoint
+                                                          , file_name=file_name
+                                                          , target_table=target_table
+                                                          , byte_offset=increment['end']
+                                                          , header_signature=increment['signature']
+                                                          , profile_hk=profile_hk))
+        if status[0] != 0:
+            if status[0] == 1:
+                schemaregistry.forget_table(schema_name, target_table)
+                fileprocessing.generate_error_log_entry(profile_hk, target_table, str(status[1]), connection)
+            return  # the file stays where it is, the increment is loaded again next time
+
+        # The load table name is the same for every increment, it has to be gone before the next one
+        if status[1] not in ['NEW.TABLE', 'DIRECT.APPEND']:
+            ddlcoordinator.submit_drop(*str(status[1]).split('.')).result()
+        close_load(profile_hk, file_name, schema_name, target_table, status[2], meta_data, connection)
+        checkpoint = {'byteoffset': increment['end'], 'headersignature': increment['signature']}
+
+# This function loads a single (local) file into its target table. Returns the outcome (loaded, error or retry) and the function that closes the load,
+# it is called once all files of the drop are loaded.
+def load_file(file, supported_delimiters, schema_name, target_table, connection, load_options, scheduler=None):
+    file_name = os.path.basename(file)
+
+    data_object = read_file(file, supported_delimiters, schema_name, target_table, connection, load_options, scheduler)
+    if data_object is None:
+        return ['loaded', None]
+    if data_object[1] is None:  # could not be parsed, the error is logged already
+        return ['error', None]
+    df = data_object[0]  # process file i.e. read into dataframe (or generator of dataframe chunks when streaming)
+    meta_data = data_object[1]
+    profile_hk = meta_data['profile_hk']
+
+    if isinstance(df, pd.DataFrame) or isinstance(df, dd.DataFrame) or isinstance(df, types.GeneratorType):  # if a dataframe was returned
+        status = fileprocessing.write_profile_data(df
+                                                   , meta_data
+                                                   , file
+                                                   , target_table
+                                                   , schema_name
+                                                   , connection)  # write date profile
+
+        if status[0] == 1:  # if profile was not written skip this file
+            if isinstance(df, types.GeneratorType):
+                df.close()  # stop reading the rest of the file
+            return ['retry', None]
+        status = load_data(df
+                        , file
+                        , target_table
+                        , schema_name
+                        , connection
+                        , load_options
+                        , meta_data.get('lazy_stats'))  # load data to target database
+
+        # A streamed file whose later part has wider types than its first chunk is read and loaded again as a whole, its types are taken from all of it
+        if status[0] == 3:
+            logging.warning('%s, loading file %s again as a whole', status[1], file)
+            fileprocessing.generate_error_log_entry(profile_hk, target_table, str(status[1]), connection)
+            return load_file(file, supported_delimiters, schema_name, target_table, connection, dict(load_options, streaming=False), scheduler)
+        if status[0] == 1:  # if not able to load data, move file to error folder
+            filesniffer.forget_dialect(os.path.dirname(file))  # next file in folder is sniffed again
+            schemaregistry.forget_table(schema_name, target_table)  # and its types are inferred again
+            status = fileprocessing.generate_error_log_entry(profile_hk
+                                                             , target_table
+                                                             , str(status[1])
+                                                             , connection)
+            return ['error', None]
+        # if previous file was not processed to schema or data issues skip the file
+        if status[0] == 2:  # if not able to load data, move file to error folder
+            return ['retry', None]
+     
+        # Drop the load table once its data is in the target table
+        if status[1] not in ['NEW.TABLE', 'DIRECT.APPEND']:
+            ddlcoordinator.submit_drop(*str(status[1]).split('.'))
+
+        return ['loaded', functools.partial(close_load, profile_hk, file_name, schema_name, target_table, status[2], meta_data, connection)]
+    else:  # data was not processed into dataframe
+        message = 'Error reading file into a dataframe...Make sure format is supported.'
+        status = fileprocessing.generate_error_log_entry(file_name
+                                                         , target_table
+                                                         , message
+                                                         , connection)
+        return ['error', None]
+
+# This function reads a single (local) file for its load. Returns the data object (dataframe, dask dataframe or generator of chunks) and its meta data,
+# or None when the file is already loaded. A file that can not be parsed is logged in the error log and returned as [-1, None].
+def read_file(file, supported_delimiters, schema_name, target_table, connection, load_options, scheduler=None):
+    file_name = os.path.basename(file)
+
+    # Check that file is not already loaded, by content when content dedup is on (the file is hashed before it is parsed) else by name
+    content_hash = None
+    if load_options.get('contentdedup'):
+        content_hash = contenthash.hash_file(file)
+        already_loaded = fileprocessing.is_content_loaded(content_hash
+                                                          , target_table
+                                                          , connection)
+    else:
+        already_loaded = fileprocessing.is_file_loaded(file_name
+                                                       , target_table
+                                                       , connection)
+    if already_loaded:
+        return None
+
+    # Parse types recorded for the table by earlier loads
+    table_schema = schemaregistry.get_table_schema(schema_name, target_table) if load_options.get('typedparsing') else None
+
+    # A file whose values no longer fit the recorded types (e.g. text in an integer column) is parsed again with type inference
+    try:
+        data_object = parse_file(file, supported_delimiters, load_options, content_hash, table_schema, scheduler)
+    except Exception as e:
+        if table_schema is None:
+            return get_parse_error(file, target_table, e, connection)
+        logging.warning('File %s does not parse with the recorded types of %s.%s, parsing it with type inference: %s', file, schema_name, target_table, e)
+        schemaregistry.forget_table(schema_name, target_table)
+        try:
+            data_object = parse_file(file, supported_delimiters, load_options, content_hash, None, scheduler)
+        except Exception as e:
+            return get_parse_error(file, target_table, e, connection)
+
+    stagetimer.set_profile_hk(data_object[1]['profile_hk'], data_object[1]['load_attempt'])
+    if memorygovernor.budget_bytes > 0 and isinstance(data_object[0], pd.DataFrame):
+        memorygovernor.learn_ratio(schema_name, target_table, file, data_object[0])  # next files of the table are estimated with it
+
+    return data_object
+
+# Attemp to create panda from file and figure out the delimiter used in file
+# Whole files can be parsed in the parse process pool, streamed files are parsed chunk by chunk on this thread
+# and large files are split into ranges that are parsed in the split process pool (or read by dask) from this thread
+# Stages run in the parse process pool are timed as a whole as part of parse
+def parse_file(file, supported_delimiters, load_options, content_hash, table_schema, scheduler=None):
+    with stagetimer.stage('parse') as stage_counts:
+        stage_counts['bytes'] = os.path.getsize(file)
+        if load_options.get('streaming') or filesplitter.should_split(file, load_options.get('splitthreshold')) or fileprocessing.is_out_of_core(file, load_options):
+            data_object = fileprocessing.prep_file(file, supported_delimiters, load_options, content_hash, table_schema)
+        else:
+            data_object = loadscheduler.run_parse(scheduler, fileprocessing.prep_file, file, supported_delimiters, load_options, content_hash, table_schema)
+
+    return data_object
+
+# Log a file that could not be parsed, the file is moved to the error folder
+def get_parse_error(file, target_table, error, connection):
+    logging.error('An exception occurred while parsing file %s: %s', file, error)
+    fileprocessing.generate_error_log_entry(os.path.basename(file), target_table, str(error), connection)
+    return [-1, None]
+
+# Close File load status, counters of streamed files are complete now that all chunks are read
+def close_load(profile_hk, file_name, schema_name, target_table, load_stats, meta_data, connection):
+    load_stats.update(meta_data.get('stream_stats', {}))
+    profile = load_stats.pop('profile', meta_data.get('profile'))  # dask dataframes are profiled while they are written
+    if profile is not None:
+        load_stats['duplicaterecords'] = profile['duplicaterecords']
+    fileprocessing.set_file_processed_status(profile_hk, meta_data['load_attempt'], connection, load_stats, meta_data.get('profile_write'))
+    if profile is not None:
+        fileprocessing.write_column_profile(profile_hk, meta_data['load_attempt'], target_table, profile, connection)
+        schemaregistry.register_profile(schema_name, target_table, profile)  # next files of the table are parsed with these types
+    fileledger.add_loaded_file(file_name, target_table, load_stats.get('contenthash', meta_data.get('contenthash')))
+
+
+# This function writes dataframe (or generator of dataframe chunks) to target database table.
+# lazy_stats are dask counters of a dask dataframe, they are worked out in the same pass as the partitions are written.
+# checkpoint is called with the open connection in the transaction that adds the rows to the target table (e.g. to save the offset of an increment).
+# load_name names the load table (and the load in messages) instead of the file, e.g. for a batch of files.
+# Returns 0 when loaded, 1 on error, 2 when the load table of an earlier attempt is still there and 3 when a streamed file has a part whose types
+# do not fit the table made from its first chunk (e.g. decimals after integers), nothing of it is kept then and it can be loaded again as a whole.
+def load_data(df_object, file_path, targettablename, schemaname, connection, load_options=None, lazy_stats=None, checkpoint=None, load_name=None):
     ret_val = []
 
+    if load_options is None:
+        load_options = {}
+    backend = dbwriters.get_writer_backend(connection[2], load_options.get('bulkload', True))
+
     file_name = os.path.splitext(os.path.basename(file_path))[0]
     full_file_name = file_name+os.path.splitext(os.path.basename(file_path))[1]
+    if load_name is not None:
+        file_name = full_file_name = load_name
     load_table = targettablename + '_' + file_name
     targettableexits = fileprocessing.check_table_exists(targettablename, schemaname, connection)
+    totalrecords = None
+    write_seconds = 0
+    load_stats = {}
+    new_table_lock = None
+    chunk_mismatch = False
+
+    # Only one file at a time can create the target table, others wait for it and then load through their load table
+    if not targettableexits:
+        new_table_lock = loadscheduler.get_table_lock(schemaname+'.'+targettablename)
+        new_table_lock.acquire()
+        targettableexits = fileprocessing.check_table_exists(targettablename, schemaname, connection)
+        if targettableexits:
+            new_table_lock.release()
+            new_table_lock = None
 
     # If this is first file for given table set up so that it is loaded directly
     if not targettableexits:
         load_table = targettablename
-        
-    # If load table for a file persists from last attempt, someone needs to delete manually
-    if fileprocessing.check_table_exists(load_table, schemaname, connection):
-        ret_val.append(2)
 
     try:
-
-        # Here we get create table statement and put in queue.
-        createtablescript = str(pd.io.sql.get_schema(df_object, 'load_table_name', con=connection[0])).replace('load_table_name',schemaname+'.'+load_table)
-        createtablequeue.put(createtablescript)
-
-        # lets wait for the table to be created
-        while not fileprocessing.check_table_exists(load_table, schemaname, connection):
-            time.sleep(5)            
-
-        if isinstance(df_object, pd.DataFrame):
-            df_object.to_sql(load_table
-                         , con=connection[0]
-                         , schema=schemaname
-                         , if_exists='append'
-                         , index=False
-                         , chunksize=10000)
-        else: # This will be run in case we use dask Dataframe instead.
-            df_object.to_sql(load_table
+        # When streaming, table definition is taken from the first chunk, for dask dataframes from its (empty) meta dataframe
+        if isinstance(df_object, types.GeneratorType):
+            df_chunk = next(df_object)
+        elif isinstance(df_object, dd.DataFrame):
+            df_chunk = df_object._meta
+        else:
+            df_chunk = df_object
+
+        # Files that fit the target table are appended to it directly in a single transaction, the rows are tagged with the datafilestagehk of the load.
+        # Others (and dask dataframes, whose partitions are written in separate transactions) go through their own load table.
+        direct_append = bool(targettableexits
+                             and load_options.get('directappend')
+                             and not isinstance(df_object, dd.DataFrame)
+                             and fileprocessing.check_append_compatible(df_chunk, targettablename, schemaname, connection))
+        if direct_append:
+            load_table = targettablename
+        else:
+            # If load table for a file persists from last attempt, someone needs to delete manually
+            if fileprocessing.check_table_exists(load_table, schemaname, connection):
+                ret_val.append(2)
+
+            # Here we get create table statement and hand it to the DDL coordinator. Load tables of an existing target get the types of the target.
+            createtablescript = None
+            if targettableexits:
+                createtablescript = schemaregistry.get_create_table_script(schemaname, targettablename, load_table, df_chunk.columns, connection)
+            if createtablescript is None:
+                createtablescript = str(pd.io.sql.get_schema(df_chunk, 'load_table_name', con=connection[0])).replace('load_table_name',schemaname+'.'+load_table)
+
+            # lets wait for the table to be created, raises the DDL error if it could not be created
+            with stagetimer.stage('ddlwait'):
+                ddlcoordinator.submit_ddl(createtablescript, schemaname, load_table).result()
+
+        if isinstance(df_object, pd.DataFrame) or isinstance(df_object, types.GeneratorType):
+            # Write chunks as they are parsed, when streaming the next chunk is read in the background while this one is written.
+            # Nothing is committed unless all chunks are written, so a failed direct append leaves the target table as it was.
+            totalrecords = 0
+            dtypes = df_chunk.dtypes
+            conn = connection[0].connect()
+            conn.begin()
+            try:
+                while df_chunk is not None:
+                    # A chunk whose types differ from the first chunk is checked against the table it is written to (made from the first chunk for a new table)
+                    if not df_chunk.dtypes.equals(dtypes):
+                        if not fileprocessing.check_append_compatible(df_chunk, load_table, schemaname, connection):
+                            chunk_mismatch = True
+                            raise ValueError('Part of file {} does not fit table {}.{}, load was rolled back'.format(full_file_name, schemaname, load_table))
+                        dtypes = df_chunk.dtypes
+                    with stagetimer.stage('write') as stage_counts:
+                        write_stats = dbwriters.timed_write(df_chunk, load_table, schemaname, conn, backend, connection, load_table != targettablename)
+                        stage_counts['records'] = write_stats[0]
+                    totalrecords += write_stats[0]
+                    write_seconds += write_stats[1]
+                    with stagetimer.stage('chunkwait'):   # next chunk, if parsing is behind this is time spent waiting for it
+                        df_chunk = next(df_object, None) if isinstance(df_object, types.GeneratorType) else None
+                with stagetimer.stage('commit'):
+                    if checkpoint is not None and load_table == targettablename:
+                        checkpoint(conn)
+                    conn.commit()
+            finally:
+                conn.close()
+        else: # This will be run in case we use dask Dataframe instead, partitions are written in parallel as they are read
+            backend = 'to_sql'
+            write_start = time.perf_counter()
+            writes = df_object.to_sql(load_table
                          , uri=connection[1]
                          , schema=schemaname
                          , if_exists='append'
                          , index=False
-                         , chunksize=10000)
-
-        if targettableexits:
+                         , chunksize=10000
+                         , parallel=True
+                         , compute=False)
+            stat_names = list((lazy_stats or {}).keys())
+            with stagetimer.stage('write') as stage_counts:   # dask partitions are read, profiled and written in parallel, it is all timed as write
+                results = dask.compute(writes, *[lazy_stats[name] for name in stat_names])
+                write_seconds = time.perf_counter() - write_start
+                load_stats = {name: value.item() if hasattr(value, 'item') else value for name, value in zip(stat_names, results[1:])}
+                totalrecords = load_stats.pop('totalrecords', None)
+                stage_counts['records'] = totalrecords
+
+        if targettableexits and not direct_append:
             # Insert data from temp table to actual target table
             insert_statement = "INSERT INTO {}.{} SELECT * FROM {}.[{}]".format(schemaname,targettablename, schemaname,load_table)
-            conn = connection[0].connect()
-            conn.execute(
-                sqlalchemy.text(insert_statement))
-            conn.commit()
-            conn.close()
+            with stagetimer.stage('merge') as stage_counts:
+                stage_counts['records'] = totalrecords
+                conn = connection[0].connect()
+                conn.execute(
+                    sqlalchemy.text(insert_statement))
+                if checkpoint is not None:
+                    checkpoint(conn)
+                conn.commit()
+                conn.close()
 
         print(f"Successfully loaded File '{full_file_name}' into table {schemaname}.{targettablename}")
         ret_val.append(0)
 
-        if targettableexits:
+        if direct_append:
+            ret_val.append('DIRECT.APPEND')
+            load_path = 'direct'
+        elif targettableexits:
             ret_val.append(schemaname+'.'+load_table)
+            load_path = 'loadtable'
         else:
             ret_val.append('NEW.TABLE')
+            load_path = 'newtable'
+
+        load_stats.update({'totalrecords': totalrecords,
+                           'loadpath': load_path,
+                           'loadbackend': backend,
+                           'rowspersecond': int(totalrecords/write_seconds) if totalrecords and write_seconds else None})
+        ret_val.append(load_stats)
 
     except Exception as e:
         logging.error('An exception occurred while loading panda into target table: %s', e)
-        ret_val.append(1)
+        if isinstance(df_object, types.GeneratorType):
+            df_object.close()  # stop reading the rest of the file
+        # A new target table made from this file is dropped, the next file creates it again from its own types
+        if new_table_lock is not None:
+            try:
+                if fileprocessing.check_table_exists(targettablename, schemaname, connection):
+                    ddlcoordinator.submit_drop(schemaname, targettablename).result()
+            except Exception as drop_error:
+                logging.error('Could not drop new table %s.%s of a failed load: %s', schemaname, targettablename, drop_error)
+        # and so is the load table of a file that is loaded again as a whole
+        elif chunk_mismatch and load_table != targettablename:
+            try:
+                ddlcoordinator.submit_drop(schemaname, load_table).result()
+            except Exception as drop_error:
+                logging.error('Could not drop load table %s.%s of a failed load: %s', schemaname, load_table, drop_error)
+        ret_val.append(3 if chunk_mismatch else 1)
         ret_val.append(e)
 
-    return ret_val
-
-# This function will continuously run to drop tmp tables, this is to deal with deadlock issues when multiple tables are being dropped
-def delete_load_table(connection):
-    while True:
-        # Drop temp table is insert was successful
-        if not deletetablequeue.empty():
-            tablename = deletetablequeue.get()
-            tablename = str(tablename).split('.')
-            if fileprocessing.check_table_exists(tablename[1], tablename[0], connection):
-                drop_table = "DROP TABLE {}.{}".format(tablename[0],tablename[1])
-
-                conn = connection[0].connect()
-                conn.execute(sqlalchemy.text(drop_table))
-                conn.commit()
-                conn.close()
-        time.sleep(10)
+    finally:
+        if new_table_lock is not None:
+            new_table_lock.release()
 
-# This function will continuously run to create tmp tables, this is to deal with deadlock issues when multiple tables are being created
-def create_load_table(connection):
-    while True:
-        # Drop temp table is insert was successful
-        if not createtablequeue.empty():
-            createtablescript = createtablequeue.get()
-            conn = connection[0].connect()
-            conn.execute(sqlalchemy.text(createtablescript))
-            conn.commit()
-            conn.close()
-        time.sleep(10)
+    return ret_val
 
+# Options on how files are read and loaded, from the FILE_PROCESSING and DATA_CLEANING sections of the configuration
+def get_load_options(config):
+    load_options = {'streaming': config.getboolean('FILE_PROCESSING', 'STREAMING', fallback=False),
+                    'chunksize': config.getint('FILE_PROCESSING', 'CHUNKSIZE', fallback=100000),
+                    'prefetchchunks': config.getint('FILE_PROCESSING', 'PREFETCHCHUNKS', fallback=2),
+                    'bulkload': config.getboolean('FILE_PROCESSING', 'BULKLOAD', fallback=True),
+                    'sniffbytes': config.getint('FILE_PROCESSING', 'SNIFFBYTES', fallback=65536),
+                    'dialectcache': config.getboolean('FILE_PROCESSING', 'DIALECTCACHE', fallback=True),
+                    'contentdedup': config.getboolean('FILE_PROCESSING', 'CONTENTDEDUP', fallback=False),
+                    'contentkey': config.getboolean('FILE_PROCESSING', 'CONTENTKEY', fallback=False),
+                    'splitthreshold': config.getint('FILE_PROCESSING', 'SPLITTHRESHOLD', fallback=512 * 1024 * 1024),
+                    'splitrangebytes': config.getint('FILE_PROCESSING', 'SPLITRANGEBYTES', fallback=64 * 1024 * 1024),
+                    'splitprocesses': config.getint('FILE_PROCESSING', 'SPLITPROCESSES', fallback=0),
+                    'profiling': config.getboolean('FILE_PROCESSING', 'PROFILING', fallback=True),
+                    'profilehashes': config.getint('FILE_PROCESSING', 'PROFILEHASHES', fallback=10000000),
+                    'readerengine': config.get('FILE_PROCESSING', 'READERENGINE', fallback='pandas'),
+                    'xmlrecordpath': config.get('FILE_PROCESSING', 'XMLRECORDPATH', fallback='*'),
+                    'typedparsing': config.getboolean('FILE_PROCESSING', 'TYPEDPARSING', fallback=True),
+                    'directappend': config.getboolean('FILE_PROCESSING', 'DIRECTAPPEND', fallback=False),
+                    'daskthreshold': config.getint('FILE_PROCESSING', 'DASKTHRESHOLD', fallback=0),
+                    'daskpartitionbytes': config.getint('FILE_PROCESSING', 'DASKPARTITIONBYTES', fallback=100 * 1024 * 1024),
+                    'cleaning': {'trim': config.getboolean('DATA_CLEANING', 'TRIM', fallback=True),
+                                 'emptytonull': config.getboolean('DATA_CLEANING', 'EMPTYTONULL', fallback=False),
+                                 'scrubcontrolcharacters': config.getboolean('DATA_CLEANING', 'SCRUBCONTROLCHARACTERS', fallback=False)}}
+
+    return load_options
 
 # Main Function Entry
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # needed for the parse process pool in the packaged exe
+
     # get information from configuration file.
     config = configparser.ConfigParser()
     config.read('setting.cfg')
@@ -207,66 +681,129 @@ if __name__ == "__main__":
     watched_folder = config['FILE_PATH']['ROOTDROPFOLDER']
     delimiters = urllib.parse.quote(config['SUPPORTED_DELIMITERS']['DELIMITERS'].strip()).split('~')
 
-    # This will be token used to determine which new table is in creation
-    deletetablequeue = queue.Queue()
-    createtablequeue = queue.Queue()
-
-
-    while True:
-        # Check all active threads
-        active_threads = []
-        for active_thread in threading.enumerate():
-            active_threads.append(active_thread.name)
-        
-        # If a drop folder does not exist exit the program
-        drop_folder = watched_folder + '/drop/'
-        if not os.path.isdir(drop_folder):
-            break
-
-        # Scan drop folder's first level folders for files
-        for (dir_root, dir_name, file_list) in os.walk(drop_folder):
-            # and we are just one level deep from drop folder,
-            # and folder is not empty,
-            # and folder is not currently being processed, start a thread to process files in the folder
-            if ((drop_folder != dir_root)
-                  and (dir_root.count(os.path.sep) ==1)
-                  and (len(file_list) != 0)
-                  and str(os.path.basename(dir_root)).lower() not in active_threads):
-
-                # Setup Master Thread Connection
-                # We are naming the thread with folder name (So we should have only one thread per folder)
-                connection = fileprocessing.getdbconnection(targetserver, targetdatabase, connectiontype, rdms, user, password)
-                schema_name = os.path.basename(os.path.dirname(dir_root))
-                threadname = str(os.path.basename(dir_root)).lower()
-
-                # Check if there is a load table delete thread
-                if 'datafilestage_delete_load_table' not in active_threads:
-                    deletethread = threading.Thread(target=delete_load_table,
-                                                    name = 'datafilestage_delete_load_table',
-                                                    args = (connection,))
-                    deletethread.start()
-
-                # Check if there is a load table create thread
-                if 'datafilestage_create_load_table' not in active_threads:
-                    createthread = threading.Thread(target=create_load_table,
-                                                    name = 'datafilestage_create_load_table',
-                                                    args = (connection,))
-                    createthread.start()
-
-                # If it is new table, and we are currently not processing a new table, put in queue
-                folderthread = threading.Thread(target=process_folder_files,
-                                                name=threadname,
-                                                args=(threadname,
-                                                      watched_folder,
-                                                      dir_root,
-                                                      delimiters,
-                                                      targetserver,
-                                                      targetdatabase,
-                                                      schema_name,
-                                                      connectiontype,
-                                                      rdms,
-                                                      user,
-                                                      password,))
-                folderthread.start()
-
-        time.sleep(5)  # Wait for 5 minutes before checking for new files
+    # Options on how files are read and loaded
+    load_options = get_load_options(config)
+
+    # If a drop folder does not exist exit the program
+    drop_folder = watched_folder + '/drop/'
+    if os.path.isdir(drop_folder):
+        # Files are handed out by the watcher once they are new or changed and have settled (are no longer being written)
+        # Files of incremental folders (schema/table) are loaded as they grow, they do not have to settle
+        fileoffsets.incremental_folders = {folder.strip().lower() for folder in config.get('INCREMENTAL', 'FOLDERS', fallback='').split(',') if folder.strip()}
+        fileoffsets.max_increment_bytes = config.getint('INCREMENTAL', 'MAXINCREMENTBYTES', fallback=256 * 1024 * 1024)
+        watcher = folderwatcher.create_watcher(drop_folder
+                                               , config.get('FILE_WATCHER', 'BACKEND', fallback='auto')
+                                               , config.getint('FILE_WATCHER', 'SETTLESECONDS', fallback=10)
+                                               , config.getint('FILE_WATCHER', 'RETRYSECONDS', fallback=300)
+                                               , fileoffsets.incremental_folders)
+        poll_seconds = config.getint('FILE_WATCHER', 'POLLSECONDS', fallback=5)
+
+        # Small files of batched folders (schema/table) are loaded together, up to MAXBATCHFILES files, MAXBATCHBYTES bytes and MAXBATCHROWS records a load
+        filebatcher.batch_folders = {folder.strip().lower() for folder in config.get('BATCHING', 'FOLDERS', fallback='').split(',') if folder.strip()}
+        filebatcher.max_file_bytes = config.getint('BATCHING', 'MAXFILEBYTES', fallback=1024 * 1024)
+        filebatcher.max_batch_files = config.getint('BATCHING', 'MAXBATCHFILES', fallback=500)
+        filebatcher.max_batch_bytes = config.getint('BATCHING', 'MAXBATCHBYTES', fallback=64 * 1024 * 1024)
+        filebatcher.max_batch_rows = config.getint('BATCHING', 'MAXBATCHROWS', fallback=1000000)
+        filebatcher.wait_seconds = config.getfloat('BATCHING', 'WAITSECONDS', fallback=0)
+
+        # Files are loaded by a fixed pool of workers
+        scheduler = loadscheduler.create_scheduler(config.getint('SCHEDULER', 'MAXWORKERS', fallback=4)
+                                                   , config.getint('SCHEDULER', 'PERTABLEWORKERS', fallback=2)
+                                                   , config.getboolean('SCHEDULER', 'ORDERED', fallback=False)
+                                                   , config.getint('SCHEDULER', 'PARSEPROCESSES', fallback=0)
+                                                   , config.getint('SCHEDULER', 'FILESPERTURN', fallback=10))
+
+        # Setup Master Connection, one pooled engine shared by all workers (plus the DDL coordinator and the main loop)
+        connection = fileprocessing.getdbconnection(targetserver
+                                                    , targetdatabase
+                                                    , connectiontype
+                                                    , rdms
+                                                    , user
+                                                    , password
+                                                    , config.getint('SCHEDULER', 'MAXWORKERS', fallback=4) + 2
+                                                    , config.getint('DATABASE_SERVER', 'POOLRECYCLE', fallback=1800))
+
+        # Table/column information is cached, our own DDL updates the cache
+        catalogcache.ttl_seconds = config.getint('DATABASE_SERVER', 'CATALOGCACHESECONDS', fallback=300)
+        ddlcoordinator.ddl_listeners.append(catalogcache.invalidate_table)
+
+        # Loaded files are kept in memory, new loads from the log table are read every LEDGERREFRESHSECONDS
+        # and loads that were still running when they were read are looked at again for LEDGERPENDINGSECONDS
+        fileledger.refresh_seconds = config.getint('DATABASE_SERVER', 'LEDGERREFRESHSECONDS', fallback=60)
+        fileledger.pending_seconds = config.getint('DATABASE_SERVER', 'LEDGERPENDINGSECONDS', fallback=24 * 60 * 60)
+        fileledger.refresh_ledger(connection)
+
+        # Files are copied to local disk before they are read when a spool folder is set
+        filespool.spool_folder = config.get('FILE_PATH', 'SPOOLFOLDER', fallback='').strip() or None
+
+        # Files are moved to the archive/error folders in the background, optionally into a zip bundle per day.
+        # Loaded files a previous run did not get to move are archived first.
+        filemover.archive_bundles = config.getboolean('FILE_PATH', 'ARCHIVEBUNDLES', fallback=False)
+        filemover.start_file_mover()
+        if not load_options['contentdedup']:
+            reconcile_drop_folder(watched_folder, connection)
+
+        # Stages of loads are timed for all folders (STAGETIMING) or only the schema/table folders in STAGETIMINGFOLDERS,
+        # stage totals and queue depths are written in prometheus text format to METRICSFILE
+        stagetimer.enabled = config.getboolean('METRICS', 'STAGETIMING', fallback=False)
+        stagetimer.timed_folders = {folder.strip().lower() for folder in config.get('METRICS', 'STAGETIMINGFOLDERS', fallback='').split(',') if folder.strip()}
+        # Loads are admitted while their estimated memory fits MEMORYBUDGET (bytes, 0 admits every load), larger ones are streamed or wait
+        memorygovernor.budget_bytes = config.getint('SCHEDULER', 'MEMORYBUDGET', fallback=0)
+        memorygovernor.stream_reserve_bytes = config.getint('SCHEDULER', 'STREAMRESERVEBYTES', fallback=256 * 1024 * 1024)
+        memorygovernor.set_base_rss()
+
+        metrics_file = config.get('METRICS', 'METRICSFILE', fallback='').strip()
+        if metrics_file:
+            stagetimer.gauges.update({'datafilestage_files_queued': functools.partial(loadscheduler.get_queue_depth, scheduler),
+                                      'datafilestage_files_running': functools.partial(loadscheduler.get_running_count, scheduler),
+                                      'datafilestage_ddl_queue_depth': ddlcoordinator.get_queue_depth,
+                                      'datafilestage_move_queue_depth': filemover.get_queue_depth,
+                                      'datafilestage_audit_queue_depth': auditwriter.get_queue_depth,
+                                      'datafilestage_active_threads': threading.active_count,
+                                      'datafilestage_memory_reserved_bytes': lambda: memorygovernor.get_stats()['reservedbytes'],
+                                      'datafilestage_loads_admitted': lambda: memorygovernor.get_stats()['admitted'],
+                                      'datafilestage_loads_deferred': lambda: memorygovernor.get_stats()['deferred'],
+                                      'datafilestage_loads_downgraded': lambda: memorygovernor.get_stats()['downgraded']})
+            stagetimer.start_metrics_writer(metrics_file, config.getint('METRICS', 'METRICSSECONDS', fallback=15))
+
+        # Text columns with up to CATEGORYLIMIT distinct values are parsed as categoricals once a file of the table is loaded
+        schemaregistry.category_limit = config.getint('FILE_PROCESSING', 'CATEGORYLIMIT', fallback=1000)
+
+        # Log rows and load status updates are written in batches by a single writer thread every AUDITFLUSHSECONDS (0 writes them one at a time)
+        audit_flush_seconds = config.getfloat('DATABASE_SERVER', 'AUDITFLUSHSECONDS', fallback=1)
+        if audit_flush_seconds > 0:
+            auditwriter.start_audit_writer(connection, audit_flush_seconds, config.getint('DATABASE_SERVER', 'AUDITBATCHSIZE', fallback=500))
+
+        # All CREATE/DROP TABLE statements are run by a single coordinator thread
+        ddlcoordinator.start_ddl_coordinator(connection
+                                             , config.getint('DDL_COORDINATOR', 'DROPBATCHSIZE', fallback=50)
+                                             , config.getint('DDL_COORDINATOR', 'DROPBATCHSECONDS', fallback=5))
+
+    while os.path.isdir(drop_folder):
+        # Hand files that are ready to the scheduler, files of the same folder (table) are loaded in order of their timestamp
+        for dir_root, file_list in folderwatcher.get_ready_files(watcher).items():
+            schema_name = os.path.basename(os.path.dirname(dir_root))
+            batching = None
+            if filebatcher.is_batched(schema_name, os.path.basename(dir_root)) and not fileoffsets.is_incremental(schema_name, os.path.basename(dir_root)):
+                batching = filebatcher.create_batching(functools.partial(process_batch
+                                                                         , monitor_folder=watched_folder
+                                                                         , dir_path=dir_root
+                                                                         , supported_delimiters=delimiters
+                                                                         , schema_name=schema_name
+                                                                         , connection=connection
+                                                                         , load_options=load_options
+                                                                         , scheduler=scheduler))
+            loadscheduler.submit_files(scheduler
+                                       , dir_root
+                                       , file_list
+                                       , functools.partial(process_file
+                                                           , monitor_folder=watched_folder
+                                                           , dir_path=dir_root
+                                                           , supported_delimiters=delimiters
+                                                           , schema_name=schema_name
+                                                           , connection=connection
+                                                           , load_options=load_options
+                                                           , scheduler=scheduler)
+                                       , batching)
+
+        folderwatcher.wait_for_changes(watcher, poll_seconds)  # Wait for new files (or poll interval with folder scans)
@@ -14,10 +14,51 @@ CREATE TABLE [_admin].[datafilestagelog](
 	[filecreatetime] [datetime] NOT NULL,
 	[loadstarttime] [datetime] NOT NULL,
 	[loadtomemoryendtime] [datetime] NULL,
-	[loadendtime] [datetime] NULL
+	[loadendtime] [datetime] NULL,
+	[loadbackend] [varchar](20) NULL,
+	[rowspersecond] [int] NULL,
+	[contenthash] [char](64) NULL,
+	[loadpath] [varchar](10) NULL,
+	[loadattempt] [char](32) NULL
 ) 
 GO
 
+-- Columns added to an existing install (the CREATE TABLE above fails there, these add what is missing)
+IF COL_LENGTH('_admin.datafilestagelog', 'loadbackend') IS NULL
+	ALTER TABLE [_admin].[datafilestagelog] ADD [loadbackend] [varchar](20) NULL
+GO
+
+IF COL_LENGTH('_admin.datafilestagelog', 'rowspersecond') IS NULL
+	ALTER TABLE [_admin].[datafilestagelog] ADD [rowspersecond] [int] NULL
+GO
+
+IF COL_LENGTH('_admin.datafilestagelog', 'contenthash') IS NULL
+	ALTER TABLE [_admin].[datafilestagelog] ADD [contenthash] [char](64) NULL
+GO
+
+IF COL_LENGTH('_admin.datafilestagelog', 'loadpath') IS NULL
+	ALTER TABLE [_admin].[datafilestagelog] ADD [loadpath] [varchar](10) NULL
+GO
+
+IF COL_LENGTH('_admin.datafilestagelog', 'loadattempt') IS NULL
+	ALTER TABLE [_admin].[datafilestagelog] ADD [loadattempt] [char](32) NULL
+GO
+
+CREATE UNIQUE CLUSTERED INDEX [CIX_datafilestagelog_dataprofilingid] ON [_admin].[datafilestagelog] ([dataprofilingid])
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagelog_loadsuccessstatus] ON [_admin].[datafilestagelog] ([loadsuccessstatus], [dataprofilingid]) INCLUDE ([targettablename], [filename], [contenthash])
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagelog_targettablename_filename] ON [_admin].[datafilestagelog] ([targettablename], [filename]) INCLUDE ([loadsuccessstatus])
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagelog_datafilestagehk] ON [_admin].[datafilestagelog] ([datafilestagehk])
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagelog_targettablename_contenthash] ON [_admin].[datafilestagelog] ([targettablename], [contenthash]) INCLUDE ([loadsuccessstatus])
+GO
+
 CREATE TABLE [_admin].[datafilestageerrorlog](
 	[errorlogId] [int] IDENTITY(1,1) NOT NULL,
 	[datafilestagehk] [char](255) NOT NULL,
@@ -27,6 +68,61 @@ CREATE TABLE [_admin].[datafilestageerrorlog](
 )
 GO
 
+CREATE TABLE [_admin].[datafilestagecolumnprofile](
+	[columnprofileid] [int] IDENTITY(1,1) NOT NULL,
+	[datafilestagehk] [char](32) NOT NULL,
+	[targettablename] [varchar](255) NOT NULL,
+	[columnname] [nvarchar](255) NOT NULL,
+	[ordinalposition] [int] NOT NULL,
+	[datatype] [varchar](50) NULL,
+	[nullcount] [bigint] NULL,
+	[distinctestimate] [bigint] NULL,
+	[minvalue] [nvarchar](255) NULL,
+	[maxvalue] [nvarchar](255) NULL,
+	[maxlength] [int] NULL,
+	[loadattempt] [char](32) NULL
+)
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagecolumnprofile_datafilestagehk] ON [_admin].[datafilestagecolumnprofile] ([datafilestagehk])
+GO
+
+IF COL_LENGTH('_admin.datafilestagecolumnprofile', 'loadattempt') IS NULL
+	ALTER TABLE [_admin].[datafilestagecolumnprofile] ADD [loadattempt] [char](32) NULL
+GO
+
+CREATE TABLE [_admin].[datafilestagetiming](
+	[stagetimingid] [int] IDENTITY(1,1) NOT NULL,
+	[datafilestagehk] [char](32) NOT NULL,
+	[targettablename] [varchar](255) NOT NULL,
+	[stagename] [varchar](30) NOT NULL,
+	[ordinalposition] [int] NOT NULL,
+	[seconds] [float] NOT NULL,
+	[calls] [int] NOT NULL,
+	[records] [bigint] NULL,
+	[bytes] [bigint] NULL,
+	[loadattempt] [char](32) NULL
+)
+GO
+
+CREATE NONCLUSTERED INDEX [IX_datafilestagetiming_datafilestagehk] ON [_admin].[datafilestagetiming] ([datafilestagehk])
+GO
+
+IF COL_LENGTH('_admin.datafilestagetiming', 'loadattempt') IS NULL
+	ALTER TABLE [_admin].[datafilestagetiming] ADD [loadattempt] [char](32) NULL
+GO
+
+CREATE TABLE [_admin].[datafilestageoffset](
+	[targettablename] [varchar](255) NOT NULL,
+	[filename] [varchar](255) NOT NULL,
+	[byteoffset] [bigint] NOT NULL,
+	[headersignature] [char](64) NULL,
+	[datafilestagehk] [char](32) NULL,
+	[updatetime] [datetime] NULL,
+	CONSTRAINT [PK_datafilestageoffset] PRIMARY KEY ([targettablename], [filename])
+)
+GO
+
 -- POSTGRES
 CREATE TABLE _admin.datafilestagelog(
 	dataprofilingid int GENERATED ALWAYS AS IDENTITY,
@@ -43,9 +139,27 @@ CREATE TABLE _admin.datafilestagelog(
 	filecreatetime timestamp NOT NULL,
 	loadstarttime timestamp NOT NULL,
 	loadtomemoryendtime timestamp NULL,
-	loadendtime timestamp  NULL
+	loadendtime timestamp  NULL,
+	loadbackend varchar(20) NULL,
+	rowspersecond int NULL,
+	contenthash char(64) NULL,
+	loadpath varchar(10) NULL,
+	loadattempt char(32) NULL
 );
 
+-- Columns added to an existing install (the CREATE TABLE above fails there, these add what is missing)
+ALTER TABLE _admin.datafilestagelog ADD COLUMN IF NOT EXISTS loadbackend varchar(20) NULL;
+ALTER TABLE _admin.datafilestagelog ADD COLUMN IF NOT EXISTS rowspersecond int NULL;
+ALTER TABLE _admin.datafilestagelog ADD COLUMN IF NOT EXISTS contenthash char(64) NULL;
+ALTER TABLE _admin.datafilestagelog ADD COLUMN IF NOT EXISTS loadpath varchar(10) NULL;
+ALTER TABLE _admin.datafilestagelog ADD COLUMN IF NOT EXISTS loadattempt char(32) NULL;
+
+CREATE UNIQUE INDEX cix_datafilestagelog_dataprofilingid ON _admin.datafilestagelog (dataprofilingid);
+CREATE INDEX ix_datafilestagelog_loadsuccessstatus ON _admin.datafilestagelog (loadsuccessstatus, dataprofilingid) INCLUDE (targettablename, filename, contenthash);
+CREATE INDEX ix_datafilestagelog_targettablename_filename ON _admin.datafilestagelog (targettablename, filename) INCLUDE (loadsuccessstatus);
+CREATE INDEX ix_datafilestagelog_datafilestagehk ON _admin.datafilestagelog (datafilestagehk);
+CREATE INDEX ix_datafilestagelog_targettablename_contenthash ON _admin.datafilestagelog (targettablename, contenthash) INCLUDE (loadsuccessstatus);
+
 CREATE TABLE _admin.datafilestageerrorlog(
 	errorlogId int GENERATED ALWAYS AS IDENTITY,
 	datafilestagehk CHAR(255) NOT NULL,
@@ -54,6 +168,127 @@ CREATE TABLE _admin.datafilestageerrorlog(
 	errordatetime timestamp NULL
 );
 
+CREATE TABLE _admin.datafilestagecolumnprofile(
+	columnprofileid int GENERATED ALWAYS AS IDENTITY,
+	datafilestagehk CHAR(32) NOT NULL,
+	targettablename varchar(255) NOT NULL,
+	columnname varchar(255) NOT NULL,
+	ordinalposition int NOT NULL,
+	datatype varchar(50) NULL,
+	nullcount bigint NULL,
+	distinctestimate bigint NULL,
+	minvalue varchar(255) NULL,
+	maxvalue varchar(255) NULL,
+	maxlength int NULL,
+	loadattempt char(32) NULL
+);
+
+CREATE INDEX ix_datafilestagecolumnprofile_datafilestagehk ON _admin.datafilestagecolumnprofile (datafilestagehk);
+ALTER TABLE _admin.datafilestagecolumnprofile ADD COLUMN IF NOT EXISTS loadattempt char(32) NULL;
+
+CREATE TABLE _admin.datafilestagetiming(
+	stagetimingid int GENERATED ALWAYS AS IDENTITY,
+	datafilestagehk CHAR(32) NOT NULL,
+	targettablename varchar(255) NOT NULL,
+	stagename varchar(30) NOT NULL,
+	ordinalposition int NOT NULL,
+	seconds double precision NOT NULL,
+	calls int NOT NULL,
+	records bigint NULL,
+	bytes bigint NULL,
+	loadattempt char(32) NULL
+);
+
+CREATE INDEX ix_datafilestagetiming_datafilestagehk ON _admin.datafilestagetiming (datafilestagehk);
+ALTER TABLE _admin.datafilestagetiming ADD COLUMN IF NOT EXISTS loadattempt char(32) NULL;
+
+CREATE TABLE _admin.datafilestageoffset(
+	targettablename varchar(255) NOT NULL,
+	filename varchar(255) NOT NULL,
+	byteoffset bigint NOT NULL,
+	headersignature char(64) NULL,
+	datafilestagehk char(32) NULL,
+	updatetime timestamp NULL,
+	PRIMARY KEY (targettablename, filename)
+);
+
+-- SQLITE (local stand-in, run against the main database file. Other .db files in the same folder are attached as schemas)
+ATTACH DATABASE '_admin.db' AS _admin;
+
+CREATE TABLE _admin.datafilestagelog(
+	dataprofilingid INTEGER PRIMARY KEY AUTOINCREMENT,
+	datafilestagehk CHAR (32) NOT NULL,
+	filename varchar(255) NULL,
+	delimiter varchar(5) NULL,
+	targettablename varchar(255) NULL,
+	schemaname varchar(100) NOT NULL,
+	numberofcolumns int NULL,
+	totalrecords int NULL,
+	duplicaterecords int NULL,
+	invalidcharactersrecords int NULL,
+	loadsuccessstatus int NOT NULL,
+	filecreatetime timestamp NOT NULL,
+	loadstarttime timestamp NOT NULL,
+	loadtomemoryendtime timestamp NULL,
+	loadendtime timestamp  NULL,
+	loadbackend varchar(20) NULL,
+	rowspersecond int NULL,
+	contenthash char(64) NULL,
+	loadpath varchar(10) NULL,
+	loadattempt char(32) NULL
+);
+
+CREATE INDEX _admin.ix_datafilestagelog_loadsuccessstatus ON datafilestagelog (loadsuccessstatus, dataprofilingid, targettablename, filename, contenthash);
+CREATE INDEX _admin.ix_datafilestagelog_targettablename_filename ON datafilestagelog (targettablename, filename, loadsuccessstatus);
+CREATE INDEX _admin.ix_datafilestagelog_datafilestagehk ON datafilestagelog (datafilestagehk);
+CREATE INDEX _admin.ix_datafilestagelog_targettablename_contenthash ON datafilestagelog (targettablename, contenthash, loadsuccessstatus);
+
+CREATE TABLE _admin.datafilestageerrorlog(
+	errorlogId INTEGER PRIMARY KEY AUTOINCREMENT,
+	datafilestagehk CHAR(255) NOT NULL,
+	targettablename varchar(255) NULL,
+	message text NULL,
+	errordatetime timestamp NULL
+);
+
+CREATE TABLE _admin.datafilestagecolumnprofile(
+	columnprofileid INTEGER PRIMARY KEY AUTOINCREMENT,
+	datafilestagehk CHAR(32) NOT NULL,
+	targettablename varchar(255) NOT NULL,
+	columnname varchar(255) NOT NULL,
+	ordinalposition int NOT NULL,
+	datatype varchar(50) NULL,
+	nullcount bigint NULL,
+	distinctestimate bigint NULL,
+	minvalue varchar(255) NULL,
+	maxvalue varchar(255) NULL,
+	maxlength int NULL,
+	loadattempt char(32) NULL
+);
 
+CREATE INDEX _admin.ix_datafilestagecolumnprofile_datafilestagehk ON datafilestagecolumnprofile (datafilestagehk);
 
+CREATE TABLE _admin.datafilestagetiming(
+	stagetimingid INTEGER PRIMARY KEY AUTOINCREMENT,
+	datafilestagehk CHAR(32) NOT NULL,
+	targettablename varchar(255) NOT NULL,
+	stagename varchar(30) NOT NULL,
+	ordinalposition int NOT NULL,
+	seconds float NOT NULL,
+	calls int NOT NULL,
+	records bigint NULL,
+	bytes bigint NULL,
+	loadattempt char(32) NULL
+);
 
+CREATE INDEX _admin.ix_datafilestagetiming_datafilestagehk ON datafilestagetiming (datafilestagehk);
+
+CREATE TABLE _admin.datafilestageoffset(
+	targettablename varchar(255) NOT NULL,
+	filename varchar(255) NOT NULL,
+	byteoffset bigint NOT NULL,
+	headersignature char(64) NULL,
+	datafilestagehk char(32) NULL,
+	updatetime timestamp NULL,
+	PRIMARY KEY (targettablename, filename)
+);
@@ -0,0 +1,136 @@
+import csv
+import hashlib
+import io
+import logging
+import threading
+import time
+import pandas as pd
+import catalogcache
+import ddlcoordinator
+
+# Number of rows sent to the database in a single buffer/batch
+batch_size = 50000
+
+# Table types created for table valued parameters, (schema, type name)
+created_types = set()
+types_lock = threading.Lock()
+
+
+# This function returns the writer backend for the given rdms. When bulk load is turned off, pandas to_sql is used for all databases.
+def get_writer_backend(rdms, bulk_load=True):
+    if not bulk_load:
+        return 'to_sql'
+
+    if rdms == 'postgres':
+        return 'copy'
+    if rdms == 'MSSQL':
+        return 'mssql_tvp'
+    if rdms == 'sqlite':
+        return 'sqlite'
+
+    return 'to_sql'
+
+# This function writes a dataframe into schema.table with the given backend and returns the number of rows written.
+# conn is an open sqlalchemy connection, the caller owns the transaction (commit/rollback). connection is the shared engine (for table information and DDL).
+# table_lock is set for load tables, only this load writes to them so the whole table can be locked.
+def write_dataframe(df_object, table_name, schema_name, conn, backend, connection=None, table_lock=False):
+    if backend == 'copy':
+        return write_postgres_copy(df_object, table_name, schema_name, conn)
+    if backend == 'mssql_tvp':
+        return write_mssql_tvp(df_object, table_name, schema_name, conn, connection, table_lock)
+    if backend == 'sqlite':
+        return write_sqlite(df_object, table_name, schema_name, conn)
+
+    df_object.to_sql(table_name
+                     , con=conn
+                     , schema=schema_name
+                     , if_exists='append'
+                     , index=False
+                     , chunksize=10000)
+    return len(df_object)
+
+# Stream dataframe as csv buffers through COPY ... FROM STDIN
+def write_postgres_copy(df_object, table_name, schema_name, conn):
+    columns = ','.join('"{}"'.format(str(column).replace('"', '""')) for column in df_object.columns)
+    copy_statement = 'COPY "{}"."{}" ({}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'.format(schema_name, table_name, columns)
+
+    cursor = conn.connection.cursor()
+    try:
+        for start in range(0, len(df_object), batch_size):
+            buffer = io.StringIO()
+            df_object.iloc[start:start + batch_size].to_csv(buffer, index=False, header=False, na_rep='\\N', quoting=csv.QUOTE_MINIMAL)
+            buffer.seek(0)
+            cursor.copy_expert(copy_statement, buffer)
+    finally:
+        cursor.close()
+
+    return len(df_object)
+
+# Send dataframe as table valued parameters, each batch goes to the server as one bulk row stream and is inserted with a single INSERT ... SELECT.
+# TABLOCK (load tables only) lets sql server minimally log inserts into the heap load tables.
+def write_mssql_tvp(df_object, table_name, schema_name, conn, connection, table_lock=False):
+    type_name = get_table_type(schema_name, table_name, df_object.columns, connection)
+    columns = ','.join('[{}]'.format(str(column).replace(']', ']]')) for column in df_object.columns)
+    insert_statement = 'INSERT INTO [{}].[{}]{} ({}) SELECT {} FROM ?'.format(schema_name, table_name, ' WITH (TABLOCK)' if table_lock else '', columns, columns)
+
+    cursor = conn.connection.cursor()
+    try:
+        for rows in get_row_batches(df_object):
+            cursor.execute(insert_statement, [[type_name, schema_name] + rows])   # type name and schema first, then the rows of the parameter
+    finally:
+        cursor.close()
+
+    return len(df_object)
+
+# Table type with the columns of schema.table, created through the DDL coordinator the first time it is needed. The name is derived from the
+# column definitions, so the load tables of a target (same columns as the target) share one type and it is never dropped.
+def get_table_type(schema_name, table_name, column_names, connection):
+    table_columns = catalogcache.get_table_columns(schema_name, table_name, connection)
+    if [str(column).lower() for column in column_names] != [column['name'].lower() for column in table_columns]:
+        raise ValueError('Columns of the data do not match table {}.{}'.format(schema_name, table_name))
+
+    column_definitions = ['[{}] {}'.format(column['name'].replace(']', ']]'), column['type_definition']) for column in table_columns]
+    type_name = 'datafilestage_tvp_' + hashlib.md5('\n'.join(column_definitions).encode('utf-8')).hexdigest()[:16]
+
+    with types_lock:
+        if (schema_name.lower(), type_name) in created_types:
+            return type_name
+
+    create_type_script = "IF TYPE_ID(N'[{0}].[{1}]') IS NULL CREATE TYPE [{0}].[{1}] AS TABLE (\n\t{2}\n)".format(schema_name, type_name, ',\n\t'.join(column_definitions))
+    ddlcoordinator.submit_ddl(create_type_script, schema_name, type_name).result()
+    with types_lock:
+        created_types.add((schema_name.lower(), type_name))
+    return type_name
+
+# Stand-in backend used for local runs and tests, schemas are attached sqlite databases
+def write_sqlite(df_object, table_name, schema_name, conn):
+    columns = ','.join('"{}"'.format(str(column).replace('"', '""')) for column in df_object.columns)
+    parameters = ','.join('?' * len(df_object.columns))
+    insert_statement = 'INSERT INTO "{}"."{}" ({}) VALUES ({})'.format(schema_name, table_name, columns, parameters)
+
+    cursor = conn.connection.cursor()
+    try:
+        for rows in get_row_batches(df_object):
+            cursor.executemany(insert_statement, rows)
+    finally:
+        cursor.close()
+
+    return len(df_object)
+
+# Generator of row tuples in batches, with missing values as None and timestamps as python datetimes
+def get_row_batches(df_object):
+    for start in range(0, len(df_object), batch_size):
+        df_batch = df_object.iloc[start:start + batch_size].astype(object)
+        df_batch = df_batch.where(df_batch.notna(), None)
+        rows = []
+        for row in df_batch.itertuples(index=False, name=None):
+            rows.append(tuple(value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row))
+        yield rows
+
+# Helper to time a write, returns rows written and rows per second
+def timed_write(df_object, table_name, schema_name, conn, backend, connection=None, table_lock=False):
+    write_start_time = time.perf_counter()
+    rows = write_dataframe(df_object, table_name, schema_name, conn, backend, connection, table_lock)
+    elapsed = time.perf_counter() - write_start_time
+    logging.info('%s rows written to %s.%s with %s in %.2f seconds', rows, schema_name, table_name, backend, elapsed)
+    return [rows, elapsed]
@@ -0,0 +1,126 @@
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+import sqlalchemy
+
+# DDL is run one statement at a time by a single thread, this is to deal with deadlock issues when multiple tables are created/dropped at once
+ddl_queue = queue.Queue()
+coordinator_lock = threading.Lock()
+coordinator_thread = None
+
+# Functions called with (schema, table, exists) after DDL on a table ran, e.g. to refresh cached table information.
+# exists is False after a drop, None when the table has to be checked again.
+ddl_listeners = []
+
+
+# This function starts the coordinator thread (once). Table drops are run together once drop_batch_size of them are queued,
+# drop_batch_seconds passed since the first one was queued, or there is no other DDL waiting.
+def start_ddl_coordinator(connection, drop_batch_size=50, drop_batch_seconds=5):
+    global coordinator_thread
+
+    with coordinator_lock:
+        if coordinator_thread is None or not coordinator_thread.is_alive():
+            coordinator_thread = threading.Thread(target=run_ddl_coordinator,
+                                                  name='datafilestage_ddl_coordinator',
+                                                  args=(connection, drop_batch_size, drop_batch_seconds),
+                                                  daemon=True)
+            coordinator_thread.start()
+
+# Queue a DDL script for schema.table. Returns a future that completes as soon as the script committed, or holds the exception if it failed.
+def submit_ddl(script, schema_name, table_name):
+    future = concurrent.futures.Future()
+    ddl_queue.put(('ddl', script, schema_name, table_name, future))
+    return future
+
+# Queue a table drop. Returns a future that completes once the drop batch committed.
+def submit_drop(schema_name, table_name):
+    future = concurrent.futures.Future()
+    ddl_queue.put(('drop', None, schema_name, table_name, future))
+    return future
+
+# Number of DDL statements waiting
+def get_queue_depth():
+    return ddl_queue.qsize()
+
+# Coordinator loop, DDL statements are run as they come in and drops are collected into batches
+def run_ddl_coordinator(connection, drop_batch_size, drop_batch_seconds):
+    pending_drops = []
+    first_drop_time = None
+
+    while True:
+        timeout = None
+        if pending_drops:
+            timeout = max(first_drop_time + drop_batch_seconds - time.monotonic(), 0)
+
+        try:
+            item = ddl_queue.get(timeout=timeout)
+        except queue.Empty:
+            item = None
+
+        if item is not None and item[0] == 'drop':
+            if not pending_drops:
+                first_drop_time = time.monotonic()
+            pending_drops.append(item)
+            item = None
+
+        if item is not None:
+            run_ddl(connection, item)
+
+        # Run drops once batch is full, old enough or nothing else is waiting
+        if pending_drops and (len(pending_drops) >= drop_batch_size
+                              or time.monotonic() - first_drop_time >= drop_batch_seconds
+                              or ddl_queue.empty()):
+            run_drops(connection, pending_drops)
+            pending_drops = []
+
+# Run a single DDL script and complete its future
+def run_ddl(connection, item):
+    script, schema_name, table_name, future = item[1:]
+
+    try:
+        conn = connection[0].connect()
+        try:
+            conn.execute(sqlalchemy.text(script))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error('An exception occurred while running DDL for %s.%s: %s', schema_name, table_name, e)
+        notify_listeners(schema_name, table_name, None)
+        future.set_exception(e)
+        return
+
+    notify_listeners(schema_name, table_name, None)
+    future.set_result(True)
+
+# Drop tables in one transaction, if that fails drop them one by one so that one bad table does not hold up the others
+def run_drops(connection, items):
+    try:
+        conn = connection[0].connect()
+        try:
+            for item in items:
+                conn.execute(sqlalchemy.text(get_drop_statement(item[2], item[3])))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.warning('Dropping %s load tables together failed, dropping them one at a time: %s', len(items), e)
+        for item in items:
+            run_ddl(connection, ('ddl', get_drop_statement(item[2], item[3])) + item[2:])
+        return
+
+    for item in items:
+        notify_listeners(item[2], item[3], False)
+        item[4].set_result(True)
+
+def get_drop_statement(schema_name, table_name):
+    return "DROP TABLE IF EXISTS {}.{}".format(schema_name, table_name)
+
+def notify_listeners(schema_name, table_name, exists):
+    for listener in ddl_listeners:
+        try:
+            listener(schema_name, table_name, exists)
+        except Exception as e:
+            logging.error('An exception occurred in DDL listener: %s', e)
@@ -0,0 +1,138 @@
+import logging
+import xml.etree.ElementTree as ElementTree
+import pandas as pd
+import compressedfiles
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Records of an xml file are the elements at this path below the root element, tags separated by / and * for any tag
+record_path = '*'
+
+
+# Reader that gives the first sheet of an excel workbook as dataframes of chunksize rows. The workbook is opened read only,
+# rows are read one at a time and never held all at once. The first row is the header. Used like a pandas chunk reader.
+class ExcelReader:
+    def __init__(self, file_path, chunksize=100000):
+        if openpyxl is None:
+            raise ImportError('openpyxl is needed to read excel files')
+        self.file = compressedfiles.open_data_file(file_path)
+        self.workbook = openpyxl.load_workbook(self.file, read_only=True, data_only=True)
+        self.chunksize = chunksize
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        rows = self.workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else 'column' + str(i+1) for i, name in enumerate(header)]
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) == self.chunksize:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+
+    def close(self):
+        self.workbook.close()
+        self.file.close()
+
+# Reader that gives the records of an xml file as dataframes of chunksize rows, attributes and child elements of a record are its columns.
+# The file is read with iterparse and each record is removed from the tree once it is read, so memory stays flat. Used like a pandas chunk reader.
+class XmlReader:
+    def __init__(self, file_path, chunksize=100000, path=None):
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.path = (path or record_path).strip('/').split('/')
+        self.events = None
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        self.file = compressedfiles.open_data_file(self.file_path)
+        self.events = ElementTree.iterparse(self.file, events=('start', 'end'))
+        elements = []   # open elements from the root down
+        chunk = []
+
+        for event, element in self.events:
+            if event == 'start':
+                elements.append(element)
+                continue
+
+            elements.pop()
+            if len(elements) == len(self.path) and is_record_path(elements[1:] + [element], self.path):
+                chunk.append(get_record(element))
+                del elements[-1][:]   # remove the record (and anything before it) from its parent
+                if len(chunk) == self.chunksize:
+                    yield infer_types(pd.DataFrame(chunk))
+                    chunk = []
+
+        if chunk:
+            yield infer_types(pd.DataFrame(chunk))
+
+    def close(self):
+        if self.events is not None and hasattr(self.events, 'close'):
+            self.events.close()
+        self.events = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# Reader that gives a line delimited json file as dataframes of chunksize rows
+def open_json_reader(file_path, chunksize=100000):
+    return pd.read_json(file_path, lines=True, chunksize=chunksize)
+
+# Tells if the elements below the root match the record path
+def is_record_path(elements, path):
+    return all(tag == '*' or tag == local_name(element.tag) for element, tag in zip(elements, path))
+
+# Columns of a record, attributes first and then the text of child elements
+def get_record(element):
+    record = {local_name(name): value for name, value in element.attrib.items()}
+    for child in element:
+        record[local_name(child.tag)] = child.text.strip() if child.text is not None and len(child) == 0 else None
+    if not record and element.text is not None:
+        record[local_name(element.tag)] = element.text.strip()
+    return record
+
+# Tag without its namespace
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+# xml values are all text, give columns that are all numbers a numeric type (as pd.read_xml does)
+def infer_types(df_object):
+    for column in df_object.columns:
+        try:
+            df_object[column] = pd.to_numeric(df_object[column])
+        except (ValueError, TypeError):
+            continue
+    return df_object
+
+# Reader for a non delimited file (.xlsx, .xml, .json), None for other files
+def open_document_reader(file_path, file_extension, chunksize=100000, xml_record_path=None):
+    if file_extension == '.xlsx':
+        return ExcelReader(file_path, chunksize)
+    if file_extension == '.xml':
+        return XmlReader(file_path, chunksize, xml_record_path)
+    if file_extension == '.json':
+        return open_json_reader(file_path, chunksize)
+    logging.info('No document reader for %s', file_path)
+    return None
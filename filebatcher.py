@@ -0,0 +1,60 @@
+import os
+import compressedfiles
+
+# Table folders (schema/table) whose small files are loaded in batches: the small files queued for the folder are parsed one after
+# the other and loaded together through one load table, instead of a load (log row, load table, insert, drop) per file
+batch_folders = set()
+
+# Files up to max_file_bytes are batched, a batch holds at most max_batch_files files and max_batch_bytes bytes
+max_file_bytes = 1024 * 1024
+max_batch_files = 500
+max_batch_bytes = 64 * 1024 * 1024
+
+# Records loaded together, a batch with more records is loaded in several loads
+max_batch_rows = 1000000
+
+# Seconds a batch waits for more files after its first file was taken (0 only batches the files already queued)
+wait_seconds = 0
+
+
+# Tells if small files of schema.table are loaded in batches
+def is_batched(schema_name, table_name):
+    return (schema_name + '/' + table_name).lower() in batch_folders
+
+# Only small plain delimited text files are batched, others (and files that are gone) are loaded on their own
+def is_batchable_file(file_path):
+    try:
+        file_size = os.path.getsize(file_path)
+    except OSError:
+        return False
+
+    return (file_size <= max_file_bytes
+            and compressedfiles.get_compression(file_path) is None
+            and not compressedfiles.is_zip(file_path)
+            and compressedfiles.get_data_extension(file_path) in ['.csv', '.txt', '.tsv', '.dat'])
+
+# Batching of a table folder for the scheduler, task(files) loads a batch
+def create_batching(task):
+    return {'task': task,
+            'accept': is_batchable_file,
+            'max_files': max_batch_files,
+            'max_bytes': max_batch_bytes,
+            'wait_seconds': wait_seconds}
+
+# Split parsed files into groups that are loaded together: files with the same columns, at most max_batch_rows records per group
+# (a file with more records is a group on its own). parsed holds (file, dataframe, ...) entries, they keep their order within a group.
+def group_files(parsed):
+    groups = []
+    open_groups = {}   # columns -> [entries, records]
+
+    for entry in parsed:
+        columns = tuple(entry[1].columns)
+        group = open_groups.get(columns)
+        if group is None or group[1] + len(entry[1]) > max_batch_rows:
+            group = [[], 0]
+            open_groups[columns] = group
+            groups.append(group[0])
+        group[0].append(entry)
+        group[1] += len(entry[1])
+
+    return groups
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+import sqlalchemy
+
+# Seconds between reads of newly loaded files from the log table
+refresh_seconds = 60
+
+# Seconds a log row that is still loading (loadsuccessstatus 0) is looked at again, after that it is taken as an abandoned attempt
+pending_seconds = 24 * 60 * 60
+
+# Pending rows read again per statement
+pending_batch_size = 500
+
+# (target table, file name) and (target table, content hash) of every file loaded successfully
+ledger_lock = threading.Lock()
+loaded_files = set()
+loaded_contents = set()
+high_water_mark = 0   # highest dataprofilingid read so far
+pending_ids = {}      # dataprofilingid of a row that was still loading when it was read -> time it was first read
+last_refresh = None
+
+# Only one thread at a time reads the log table
+refresh_lock = threading.Lock()
+
+
+# This function tells if a file was already loaded into the target table. The first call reads all successful loads from the log table,
+# later calls only read loads with a dataprofilingid above the high water mark (at most once every refresh_seconds).
+# Loads done by this process are added as they complete, so they are known right away.
+def is_loaded(file_name, target_table, connection):
+    if last_refresh is None or time.monotonic() - last_refresh >= refresh_seconds:
+        refresh_ledger(connection, refresh_seconds)
+
+    with ledger_lock:
+        return (target_table.lower(), file_name) in loaded_files
+
+# This function tells if a file with the same content (sha256) was already loaded into the target table, whatever its name was
+def is_content_loaded(content_hash, target_table, connection):
+    if last_refresh is None or time.monotonic() - last_refresh >= refresh_seconds:
+        refresh_ledger(connection, refresh_seconds)
+
+    with ledger_lock:
+        return (target_table.lower(), content_hash) in loaded_contents
+
+# Record a successful load
+def add_loaded_file(file_name, target_table, content_hash=None):
+    with ledger_lock:
+        loaded_files.add((target_table.lower(), file_name))
+        if content_hash is not None:
+            loaded_contents.add((target_table.lower(), content_hash))
+
+# Read loads above the high water mark from the log table. A row that is still loading when it is read (e.g. a load of another process)
+# can get its status after the mark has moved past it, it is read again by id on the next refreshes until it is loaded or pending_seconds passed.
+# With max_age the log table is not read when another thread refreshed the ledger less than max_age seconds ago.
+def refresh_ledger(connection, max_age=None):
+    global high_water_mark, last_refresh
+
+    with refresh_lock:
+        if max_age is not None and last_refresh is not None and time.monotonic() - last_refresh < max_age:
+            return
+
+        with ledger_lock:
+            from_id = high_water_mark
+            waiting_ids = [row_id for row_id, first_read in pending_ids.items() if time.monotonic() - first_read < pending_seconds]
+
+        conn = connection[0].connect()
+        try:
+            filelist = conn.execute(sqlalchemy.text("SELECT dataprofilingid, targettablename, filename, contenthash, loadsuccessstatus "
+                                                    "FROM _admin.datafilestagelog "
+                                                    "WHERE dataprofilingid > :hwm "
+                                                    "AND loadsuccessstatus IN (0, 1)"), {'hwm': from_id}).fetchall()
+            for start in range(0, len(waiting_ids), pending_batch_size):
+                filelist += conn.execute(sqlalchemy.text("SELECT dataprofilingid, targettablename, filename, contenthash, loadsuccessstatus "
+                                                         "FROM _admin.datafilestagelog "
+                                                         "WHERE dataprofilingid IN :ids "
+                                                         "AND loadsuccessstatus = 1").bindparams(sqlalchemy.bindparam('ids', expanding=True)),
+                                         {'ids': waiting_ids[start:start + pending_batch_size]}).fetchall()
+        finally:
+            conn.close()
+
+        with ledger_lock:
+            for row_id in set(pending_ids) - set(waiting_ids):
+                del pending_ids[row_id]   # abandoned
+            for row in filelist:
+                high_water_mark = max(high_water_mark, row[0])
+                if row[4] != 1:
+                    pending_ids.setdefault(row[0], time.monotonic())
+                    continue
+                pending_ids.pop(row[0], None)
+                loaded_files.add((str(row[1]).lower(), row[2]))
+                if row[3] is not None:
+                    loaded_contents.add((str(row[1]).lower(), str(row[3]).strip()))
+            last_refresh = time.monotonic()
+
+    if from_id == 0:
+        logging.info('Loaded file ledger with %s files', len(loaded_files))
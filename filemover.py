@@ -0,0 +1,84 @@
+import concurrent.futures
+import logging
+import os
+import queue
+import threading
+import time
+import stagetimer
+import fileprocessing
+
+# Files are moved to the archive and error folders by a single mover thread, so a worker can start its next file
+# as soon as a load is done instead of waiting for the move over the share
+move_queue = queue.Queue()
+mover_lock = threading.Lock()
+mover_thread = None
+
+# Files queued to be moved and not moved yet, they are skipped when they are handed out again in the meantime
+pending_lock = threading.Lock()
+pending_files = set()
+
+# Archived files are added to a zip bundle per day (<archive folder>/<yyyymmdd>.zip) instead of being moved as they are
+archive_bundles = False
+
+
+# This function starts the mover thread (once)
+def start_file_mover():
+    global mover_thread
+
+    with mover_lock:
+        if mover_thread is None or not mover_thread.is_alive():
+            mover_thread = threading.Thread(target=run_file_mover, name='datafilestage_file_mover', daemon=True)
+            mover_thread.start()
+
+# Queue a file to be archived. Returns a future that completes once the file is moved, or holds the exception if it could not be.
+# The move is added as a stage to the given stage timings (of the loads of the file).
+def submit_archive(file_path, archive_path, timings=()):
+    return submit_move('archive', file_path, archive_path, timings)
+
+# Queue a file to be moved to the error folder
+def submit_error(file_path, error_path, timings=()):
+    return submit_move('error', file_path, error_path, timings)
+
+def submit_move(kind, file_path, folder, timings=()):
+    future = concurrent.futures.Future()
+    with pending_lock:
+        pending_files.add(os.path.normpath(file_path))
+    move_queue.put((kind, file_path, folder, timings, future))
+    return future
+
+# Tells if a file is queued to be moved
+def is_pending(file_path):
+    with pending_lock:
+        return os.path.normpath(file_path) in pending_files
+
+# Number of files waiting to be moved
+def get_queue_depth():
+    return move_queue.qsize()
+
+# Mover loop, files are moved one at a time in the order they were queued
+def run_file_mover():
+    while True:
+        kind, file_path, folder, timings, future = move_queue.get()
+
+        try:
+            if not os.path.isfile(file_path):
+                logging.info('File %s was already moved', file_path)
+            else:
+                file_size = os.path.getsize(file_path)
+                move_start = time.perf_counter()
+                if kind == 'archive':
+                    fileprocessing.archive_file(file_path, folder, archive_bundles)
+                else:
+                    fileprocessing.error_file(file_path, folder)
+                for timing in timings:
+                    if timing is not None:
+                        stagetimer.add_stage(timing, kind, time.perf_counter() - move_start, bytes=file_size)
+        except Exception as e:
+            # The file stays in the drop folder, it is archived when it is handed out again as its load is in the ledger
+            logging.error('An exception occurred while moving file %s to %s: %s', file_path, folder, e)
+            future.set_exception(e)
+        else:
+            future.set_result(True)
+        finally:
+            with pending_lock:
+                pending_files.discard(os.path.normpath(file_path))
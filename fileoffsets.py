@@ -0,0 +1,82 @@
+import hashlib
+import logging
+import mmap
+import os
+from datetime import datetime
+import sqlalchemy
+import arrowreaders
+import compressedfiles
+import filesplitter
+
+# Table folders (schema/table) whose files are loaded incrementally: they are left in the drop folder and only records appended since the last load are loaded
+incremental_folders = set()
+
+# Most bytes loaded per increment, a file that grew more than this is loaded in several increments
+max_increment_bytes = 256 * 1024 * 1024
+
+
+# Tells if files of schema.table are loaded incrementally
+def is_incremental(schema_name, table_name):
+    return (schema_name + '/' + table_name).lower() in incremental_folders
+
+# Only plain delimited text files can be loaded from a byte offset
+def is_incremental_file(file_path):
+    return (compressedfiles.get_compression(file_path) is None
+            and not compressedfiles.is_zip(file_path)
+            and compressedfiles.get_data_extension(file_path) not in ['.xlsx', '.json', '.xml'] + arrowreaders.columnar_extensions)
+
+# This function returns the checkpoint of a file: the byte offset loaded up to and the signature of its header, None when nothing of the file was loaded yet
+def get_checkpoint(file_name, target_table, connection):
+    conn = connection[0].connect()
+    try:
+        row = conn.execute(sqlalchemy.text("SELECT byteoffset, headersignature "
+                                           "FROM _admin.datafilestageoffset "
+                                           "WHERE targettablename = :table AND filename = :file"),
+                           {'table': target_table.lower(), 'file': file_name}).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    return {'byteoffset': int(row[0]), 'headersignature': str(row[1]).strip() if row[1] is not None else None}
+
+# This function returns the next increment of a file: the header (put in front of the increment when it is parsed), the header signature and
+# the byte range of the complete records after the checkpoint. The file is loaded from the start again when its header changed or it got shorter.
+def get_increment(file_path, checkpoint, quotechar, header):
+    quote = quotechar.encode('latin-1') if quotechar else None
+
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            header_end = filesplitter.find_record_end(mapped_file, 0, quote)
+            header_bytes = mapped_file[0:header_end] if header else b''
+            signature = hashlib.sha256(mapped_file[0:header_end]).hexdigest()   # first record when there is no header
+
+            start = header_end if header else 0
+            if checkpoint is not None:
+                if checkpoint['headersignature'] == signature and checkpoint['byteoffset'] <= len(mapped_file):
+                    start = max(checkpoint['byteoffset'], start)
+                else:
+                    logging.warning('File %s was replaced or truncated, loading it from the start', file_path)
+
+            end = filesplitter.find_complete_end(mapped_file, start, quote, start + max_increment_bytes)
+
+    return {'header_bytes': header_bytes, 'signature': signature, 'start': start, 'end': end}
+
+# Save the checkpoint of a file on an open connection, so that it is committed in the same transaction as the records of the increment
+def save_checkpoint(conn, file_name, target_table, byte_offset, header_signature, profile_hk):
+    parameters = {'table': target_table.lower(),
+                  'file': file_name,
+                  'offset': byte_offset,
+                  'signature': header_signature,
+                  'hk': profile_hk,
+                  'time': datetime.now()}
+
+    result = conn.execute(sqlalchemy.text("UPDATE _admin.datafilestageoffset "
+                                          "SET byteoffset = :offset, headersignature = :signature, datafilestagehk = :hk, updatetime = :time "
+                                          "WHERE targettablename = :table AND filename = :file"), parameters)
+    if result.rowcount == 0:
+        conn.execute(sqlalchemy.text("INSERT INTO _admin.datafilestageoffset (targettablename, filename, byteoffset, headersignature, datafilestagehk, updatetime) "
+                                     "VALUES (:table, :file, :offset, :signature, :hk, :time)"), parameters)
@@ -3,22 +3,47 @@ import logging
 import os
 import time
 import pandas as pd
+import dask
 import dask.dataframe as dd
 import shutil
+import zipfile
 import pyodbc
 import sqlalchemy
 import hashlib
 import ctypes
-import csv
 import urllib.parse
+import datacleaning
+import filesniffer
+import catalogcache
+import fileledger
+import contenthash
+import filesplitter
+import dataprofiler
+import schemaregistry
+import arrowreaders
+import documentreaders
+import compressedfiles
+import stagetimer
+import auditwriter
+import threading
+import queue
+import types
 
 from ctypes import wintypes
 from pathlib import Path
 from datetime import datetime
 
 
-# this function returns a database engine based on config file
-def getdbconnection(server, database, connectiontype, rdms, usr, pwd):
+# Columns added to each file by add_meta_columns, they are not profiled
+meta_columns = ['datafilestagehk', 'filename', 'load_datetime']
+
+# Engines already created, one per connection string so that all workers share the same connection pool
+engines = {}
+engines_lock = threading.Lock()
+
+# this function returns a database engine based on config file. The engine is created once per process and shared,
+# pool_size should be at least the number of workers that load at the same time.
+def getdbconnection(server, database, connectiontype, rdms, usr, pwd, pool_size=5, pool_recycle=1800):
     # Set up the SQL Server connection
     connectionstring = None
     engine = None
@@ -32,13 +57,36 @@ def getdbconnection(server, database, connectiontype, rdms, usr, pwd):
     if rdms == 'postgres':
         connectionstring = 'postgresql+psycopg2://{}:{}@{}:5432/{}'.format(usr, pwd, server, database)  
 
+    # Local stand-in, server is the folder with the database files. Each other .db file in the folder is attached as a schema
+    if rdms == 'sqlite':
+        connectionstring = 'sqlite:///{}/{}.db'.format(urllib.parse.unquote(server), database)
+
     try:
-        engine = sqlalchemy.create_engine(connectionstring, fast_executemany=True)
+        with engines_lock:
+            engine = engines.get(connectionstring)
+            if engine is None:
+                if rdms == 'sqlite':
+                    engine = sqlalchemy.create_engine(connectionstring, pool_size=pool_size, pool_pre_ping=True)
+                    sqlalchemy.event.listen(engine, 'connect', lambda dbapi_connection, connection_record: attach_sqlite_schemas(dbapi_connection, urllib.parse.unquote(server), database))
+                else:
+                    engine = sqlalchemy.create_engine(connectionstring
+                                                      , fast_executemany=True
+                                                      , pool_size=pool_size
+                                                      , max_overflow=pool_size
+                                                      , pool_pre_ping=True
+                                                      , pool_recycle=pool_recycle)
+                engines[connectionstring] = engine
 
     except Exception as e:
         logging.error('An exception occurred while creating engine: %s', e)
 
-    return [engine,connectionstring]
+    return [engine,connectionstring,rdms]
+
+# Attach all database files in sqlite folder as schemas of the main database
+def attach_sqlite_schemas(dbapi_connection, folder, database):
+    for schema_file in Path(folder).glob('*.db'):
+        if schema_file.stem != database:
+            dbapi_connection.execute("ATTACH DATABASE '{}' AS \"{}\"".format(str(schema_file).replace("'", "''"), schema_file.stem))
 
 # function to compare table shemas and return any differences
 def check_schema_differences(left_table, right_table, connection):
@@ -116,161 +164,385 @@ def check_schema_differences(left_table, right_table, connection):
 
     return htmlcode
 
-# This function splits large file into manageable chunks
-def split_large_file(file_path, folder_name, archive_path):
-    folder_name = folder_name + '/'
-    breakup_size = 160000000  # Number of bytes to read, this should be about 150 MB
-
-    with open(file_path, 'r') as file:
-        # memory-map the file
-        base_file_name = os.path.splitext(os.path.basename(file_path))[0]
-        base_file_ext = os.path.splitext(os.path.basename(file_path))[1]
-        file_lines = file.readlines(breakup_size)
-        i = 0
-        # While we are able to read lines from file
-        while len(file_lines) > 0:
-            if i == 0:  # Get header from first file
-                header_line = file_lines[0]
-            file_name = folder_name + base_file_name + '_' + str(i) + '_' + str(breakup_size) + base_file_ext
-            small_file = open(f'{file_name}', 'a')
-
-            if i > 0:  # Place header for subsequent files
-                small_file.write(header_line)
-
-            small_file.writelines(file_lines)
-            small_file.close()
-
-            file_lines = file.readlines(breakup_size)
-            i += 1
-
-    archive_file(file_path, archive_path)
-    return
-
-# This function tries to figure out delimiter for files by looking at couple of lines
-def usedefaultdelimiter(file_path,supported_delimiters):
-    default = '\t'
-    with open(file_path, 'r') as file:
-        sample_lines = file.readlines()[0:5]
-
-    first_line = sample_lines[1]
-
-    for delimiter in supported_delimiters:
-        delimiter = urllib.parse.unquote(delimiter)
-        match = 0
-        column_count = len(first_line.split(delimiter))
-        number_of_lines = len(sample_lines)-1
-        for line in sample_lines[1:5]:
-            if len(line.split(delimiter)) == column_count:
-                   match += 1
-        if match ==  number_of_lines and column_count > 1:
-            return delimiter
-    return default
-
-
+# Database types a dataframe column can be written to without going through a load table, by pandas dtype kind
+text_types = ['varchar', 'nvarchar', 'char', 'nchar', 'text', 'ntext', 'character varying', 'character', 'clob']
+integer_types = ['int', 'integer', 'bigint', 'smallint', 'tinyint']
+float_types = ['float', 'real', 'double precision', 'double', 'numeric', 'decimal', 'money']
+datetime_types = ['datetime', 'datetime2', 'smalldatetime', 'date', 'timestamp', 'timestamp without time zone', 'timestamp with time zone', 'datetimeoffset']
+append_compatible_types = {'i': integer_types + float_types + text_types,
+                           'u': integer_types + float_types + text_types,
+                           'f': float_types + text_types,
+                           'b': ['bit', 'boolean', 'bool'] + integer_types,
+                           'M': datetime_types + text_types,
+                           'O': text_types}
+
+# This function tells if a dataframe (or first chunk of a stream) can be appended straight into the target table, from cached column information.
+# Columns have to match the target by name and position, and each column has to fit the type of the target column. Columns with only missing values fit any type.
+def check_append_compatible(df_object, targettable, schema_name, connection):
+    target_columns = catalogcache.get_table_columns(schema_name, targettable, connection)
+
+    if [str(column).lower() for column in df_object.columns] != [column['name'].lower() for column in target_columns]:
+        logging.info('Columns of file do not match %s.%s, loading through a load table', schema_name, targettable)
+        return False
+
+    for target_column, column in zip(target_columns, df_object.columns):
+        data_type = target_column['data_type'].split('(')[0].strip()
+        if data_type not in append_compatible_types.get(df_object[column].dtype.kind, []) and not df_object[column].isna().all():
+            logging.info('Column %s (%s) does not fit %s.%s (%s), loading through a load table', column, df_object[column].dtype, schema_name, targettable, data_type)
+            return False
+
+    return True
 
 # this functions returns a dataframe from data at a particular file path, appropiate funstion will be called based on file extention
-def prep_file(file_path,supported_delimiters):
+# When streaming is enabled in load options, csv files are returned as a generator of dataframe chunks instead of a single dataframe.
+# Files above the split threshold are parsed in parallel by range, each range is a chunk when streaming.
+# The content hash of the file is worked out while it is parsed, unless it is given (already hashed).
+# table_schema holds the parse types recorded for the target table, files with the recorded columns are parsed with them instead of type inference.
+def prep_file(file_path, supported_delimiters, load_options=None, content_hash=None, table_schema=None):
     # Start of process
     profiling_start_time = datetime.now()
 
-    # Determine file extension
-    file_extension = os.path.splitext(file_path)[1].lower()
+    if load_options is None:
+        load_options = {}
+
+    # Determine file extension, of the data inside for compressed files (data.csv.gz is read as a csv file)
+    file_extension = compressedfiles.get_data_extension(file_path)
+    compression = compressedfiles.get_compression(file_path)
 
     # Load the file into a Pandas DataFrame
     df_object = pd.DataFrame()
     delimiter = None
-    is_dask = False
-    numberofpartitions = 0
 
-    # Get file size in gb
-    byte=Path(file_path).stat().st_size
-    size_in_gb = byte/(1024 * 1024 * 1024)
-    size_in_mb = byte/(1024 * 1024)
-
-    # Get number of partitions in chunks of 100mb
-    numberofpartitions = int((size_in_mb//100)+1)
+    # Columnar files keep the column types they were written with, they are not sniffed. Only the columns of the table are read (column projection).
+    if file_extension in arrowreaders.columnar_extensions:
+        if not arrowreaders.is_available():
+            df_object = -1
+        elif compression is not None:
+            logging.error('Compressed columnar file %s is not supported, columnar files are compressed inside already', file_path)
+            df_object = -1
+        elif load_options.get('streaming'):
+            reader = arrowreaders.ColumnarReader(file_path, arrowreaders.get_projection(file_path, table_schema), load_options['chunksize'])
+            if content_hash is None:
+                content_hash = contenthash.hash_file(file_path)
+            return stream_file(reader, delimiter, file_path, profiling_start_time, load_options, None, content_hash)
+        else:
+            df_object = arrowreaders.read_columnar_file(file_path, arrowreaders.get_projection(file_path, table_schema))
+
+    elif file_extension not in ['.xlsx', '.json','.xml']:
+        # Figure out delimiter, quoting, header and encoding from the head of the file only
+        dialect = filesniffer.sniff_file(file_path
+                                         , supported_delimiters
+                                         , load_options.get('sniffbytes')
+                                         , load_options.get('dialectcache', True))
+        delimiter = dialect['delimiter']
+        read_options = get_read_options(dialect, table_schema)
+
+        # use dask dataframe for files above the out of core threshold, partitions are read (and loaded) one at a time and never held all at once
+        if is_out_of_core(file_path, load_options) and dialect['encoding'] in filesplitter.splittable_encodings:
+            df_object = dd.read_csv(file_path
+                                    , blocksize=load_options.get('daskpartitionbytes', 100 * 1024 * 1024)
+                                    , **read_options)
+            if content_hash is None:
+                content_hash = contenthash.hash_file(file_path)
+
+        # Large files are split into line aligned byte ranges that are parsed in parallel, the file is hashed up front as it is not read in one pass
+        elif filesplitter.should_split(file_path, load_options.get('splitthreshold')) and dialect['encoding'] in filesplitter.splittable_encodings:
+            split_object = filesplitter.split_ranges(file_path, load_options.get('splitrangebytes'), dialect['quotechar'], dialect['header'])
+            reader = filesplitter.RangeReader(file_path, split_object[0], split_object[1], read_options, load_options.get('splitprocesses', 0))
+            if content_hash is None:
+                content_hash = contenthash.hash_file(file_path)
+
+            if load_options.get('streaming'):
+                return stream_file(reader, delimiter, file_path, profiling_start_time, load_options, None, content_hash)
+            with reader:
+                df_object = pd.concat(list(reader), ignore_index=True)
+
+        # Arrow reader engine, the file is parsed by all threads into arrow backed dtypes (and hashed as it is read)
+        elif load_options.get('readerengine') == 'pyarrow' and arrowreaders.is_available():
+            csv_options = arrowreaders.get_csv_options(dialect, read_options.get('names'))
+            source = file_path if content_hash is not None else contenthash.open_hashing_file(file_path)
+            if load_options.get('streaming'):
+                return stream_file(arrowreaders.CsvReader(compressedfiles.get_data_source(source, compression), csv_options), delimiter, file_path, profiling_start_time, load_options, source, content_hash)
+            try:
+                df_object = arrowreaders.read_csv(compressedfiles.get_data_source(source, compression), csv_options)
+                if not isinstance(source, str):
+                    content_hash = contenthash.get_hash(source)
+            finally:
+                if not isinstance(source, str):
+                    source.close()
+
+        elif load_options.get('streaming'):
+            source = file_path if content_hash is not None else contenthash.open_hashing_file(file_path)
+            reader = pd.read_csv(compressedfiles.get_data_source(source, compression), chunksize=load_options['chunksize'], **read_options)
+            return stream_file(reader, delimiter, file_path, profiling_start_time, load_options, source, content_hash)
+
+        elif content_hash is not None:
+            df_object = pd.read_csv(file_path, **read_options)
 
-    if file_extension not in ['.xlsx', '.json','.xml']:
-        try:
-            # Sniffer functions is acting funny with big files, lets try to sniff just from the first 10 lines
-             temp_file = file_path+'.tmp'
-
-             with open(file_path, 'r') as file:
-                 lines = file.readlines()[:10]
-             with open(temp_file, 'w') as file:
-                 file.writelines(lines)
-             with open(temp_file, 'r') as file:
-                 delimiter = str(csv.Sniffer().sniff(file.read()).delimiter)
-
-             os.remove(temp_file)
-                
-        except:
-            os.remove(temp_file)
-            delimiter = usedefaultdelimiter(file_path,supported_delimiters)
-        
-        # use dask dataframe for files larger that 0.5 gb
-        if (1==0):
-            df_object = dd.read_csv(file_path, sep=delimiter, encoding='unicode_escape', skipinitialspace = True, low_memory=False)
-            is_dask = True
-            
         else:
-            df_object = pd.read_csv(file_path, sep=delimiter, encoding='unicode_escape', skipinitialspace = True, low_memory=False)
+            source = contenthash.open_hashing_file(file_path)
+            try:
+                df_object = pd.read_csv(compressedfiles.get_data_source(source, compression), **read_options)
+                content_hash = contenthash.get_hash(source)
+            finally:
+                source.close()
             
 
-    elif file_extension == '.xlsx':
-        df_object = pd.read_excel(file_path)
+    # Excel, xml and json documents are read record by record into chunks, when streaming the chunks go to the same pipeline as csv chunks
+    elif load_options.get('streaming'):
+        reader = documentreaders.open_document_reader(file_path, file_extension, load_options['chunksize'], load_options.get('xmlrecordpath'))
+        if content_hash is None:
+            content_hash = contenthash.hash_file(file_path)
+        return stream_file(reader, delimiter, file_path, profiling_start_time, load_options, None, content_hash)
+    elif file_extension in ['.xlsx', '.xml']:
+        with documentreaders.open_document_reader(file_path, file_extension, load_options.get('chunksize', 100000), load_options.get('xmlrecordpath')) as reader:
+            df_chunks = list(reader)
+        df_object = pd.concat(df_chunks, ignore_index=True) if df_chunks else -1
     elif file_extension == '.json':
         df_object = pd.read_json(file_path, lines=True)
-    elif file_extension == '.xml':
-        df_object = pd.read_xml(file_path)
     else:
         print(f"Unsupported file format: {file_extension}")
         df_object = -1
 
-    mod_object =  add_meta_data(df_object, delimiter, file_path, numberofpartitions, profiling_start_time)
+    if content_hash is None and isinstance(df_object, pd.DataFrame):
+        content_hash = contenthash.hash_file(file_path)
+
+    mod_object =  add_meta_data(df_object, delimiter, file_path, profiling_start_time, load_options, content_hash)
 
     df_object = mod_object[0]
     meta_data = mod_object[1]
 
     return [df_object, meta_data]
 
-# Add Meta Data columns
-def add_meta_data(df_object, delimiter, file_path, numberofpartitions, profiling_start_time):
+# read_csv options for a sniffed dialect. Known columns are parsed with the types of the table (categoricals, nullable integers, dates).
+def get_read_options(dialect, table_schema=None):
+    read_options = {'sep': dialect['delimiter'],
+                    'quotechar': dialect['quotechar'],
+                    'encoding': dialect['encoding'],
+                    'encoding_errors': 'replace',
+                    'skipinitialspace': True,
+                    'low_memory': False}
+    if not dialect['header']:
+        read_options['header'] = None
+        read_options['names'] = ['column' + str(i+1) for i in range(dialect['numberofcolumns'])]
+
+    typed_options = schemaregistry.get_read_options(table_schema, dialect['columnnames'])
+    if typed_options is not None:
+        read_options.update(typed_options)
+        read_options['low_memory'] = True   # types are fixed, no need to look at the whole file before typing columns
+
+    return read_options
+
+# This function sets up the chunk pipeline for a file reader. Returns a generator of chunks with meta data columns added and the meta data,
+# the first chunk is read here so that column information is available before loading starts.
+# source is the file (or hashing file object) the reader reads from, the content hash is worked out from it if not given.
+def stream_file(reader, delimiter, file_path, profiling_start_time, load_options, source=None, content_hash=None):
     file_name = os.path.basename(file_path)
-    profiling_end_time = datetime.now()
-    is_dask = False
+    load_datetime = datetime.now()
 
-    profile_hk = file_name + str(profiling_end_time)
-    profile_hk = profile_hk.encode('utf-8')
-    profile_hk = hashlib.md5(profile_hk).hexdigest()
+    profile_hk = get_profile_hk(file_path, load_datetime, content_hash, load_options)
+    load_attempt = get_load_attempt(file_path, load_datetime)
 
-    # Add load_datetime and filename columns to the start of DataFrame
-    if isinstance(df_object, dd.DataFrame):
-        df_object = df_object.compute()
-        is_dask = True
+    # Counters (and profile) that are only complete once the whole stream is read
+    stream_stats = {'invalidcharactersrecords': 0}
+    profile = dataprofiler.create_profile(load_options.get('profilehashes')) if load_options.get('profiling', True) else None
+
+    chunks = stream_chunks(reader, file_name, profile_hk, load_datetime, load_options.get('cleaning'), stream_stats, source, profile)
+    chunks = prefetch_chunks(chunks, load_options.get('prefetchchunks', 2))
+
+    try:
+        first_chunk = next(chunks)
+    except StopIteration:
+        return [-1, {'profile_hk': profile_hk, 'load_attempt': load_attempt}]
 
-    if isinstance(df_object, pd.DataFrame):
-        # Trim white spaces from all data in the DataFrame
-        df_object = df_object.map(lambda x: x.strip() if isinstance(x, str) else x)
+    meta_data = {'profiling_end_time':datetime.now(),
+                 'profiling_start_time':profiling_start_time,
+                 'profile_hk':profile_hk,
+                 'load_attempt':load_attempt,
+                 'delimiter':delimiter,
+                 'numberofcolumns':len(first_chunk.columns),
+                 'contenthash':content_hash,
+                 'stream_stats':stream_stats,
+                 'profile':profile}
+
+    return [chain_chunks(first_chunk, chunks), meta_data]
+
+# Generator that reads chunks from a file reader, cleans them, adds meta data columns to each chunk and adds them to the profile.
+# When reading from a hashing file object the content hash is added to stream stats at the end.
+def stream_chunks(reader, file_name, profile_hk, load_datetime, cleaning_options, stream_stats, source=None, profile=None):
+    try:
+        with reader:
+            chunks = iter(reader)
+            while True:
+                with stagetimer.stage('parse') as stage_counts:
+                    df_chunk = next(chunks, None)
+                    if df_chunk is not None:
+                        stage_counts['records'] = len(df_chunk)
+                if df_chunk is None:
+                    break
+                mod_object = add_meta_columns(df_chunk, file_name, profile_hk, load_datetime, cleaning_options)
+                stream_stats['invalidcharactersrecords'] += mod_object[1]
+                if profile is not None:
+                    dataprofiler.profile_chunk(profile, mod_object[0], meta_columns)
+                yield mod_object[0]
+
+        if profile is not None:
+            dataprofiler.finish_profile(profile)
+
+        if source is not None and not isinstance(source, str):
+            stream_stats['contenthash'] = contenthash.get_hash(source)
+    finally:
+        if source is not None and not isinstance(source, str):
+            source.close()
+
+# Generator that puts back a chunk that was already taken from a stream
+def chain_chunks(first_chunk, chunks):
+    try:
+        yield first_chunk
+        yield from chunks
+    finally:
+        chunks.close()
+
+# Generator that runs the given chunk generator in a background thread so that parsing of next chunks overlaps with loading of current chunk.
+# Only "depth" chunks are kept waiting in memory, closing the generator stops the background thread.
+def prefetch_chunks(chunks, depth):
+    chunk_queue = queue.Queue(maxsize=max(depth, 1))
+    stop_event = threading.Event()
+    end_of_stream = object()
+    timing = stagetimer.get_current()   # stages of the chunks are timed for the file being loaded
+
+    def produce():
+        stagetimer.set_current(timing)
+        try:
+            for df_chunk in chunks:
+                while not stop_event.is_set():
+                    try:
+                        chunk_queue.put(df_chunk, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    break
+            item = end_of_stream
+        except Exception as e:
+            item = e
+        finally:
+            chunks.close()
+
+        # Let consumer know we are done (or failed), unless consumer is gone
+        while not stop_event.is_set():
+            try:
+                chunk_queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+
+    producer = threading.Thread(target=produce, name=threading.current_thread().name + '_prefetch', daemon=True)
+    producer.start()
 
-        # remove all extra spaces from column names
-        df_object = df_object.rename(columns=lambda x: x.strip())
+    try:
+        while True:
+            item = chunk_queue.get()
+            if item is end_of_stream:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop_event.set()
+
+# Add Meta Data columns. Dask dataframes get them partition by partition (lazily), their counters are dask objects in lazy_stats
+# that are worked out while the data is written.
+def add_meta_data(df_object, delimiter, file_path, profiling_start_time, load_options=None, content_hash=None):
+    file_name = os.path.basename(file_path)
+    profiling_end_time = datetime.now()
+    invalidcharactersrecords = 0
+    lazy_stats = None
+    profile = None
 
-        df_object.insert(0, 'load_datetime', profiling_end_time)
-        df_object.insert(0, 'filename', file_name)
-        df_object.insert(0, 'datafilestagehk', profile_hk)
+    if load_options is None:
+        load_options = {}
+    profiling = load_options.get('profiling', True)
 
-    if is_dask: # Convert back to dask
-       df_object = dd.from_pandas(df_object, npartitions=numberofpartitions) 
+    profile_hk = get_profile_hk(file_path, profiling_end_time, content_hash, load_options)
+
+    # Add load_datetime and filename columns to the start of DataFrame
+    if isinstance(df_object, dd.DataFrame):
+        cleaning_options = load_options.get('cleaning')
+        lazy_stats = {'totalrecords': df_object.map_partitions(len).sum()}
+        if (cleaning_options or datacleaning.default_cleaning_options).get('scrubcontrolcharacters'):
+            lazy_stats['invalidcharactersrecords'] = df_object.map_partitions(datacleaning.count_invalid_records).sum()
+        df_object = df_object.map_partitions(add_meta_partition, file_name, profile_hk, profiling_end_time, cleaning_options)
+        if profiling:
+            partition_profiles = [dask.delayed(dataprofiler.profile_dataframe)(partition, load_options.get('profilehashes'), meta_columns)
+                                  for partition in df_object.to_delayed()]
+            lazy_stats['profile'] = dask.delayed(dataprofiler.finish_profile)(dask.delayed(dataprofiler.merge_profiles)(partition_profiles))
+
+    elif isinstance(df_object, pd.DataFrame):
+        mod_object = add_meta_columns(df_object, file_name, profile_hk, profiling_end_time, load_options.get('cleaning'))
+        df_object = mod_object[0]
+        invalidcharactersrecords = mod_object[1]
+        if profiling:
+            profile = dataprofiler.finish_profile(dataprofiler.profile_dataframe(df_object, load_options.get('profilehashes'), meta_columns))
 
     meta_data = {'profiling_end_time':profiling_end_time,
                  'profiling_start_time':profiling_start_time,
                  'profile_hk':profile_hk,
-                 'delimiter':delimiter}
+                 'load_attempt':get_load_attempt(file_path, profiling_end_time),
+                 'delimiter':delimiter,
+                 'invalidcharactersrecords':invalidcharactersrecords,
+                 'contenthash':content_hash,
+                 'profile':profile}
+    if lazy_stats is not None:
+        meta_data['lazy_stats'] = lazy_stats
 
     return [df_object, meta_data]
 
+# Tells if a file is above the out of core threshold and is loaded as a dask dataframe
+def is_out_of_core(file_path, load_options):
+    threshold = load_options.get('daskthreshold', 0)
+    if threshold <= 0 or os.path.splitext(file_path)[1].lower() in ['.xlsx', '.json', '.xml', '.zip'] + arrowreaders.columnar_extensions + list(compressedfiles.compressed_extensions):
+        return False
+    return Path(file_path).stat().st_size >= threshold
+
+# Key of a load, md5 of file name and time. When content keys are turned on it is derived from the file content (and target table) only,
+# the same content gets the same key every time it is loaded.
+def get_profile_hk(file_path, load_datetime, content_hash, load_options):
+    if load_options.get('contentkey') and content_hash is not None:
+        return contenthash.get_content_key(content_hash, file_path)
+
+    return get_load_attempt(file_path, load_datetime)
+
+# Key of a single attempt to load a file, md5 of file name and time. The log, column profile and timing rows of an attempt carry it (loadattempt),
+# so they stay apart from the rows of other attempts with the same content key.
+def get_load_attempt(file_path, load_datetime):
+    load_attempt = os.path.basename(file_path) + str(load_datetime)
+    load_attempt = load_attempt.encode('utf-8')
+    return hashlib.md5(load_attempt).hexdigest()
+
+# Clean dataframe (or chunk of a dataframe) and add meta data columns to the start of it, returns the dataframe and number of records with invalid characters
+def add_meta_columns(df_object, file_name, profile_hk, load_datetime, cleaning_options=None):
+    # Trim white spaces (and other configured cleaning) from all text data in the DataFrame
+    with stagetimer.stage('clean') as stage_counts:
+        stage_counts['records'] = len(df_object)
+        mod_object = datacleaning.clean_dataframe(df_object, cleaning_options)
+    df_object = mod_object[0]
+
+    # remove all extra spaces from column names
+    df_object = df_object.rename(columns=lambda x: x.strip())
+
+    df_object.insert(0, 'load_datetime', load_datetime)
+    df_object.insert(0, 'filename', file_name)
+    df_object.insert(0, 'datafilestagehk', profile_hk)
+
+    return [df_object, mod_object[1]]
+
+# Clean a partition of a dask dataframe and add meta data columns to it. The partition is copied (shallow) as other tasks (counters) read it too.
+def add_meta_partition(df_partition, file_name, profile_hk, load_datetime, cleaning_options=None):
+    return add_meta_columns(df_partition.copy(deep=False), file_name, profile_hk, load_datetime, cleaning_options)[0]
+
 # This function creates a profile in the log table for the dataframe, returns a list of hashkey,success status and errors if any.
+@stagetimer.timed('profilelog')
 def write_profile_data(df_object, meta_data, file_path, table_name, schemaname, connection):
     ret_val = []
     # Perform data profiling
@@ -279,27 +551,48 @@ def write_profile_data(df_object, meta_data, file_path, table_name, schemaname,
     t_obj = time.strptime(time.ctime(os.path.getmtime(file_path)))
     file_drop_time = time.strftime("%Y-%m-%d %H:%M:%S", t_obj)
 
-    if isinstance(df_object, pd.DataFrame):
-        duplicates = df_object.duplicated().sum()
+    # Duplicates are counted by the profiler while the file is read, streamed files get their count when load status is set
+    profile = meta_data.get('profile')
+    if isinstance(df_object, pd.DataFrame) and profile is not None:
+        duplicates = profile['duplicaterecords']
     else:
         duplicates = None
 
+    # Row count of a stream (or dask dataframe) is only known once it is loaded, it is updated when load status is set
+    if isinstance(df_object, types.GeneratorType):
+        numberofcolumns = meta_data['numberofcolumns']
+        totalrecords = None
+    elif isinstance(df_object, dd.DataFrame):
+        numberofcolumns = len(df_object.columns)
+        totalrecords = None
+    else:
+        numberofcolumns = len(df_object.columns)
+        totalrecords = len(df_object)
+
     profiling_entry = {
         'datafilestagehk': meta_data['profile_hk'],
+        'loadattempt': meta_data['load_attempt'],
         'filename': file_name,
         'delimiter': meta_data['delimiter'],
         'targettablename': table_name,
         'schemaname':schemaname,
-        'numberofcolumns': len(df_object.columns)-2,
-        'totalrecords': len(df_object),
+        'numberofcolumns': numberofcolumns-2,
+        'totalrecords': totalrecords,
         'duplicaterecords': duplicates,
-        'invalidcharactersrecords': 0,
+        'invalidcharactersrecords': meta_data.get('invalidcharactersrecords', 0),
+        'contenthash': meta_data.get('contenthash'),
         'loadsuccessstatus': 0,
         'filecreatetime': datetime.strptime(file_drop_time, "%Y-%m-%d %H:%M:%S"),
         'loadstarttime': meta_data['profiling_start_time'],
         'loadtomemoryendtime':meta_data['profiling_end_time']
     }
 
+    # The row is written by the audit writer when it runs, it is checked to be there before the load is marked complete (set_file_processed_status)
+    if auditwriter.is_running():
+        meta_data['profile_write'] = [auditwriter.submit_insert('datafilestagelog', profiling_entry), profiling_entry]
+        ret_val.append(0)
+        return ret_val
+
     try:
         # Insert data profiling details into the DataProfiling table
         pd.DataFrame([profiling_entry]).to_sql('datafilestagelog'
@@ -326,6 +619,11 @@ def generate_error_log_entry(profile_hk, targettablename, error_message, connect
         'errordatetime': datetime.now()
     }
 
+    if auditwriter.is_running():
+        auditwriter.submit_insert('datafilestageerrorlog', log_entry)
+        ret_val.append(0)
+        return ret_val
+
     try:
         pd.DataFrame([log_entry]).to_sql('datafilestageerrorlog'
                                          , con=connection[0]
@@ -343,46 +641,150 @@ def generate_error_log_entry(profile_hk, targettablename, error_message, connect
 
 
 
-# Update status of dataload after writing to target table
-def set_file_processed_status(profile_hk, connection):
+# This function writes the column statistics of a file's profile into the column profile table
+@stagetimer.timed('columnprofile')
+def write_column_profile(profile_hk, load_attempt, targettablename, profile, connection):
+    ret_val = []
+    column_rows = dataprofiler.get_column_rows(profile)
+    for column_row in column_rows:
+        column_row['datafilestagehk'] = profile_hk
+        column_row['loadattempt'] = load_attempt
+        column_row['targettablename'] = targettablename
+
+    try:
+        pd.DataFrame(column_rows).to_sql('datafilestagecolumnprofile'
+                                         , con=connection[0]
+                                         , schema='_admin'
+                                         , if_exists='append'
+                                         , index=False)
+        ret_val.append(0)
+    except Exception as e:
+        logging.error('An exception occurred while trying to write column profile: %s', e)
+        ret_val.append(1)
+        ret_val.append(e)
+
+    return ret_val
+
+# This function writes the time spent in each stage of a load into the stage timing table
+def write_stage_timing(profile_hk, targettablename, timing, connection):
+    ret_val = []
+    stage_rows = stagetimer.get_stage_rows(timing)
+    for stage_row in stage_rows:
+        stage_row['datafilestagehk'] = profile_hk
+        stage_row['loadattempt'] = timing['load_attempt']
+        stage_row['targettablename'] = targettablename
+
+    try:
+        pd.DataFrame(stage_rows).to_sql('datafilestagetiming'
+                                        , con=connection[0]
+                                        , schema='_admin'
+                                        , if_exists='append'
+                                        , index=False)
+        ret_val.append(0)
+    except Exception as e:
+        logging.error('An exception occurred while trying to write stage timing: %s', e)
+        ret_val.append(1)
+        ret_val.append(e)
+
+    return ret_val
+
+# Update status of dataload after writing to target table, load_stats holds other log columns set by the load (e.g. totalrecords of streamed files, loadbackend, rowspersecond)
+# profile_write is the queued log row of the load (from write_profile_data), it is written before the status when the audit writer runs.
+# Only the log row of load_attempt is updated, other attempts with the same key keep their status.
+@stagetimer.timed('loadstatus')
+def set_file_processed_status(profile_hk, load_attempt, connection, load_stats=None, profile_write=None):
+    if auditwriter.is_running():
+        set_file_processed_status_queued(profile_hk, load_attempt, connection, load_stats, profile_write)
+        return
+
     # update file profile status as completed
     conn = connection[0].connect()
 
+    parameters = {'id': profile_hk, 'attempt': load_attempt, 'loadstatus': 1, 'loadtime': datetime.now()}
+    update_statement = ("UPDATE _admin.datafilestagelog "
+                        "SET loadsuccessstatus=:loadstatus, loadendtime=:loadtime  ")
+    for column, value in (load_stats or {}).items():
+        if value is not None:
+            update_statement += ", {}=:{} ".format(column, column)
+            parameters[column] = value
+
     try:
         conn.execute(
-            sqlalchemy.text("UPDATE _admin.datafilestagelog "
-                            "SET loadsuccessstatus=:loadstatus, loadendtime=:loadtime  "
-                            "WHERE datafilestagehk=:id"),
-            {'id': profile_hk, 'loadstatus': 1, 'loadtime': datetime.now()})
+            sqlalchemy.text(update_statement +
+                            "WHERE datafilestagehk=:id AND loadattempt=:attempt"),
+            parameters)
         conn.commit()
         conn.close()
     except Exception as e:
         logging.error('An exception occurred while trying to update load status: %s', e)
         conn.close()
-        
-# Check if given table exists        
-def check_table_exists(targettable, schema_name, connection):
 
-    conn = connection[0].connect()
-    tablelist = conn.execute(sqlalchemy.text("SELECT TABLE_NAME "
-                                             "FROM INFORMATION_SCHEMA.TABLES WITH (NOLOCK)"
-                                             "WHERE TABLE_SCHEMA =:schema "
-                                             "AND TABLE_NAME=:id"), {'id': targettable,'schema':schema_name}).fetchall()
-    conn.close()
-    return len(tablelist) > 0
+# Status update through the audit writer. The flush is the point where the log row of the load has to exist: if it could not be written
+# in its batch it is written here directly, and the status with it, so a loaded file is never left without its log row.
+def set_file_processed_status_queued(profile_hk, load_attempt, connection, load_stats=None, profile_write=None):
+    values = {'loadsuccessstatus': 1, 'loadendtime': datetime.now()}
+    values.update({column: value for column, value in (load_stats or {}).items() if value is not None})
+    status_write = auditwriter.submit_update(profile_hk, load_attempt, values)
+    auditwriter.flush()
+
+    if profile_write is not None and profile_write[0].exception() is not None:
+        logging.warning('Log row of %s was not written by the audit writer, writing it directly', profile_hk)
+        try:
+            pd.DataFrame([profile_write[1]]).to_sql('datafilestagelog'
+                                                    , con=connection[0]
+                                                    , schema='_admin'
+                                                    , if_exists='append'
+                                                    , index=False)
+        except Exception as e:
+            logging.error('An exception occurred while trying to create profile entry: %s', e)
+            return
+        status_write = None
+
+    if status_write is None or status_write.exception() is not None:
+        conn = connection[0].connect()
+        try:
+            conn.execute(sqlalchemy.text(auditwriter.get_statement('update', 'datafilestagelog', tuple(values.keys()) + ('datafilestagehk', 'loadattempt'))),
+                         dict(values, datafilestagehk=profile_hk, loadattempt=load_attempt))
+            conn.commit()
+        except Exception as e:
+            logging.error('An exception occurred while trying to update load status: %s', e)
+        finally:
+            conn.close()
+
+# Check if given table exists (from cached catalog information)
+def check_table_exists(targettable, schema_name, connection):
+    return catalogcache.table_exists(schema_name, targettable, connection)
     
 # Archive given file by moving to different location
-def archive_file(file_path, archive_path):
+# When bundle is set the file is added to the zip bundle of the day in the archive folder instead.
+# shutil.move renames the file when the archive folder is on the same volume, the file is only copied across volumes.
+def archive_file(file_path, archive_path, bundle=False):
     # Archive the file by moving it to the archive folder
     if not os.path.exists(archive_path):
         os.makedirs(archive_path)
 
+    if bundle:
+        bundle_file(file_path, archive_path)
+        return
+
     file_name = os.path.basename(file_path)
     archive_path = os.path.join(archive_path, file_name)
     shutil.move(file_path, archive_path)
 
     return
 
+# Add a file to the dated zip bundle of an archive folder and remove it. A file with a name already in the bundle gets a time suffix.
+def bundle_file(file_path, archive_path):
+    bundle_path = os.path.join(archive_path, datetime.now().strftime('%Y%m%d') + '.zip')
+    file_name = os.path.basename(file_path)
+
+    with zipfile.ZipFile(bundle_path, 'a', compression=zipfile.ZIP_DEFLATED) as bundle:
+        if file_name in bundle.namelist():
+            file_name = '{}_{}{}'.format(os.path.splitext(file_name)[0], datetime.now().strftime('%H%M%S%f'), os.path.splitext(file_name)[1])
+        bundle.write(file_path, file_name)
+
+    os.remove(file_path)
+
 # Move file to error folder
 def error_file(file_path, error_path):
     # move error files to error folder
@@ -395,25 +797,10 @@ def error_file(file_path, error_path):
 
     return
 
-# This code will check if file has already been loaded
+# This code will check if file has already been loaded (from the in memory ledger of loaded files)
 def is_file_loaded(file_name, target_table, connection):
+    return fileledger.is_loaded(file_name, target_table, connection)
 
-    conn = connection[0].connect()
-    filelist = conn.execute(sqlalchemy.text("SELECT DISTINCT dataprofilingid "
-                                             "FROM _admin.datafilestagelog "
-                                             "WHERE filename=:file "
-                                             "AND targettablename=:targettable "
-                                             "AND loadsuccessstatus = 1"), {'targettable': target_table, 'file':file_name}).fetchall()
-    conn.close()
-    return len(filelist) > 0
-
-
-# This function will tell us if file is being used. This is to make sure that we dont process files that are still being writen (Created)
-def check_file_status(file_path):
-   try:
-       with open(file_path, 'r') as file: # If you can open the file without any exceptions, it's not open in write mode by another process.
-           val =  True
-   except PermissionError:
-       val = False
-
-   return val
+# This code will check if a file with the same content has already been loaded into the target table (from the in memory ledger of loaded files)
+def is_content_loaded(content_hash, target_table, connection):
+    return fileledger.is_content_loaded(content_hash, target_table, connection)
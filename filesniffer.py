@@ -0,0 +1,183 @@
+import codecs
+import csv
+import logging
+import os
+import threading
+import urllib.parse
+import compressedfiles
+import stagetimer
+
+# Number of bytes read from the head of a file to figure out its format
+sample_size = 65536
+
+# Dialect found for each folder, later files in the folder reuse it as long as it still fits their sample
+dialect_cache = {}
+dialect_cache_lock = threading.Lock()
+
+# Byte order marks and the encoding they stand for, longest first so utf-32 is not mistaken for utf-16
+byte_order_marks = [(codecs.BOM_UTF32_LE, 'utf-32'),
+                    (codecs.BOM_UTF32_BE, 'utf-32'),
+                    (codecs.BOM_UTF8, 'utf-8-sig'),
+                    (codecs.BOM_UTF16_LE, 'utf-16'),
+                    (codecs.BOM_UTF16_BE, 'utf-16')]
+
+
+# This function returns the dialect (delimiter, quotechar, header, encoding, numberofcolumns) of a delimited file, with the columnnames of the file's first row.
+# Only the first sample_bytes of the file are read. When use_cache is set, the dialect of the last file in the same folder is tried first.
+@stagetimer.timed('sniff')
+def sniff_file(file_path, supported_delimiters, sample_bytes=None, use_cache=True):
+    folder = os.path.dirname(file_path)
+
+    with compressedfiles.open_data_file(file_path) as file:   # compressed files are sniffed on their decompressed head
+        sample = file.read(sample_bytes or sample_size)
+        is_whole_file = len(file.read(1)) == 0
+
+    if use_cache:
+        with dialect_cache_lock:
+            dialect = dialect_cache.get(folder)
+        if dialect is not None:
+            lines = get_sample_lines(sample, dialect['encoding'], is_whole_file)
+            if lines is not None and validate_dialect(lines, dialect):
+                return dict(dialect, columnnames=get_column_names(lines, dialect))
+            logging.info('Cached dialect of folder %s does not fit file %s, sniffing again', folder, file_path)
+
+    encoding = detect_encoding(sample)
+    lines = get_sample_lines(sample, encoding, is_whole_file)
+    dialect = sniff_dialect(lines, supported_delimiters)
+    dialect['encoding'] = encoding
+
+    if use_cache:
+        with dialect_cache_lock:
+            dialect_cache[folder] = dialect
+
+    return dict(dialect, columnnames=get_column_names(lines, dialect))
+
+# Names of the columns, from the first row when the file has a header, otherwise column1, column2...
+def get_column_names(lines, dialect):
+    if not dialect['header']:
+        return ['column' + str(i+1) for i in range(dialect['numberofcolumns'])]
+    rows = parse_lines(lines[0:50], dialect)
+    return [name.strip() for name in rows[0]] if rows else []
+
+# Remove cached dialect of a folder (e.g. when the file could not be parsed with it)
+def forget_dialect(folder):
+    with dialect_cache_lock:
+        dialect_cache.pop(folder, None)
+
+# Figure out encoding from byte order mark, otherwise try utf-8 and fall back to cp1252/latin-1
+def detect_encoding(sample):
+    for byte_order_mark, encoding in byte_order_marks:
+        if sample.startswith(byte_order_mark):
+            return encoding
+
+    for encoding in ['utf-8', 'cp1252']:
+        try:
+            # final=False, the sample may end in the middle of a multi byte character
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+
+    return 'latin-1'
+
+# Decode sample and return its complete lines, the last line is dropped if the sample ends in the middle of it.
+# Returns None if sample can not be decoded with the encoding.
+def get_sample_lines(sample, encoding, is_whole_file):
+    try:
+        text = codecs.getincrementaldecoder(encoding)(errors='strict').decode(sample, final=is_whole_file)
+    except UnicodeError:   # utf-16/32 without a byte order mark raise UnicodeError itself
+        return None
+
+    lines = text.splitlines(keepends=True)
+    if not is_whole_file and len(lines) > 1:
+        lines = lines[:-1]
+
+    return [line for line in lines if line.strip() != '']
+
+# Find delimiter, quote character, header presence and number of columns from sample lines
+def sniff_dialect(lines, supported_delimiters):
+    sample = ''.join(lines)
+    dialect = None
+
+    try:
+        sniffed = csv.Sniffer().sniff(sample)
+        dialect = {'delimiter': str(sniffed.delimiter),
+                   'quotechar': sniffed.quotechar or '"'}
+        if not validate_dialect(lines, dialect):
+            dialect = None
+    except csv.Error:
+        pass
+
+    if dialect is None:
+        dialect = {'delimiter': usedefaultdelimiter(lines, supported_delimiters),
+                   'quotechar': '"'}
+
+    rows = parse_lines(lines, dialect)
+    dialect['numberofcolumns'] = len(rows[0]) if rows else 0
+    dialect['header'] = has_header(sample, rows, dialect)
+
+    return dialect
+
+# This function tries to figure out delimiter for files by looking at couple of lines
+def usedefaultdelimiter(sample_lines, supported_delimiters):
+    default = '\t'
+    sample_lines = sample_lines[0:5]
+
+    if len(sample_lines) < 2:
+        return default
+
+    first_line = sample_lines[1]
+
+    for delimiter in supported_delimiters:
+        delimiter = urllib.parse.unquote(delimiter)
+        match = 0
+        column_count = len(first_line.split(delimiter))
+        number_of_lines = len(sample_lines)-1
+        for line in sample_lines[1:5]:
+            if len(line.split(delimiter)) == column_count:
+                   match += 1
+        if match ==  number_of_lines and column_count > 1:
+            return delimiter
+    return default
+
+# Split sample lines into rows with the given dialect, quoted fields can span lines
+def parse_lines(lines, dialect):
+    try:
+        return list(csv.reader(lines, delimiter=dialect['delimiter'], quotechar=dialect['quotechar']))
+    except csv.Error:
+        return []
+
+# A dialect fits the sample if every row has the same number of columns (more than one), and it is the number of columns expected for the folder
+def validate_dialect(lines, dialect):
+    rows = parse_lines(lines, dialect)
+    if len(rows) == 0:
+        return False
+
+    column_count = len(rows[0])
+    if column_count < 2 and dialect.get('numberofcolumns', 2) >= 2:
+        return False
+    if 'numberofcolumns' in dialect and column_count != dialect['numberofcolumns']:
+        return False
+
+    return all(len(row) == column_count for row in rows)
+
+# The sniffer's header check guesses "no header" for files where every column is text.
+# Only trust it when the first row has a number in it, header names are rarely numbers.
+def has_header(sample, rows, dialect):
+    if len(rows) < 2:
+        return True
+
+    if not any(is_number(value) for value in rows[0]):
+        return True
+
+    try:
+        return csv.Sniffer().has_header(sample)
+    except csv.Error:
+        return True
+
+def is_number(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
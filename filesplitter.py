@@ -0,0 +1,136 @@
+import concurrent.futures
+import collections
+import io
+import mmap
+import os
+import threading
+import pandas as pd
+import arrowreaders
+import compressedfiles
+
+# Files of this size (bytes) and above are split into ranges that are parsed in parallel, 0 turns splitting off
+split_threshold = 512 * 1024 * 1024
+# Size of each range (bytes), ranges end on the first line break after this size
+range_size = 64 * 1024 * 1024
+
+# Encodings where a line break is always the single byte \n, other encodings (utf-16, utf-32) are not split
+splittable_encodings = ['utf-8', 'utf-8-sig', 'cp1252', 'latin-1']
+
+# Process pool the ranges are parsed in, created on first use
+split_pool = None
+split_pool_lock = threading.Lock()
+
+
+# Tells if a file should be split, only (uncompressed) delimited text files above the threshold are
+def should_split(file_path, threshold=None):
+    threshold = split_threshold if threshold is None else threshold
+    if threshold <= 0 or os.path.splitext(file_path)[1].lower() in ['.xlsx', '.json', '.xml', '.zip'] + arrowreaders.columnar_extensions + list(compressedfiles.compressed_extensions):
+        return False
+    return os.path.getsize(file_path) >= threshold
+
+# This function returns the header bytes (empty when the file has no header) and the (start, end) byte ranges of the rest of the file.
+# Ranges end right after a line break that is not inside a quoted field, so no record is cut in two. The file is memory-mapped, nothing is copied to disk.
+def split_ranges(file_path, size=None, quotechar='"', header=True):
+    size = size or range_size
+    quote = quotechar.encode('latin-1') if quotechar else None
+    ranges = []
+
+    with open(file_path, 'rb') as file:
+        file_size = os.fstat(file.fileno()).st_size
+        if file_size == 0:
+            return [b'', ranges]
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            start = find_record_end(mapped_file, 0, quote) if header else 0
+            header_bytes = mapped_file[0:start]
+
+            while start < file_size:
+                end = find_record_end(mapped_file, min(start + size, file_size), quote, start)
+                ranges.append((start, end))
+                start = end
+
+    return [header_bytes, ranges]
+
+# Position right after the first line break at or after position that is outside quotes, counting quotes from range_start.
+# A doubled (escaped) quote counts twice so it does not change whether we are inside quotes.
+def find_record_end(mapped_file, position, quote, range_start=None):
+    range_start = position if range_start is None else range_start
+    in_quotes = quote is not None and mapped_file[range_start:position].count(quote) % 2 == 1
+
+    while True:
+        line_end = mapped_file.find(b'\n', position)
+        if line_end == -1:
+            return len(mapped_file)
+        if quote is not None and mapped_file[position:line_end].count(quote) % 2 == 1:
+            in_quotes = not in_quotes
+        position = line_end + 1
+        if not in_quotes:
+            return position
+
+# End of the last complete record from position on, a record is complete once it ends with a line break that is not inside a quoted field.
+# When limit is set the last record end at or before limit is returned (or the first one after it when a single record is longer).
+# Returns position when there is no complete record.
+def find_complete_end(mapped_file, position, quote, limit=None):
+    start = end = position
+    in_quotes = False
+
+    while True:
+        line_end = mapped_file.find(b'\n', position)
+        if line_end == -1:
+            return end
+        if quote is not None and mapped_file[position:line_end].count(quote) % 2 == 1:
+            in_quotes = not in_quotes
+        position = line_end + 1
+        if in_quotes:
+            continue
+        if limit is not None and position > limit and end > start:
+            return end
+        end = position
+
+# Parse one range of a file into a dataframe, the header is put back in front of it. Runs in the split process pool.
+def read_range(file_path, start, end, header_bytes, read_options):
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        data = header_bytes + file.read(end - start)
+    return pd.read_csv(io.BytesIO(data), **read_options)
+
+# Process pool shared by all files, processes is the number of parser processes (0 means one per core)
+def get_split_pool(processes=0):
+    global split_pool
+
+    with split_pool_lock:
+        if split_pool is None:
+            split_pool = concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count())
+        return split_pool
+
+# Reader that parses the ranges of a file in the split process pool and gives back their dataframes in file order.
+# At most "depth" ranges are parsed (or waiting) at a time so memory stays bounded. It is used like a pandas chunk reader.
+class RangeReader:
+    def __init__(self, file_path, header_bytes, ranges, read_options, processes=0, depth=None):
+        self.file_path = file_path
+        self.header_bytes = header_bytes
+        self.ranges = ranges
+        self.read_options = read_options
+        self.pool = get_split_pool(processes)
+        self.depth = depth or processes or os.cpu_count()
+        self.pending = collections.deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        next_range = 0
+        while next_range < len(self.ranges) or self.pending:
+            while next_range < len(self.ranges) and len(self.pending) < self.depth:
+                start, end = self.ranges[next_range]
+                self.pending.append(self.pool.submit(read_range, self.file_path, start, end, self.header_bytes, self.read_options))
+                next_range += 1
+            yield self.pending.popleft().result()
+
+    # Cancel ranges not parsed yet
+    def close(self):
+        while self.pending:
+            self.pending.popleft().cancel()
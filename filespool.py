@@ -0,0 +1,41 @@
+import logging
+import os
+import shutil
+import tempfile
+
+# Local folder files are copied to before they are read, None reads files where they are (the drop share)
+spool_folder = None
+
+# Bytes copied per read, large sequential reads are much faster over the network than the small reads of the parsers
+copy_buffer_bytes = 16 * 1024 * 1024
+
+
+# Local folder for the files of a table, under the spool folder (or the temp folder when there is none, e.g. for expanded zip archives).
+# The <schema>/<table> folders are kept so that per folder caches and content keys work as they do in the drop folder.
+def get_local_folder(schema_name, table_name):
+    root = spool_folder or os.path.join(tempfile.gettempdir(), 'datastagerplus')
+    return os.path.join(root, schema_name, table_name)
+
+# This function copies a file to the spool folder with large sequential reads and returns the local copy, the file itself when spooling is off
+def spool_file(file_path, schema_name, table_name):
+    if not spool_folder:
+        return file_path
+
+    local_folder = get_local_folder(schema_name, table_name)
+    os.makedirs(local_folder, exist_ok=True)
+    local_path = os.path.join(local_folder, os.path.basename(file_path))
+
+    with open(file_path, 'rb') as source, open(local_path, 'wb') as target:
+        shutil.copyfileobj(source, target, copy_buffer_bytes)
+    shutil.copystat(file_path, local_path)   # keep modified time, it is logged as the file create time
+
+    return local_path
+
+# Remove a local copy once it is loaded (or failed), files in the drop folder are never removed here
+def remove_local_file(local_path, file_path):
+    if local_path == file_path:
+        return
+    try:
+        os.remove(local_path)
+    except OSError as e:
+        logging.warning('Could not remove local copy %s: %s', local_path, e)
@@ -0,0 +1,207 @@
+import logging
+import os
+import time
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+# This function sets up a watcher on the drop folder. Files are expected at drop/<schema>/<table>/<file>.
+# backend is inotify, scandir or auto (inotify when available). A file is ready once it has not changed for settle_seconds,
+# files that are still in the drop folder retry_seconds after being handed out are handed out again.
+# Files of incremental folders (schema/table) are handed out as soon as they grow, without settling, and their folders are scanned every time.
+def create_watcher(drop_folder, backend='auto', settle_seconds=10, retry_seconds=300, incremental_folders=()):
+    watcher = {'drop_folder': drop_folder,
+               'backend': 'scandir',
+               'settle_seconds': settle_seconds,
+               'retry_seconds': retry_seconds,
+               'incremental_folders': set(incremental_folders),
+               'files': {},           # file path -> {'mtime', 'size', 'changed', 'dispatched'}
+               'folders': {},         # table folder path -> folder mtime at last scan
+               'inotify': None,
+               'watch_paths': {}}     # inotify watch descriptor -> folder path
+
+    if backend in ['auto', 'inotify']:
+        if inotify_simple is not None:
+            try:
+                watcher['inotify'] = inotify_simple.INotify()
+                watcher['backend'] = 'inotify'
+            except OSError as e:
+                logging.warning('inotify is not available for %s, falling back to folder scans: %s', drop_folder, e)
+        elif backend == 'inotify':
+            logging.warning('inotify_simple is not installed, falling back to folder scans')
+
+    # Pick up whatever is already in the drop folder (and set up watches)
+    scan_drop_folder(watcher, force=True)
+
+    return watcher
+
+# Wait for up to timeout seconds for changes in the drop folder
+def wait_for_changes(watcher, timeout):
+    if watcher['backend'] == 'inotify':
+        events = watcher['inotify'].read(timeout=int(timeout * 1000))
+        apply_inotify_events(watcher, events)
+    else:
+        time.sleep(timeout)
+
+# Returns files that are ready to be processed, grouped by table folder. Each file is only handed out once unless it changes (or retry_seconds passed).
+def get_ready_files(watcher):
+    if watcher['backend'] == 'scandir':
+        scan_drop_folder(watcher)
+    else:
+        apply_inotify_events(watcher, watcher['inotify'].read(timeout=0))
+        # new files are picked up by events, folders with files still settling are rescanned for size changes made over the network
+        scan_drop_folder(watcher, only_pending=True)
+
+    now = time.time()
+    ready_files = {}
+    for file_path, file_state in watcher['files'].items():
+        if file_state['dispatched'] is not None and now - file_state['dispatched'] < watcher['retry_seconds']:
+            continue
+        if now - file_state['changed'] < watcher['settle_seconds'] and not is_incremental_folder(watcher, os.path.dirname(file_path)):
+            continue
+        file_state['dispatched'] = now
+        ready_files.setdefault(os.path.dirname(file_path), []).append(file_path)
+
+    return ready_files
+
+# Tells if a table folder (drop/<schema>/<table>) is loaded incrementally
+def is_incremental_folder(watcher, table_folder):
+    return (os.path.basename(os.path.dirname(table_folder)) + '/' + os.path.basename(table_folder)).lower() in watcher['incremental_folders']
+
+# Remove file from index, e.g. once it is archived, so that it is not handed out again
+def forget_file(watcher, file_path):
+    watcher['files'].pop(file_path, None)
+
+# Scan schema/table folders with os.scandir. Table folders whose mtime did not change and that have no files still settling are skipped,
+# unless force is set. When only_pending is set only folders with files still settling are scanned.
+def scan_drop_folder(watcher, force=False, only_pending=False):
+    pending_folders = set(os.path.dirname(file_path) for file_path, file_state in watcher['files'].items() if file_state['dispatched'] is None)
+
+    if only_pending:
+        table_folders = list(pending_folders)
+    else:
+        table_folders = list_table_folders(watcher)
+
+    for table_folder in table_folders:
+        try:
+            folder_mtime = os.stat(table_folder).st_mtime
+        except FileNotFoundError:
+            forget_folder(watcher, table_folder)
+            continue
+
+        # appending to a file does not change the mtime of its folder, incremental folders are always scanned
+        if not force and table_folder not in pending_folders and watcher['folders'].get(table_folder) == folder_mtime and not is_incremental_folder(watcher, table_folder):
+            continue
+
+        watcher['folders'][table_folder] = folder_mtime
+        scan_table_folder(watcher, table_folder)
+
+# List drop/<schema>/<table> folders, adding inotify watches for them
+def list_table_folders(watcher):
+    table_folders = []
+    add_watch(watcher, watcher['drop_folder'])
+
+    for schema_entry in os.scandir(watcher['drop_folder']):
+        if not schema_entry.is_dir():
+            continue
+        add_watch(watcher, schema_entry.path)
+        for table_entry in os.scandir(schema_entry.path):
+            if table_entry.is_dir():
+                add_watch(watcher, table_entry.path)
+                table_folders.append(table_entry.path)
+
+    return table_folders
+
+# Update index with the files of a table folder
+def scan_table_folder(watcher, table_folder):
+    now = time.time()
+    seen_files = set()
+
+    for file_entry in os.scandir(table_folder):
+        if not file_entry.is_file():
+            continue
+        try:
+            file_stat = file_entry.stat()
+        except FileNotFoundError:  # moved away while scanning
+            continue
+        seen_files.add(file_entry.path)
+        update_file(watcher, file_entry.path, file_stat.st_mtime, file_stat.st_size, now)
+
+    for file_path in [file_path for file_path in watcher['files'] if os.path.dirname(file_path) == table_folder and file_path not in seen_files]:
+        forget_file(watcher, file_path)
+
+# Record size/mtime of a file, a new or changed file has to settle again before it is handed out
+def update_file(watcher, file_path, mtime, size, now):
+    file_state = watcher['files'].get(file_path)
+    if file_state is not None and file_state['mtime'] == mtime and file_state['size'] == size:
+        return
+
+    watcher['files'][file_path] = {'mtime': mtime,
+                                   'size': size,
+                                   'changed': now,
+                                   'dispatched': None}
+
+def forget_folder(watcher, table_folder):
+    watcher['folders'].pop(table_folder, None)
+    for file_path in [file_path for file_path in watcher['files'] if os.path.dirname(file_path) == table_folder]:
+        forget_file(watcher, file_path)
+
+# Add inotify watch on a folder (only once per folder)
+def add_watch(watcher, folder):
+    if watcher['backend'] != 'inotify' or folder in watcher['watch_paths'].values():
+        return
+
+    flags = inotify_simple.flags
+    try:
+        watch = watcher['inotify'].add_watch(folder, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.DELETE | flags.DELETE_SELF)
+        watcher['watch_paths'][watch] = folder
+    except OSError as e:
+        logging.warning('Could not watch folder %s: %s', folder, e)
+
+# Update index from inotify events
+def apply_inotify_events(watcher, events):
+    flags = inotify_simple.flags
+    now = time.time()
+    drop_depth = len(os.path.normpath(watcher['drop_folder']).split(os.sep))
+
+    for event in events:
+        folder = watcher['watch_paths'].get(event.wd)
+        if folder is None:
+            continue
+        if event.mask & flags.IGNORED:
+            watcher['watch_paths'].pop(event.wd, None)
+            continue
+
+        path = os.path.join(folder, event.name)
+        depth = len(os.path.normpath(path).split(os.sep)) - drop_depth
+
+        if event.mask & flags.ISDIR:
+            if event.mask & (flags.CREATE | flags.MOVED_TO) and depth <= 2:
+                add_watch(watcher, path)
+                if depth == 2:
+                    scan_table_folder(watcher, path)
+                else:
+                    scan_drop_folder(watcher, force=True)
+            continue
+
+        if depth != 3:  # only files in table folders are loaded
+            continue
+
+        if event.mask & (flags.DELETE | flags.MOVED_FROM):
+            forget_file(watcher, path)
+            continue
+
+        try:
+            file_stat = os.stat(path)
+        except FileNotFoundError:
+            forget_file(watcher, path)
+            continue
+
+        update_file(watcher, path, file_stat.st_mtime, file_stat.st_size, now)
+
+        # Writer closed the file, no need to wait for it to settle
+        if event.mask & (flags.CLOSE_WRITE | flags.MOVED_TO):
+            watcher['files'][path]['changed'] = now - watcher['settle_seconds']
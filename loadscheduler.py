@@ -0,0 +1,153 @@
+import concurrent.futures
+import heapq
+import logging
+import os
+import threading
+import time
+
+# Locks used so that only one file at a time can create a new target table
+table_locks = {}
+table_locks_lock = threading.Lock()
+
+
+# This function sets up the scheduler. max_workers files are loaded at the same time over all tables, at most per_table_workers of them for the same table.
+# When ordered is set files of a table are loaded one at a time, oldest file (modified time) first, this is only needed when a later file must land after an earlier one.
+# A runner gives its worker back after files_per_turn files (0 never), so a folder with many files does not keep the workers from the other tables.
+# When parse_processes is more than 0 files are parsed in a pool of processes instead of the worker threads.
+def create_scheduler(max_workers=4, per_table_workers=2, ordered=False, parse_processes=0, files_per_turn=10):
+    scheduler = {'executor': concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='datafilestage_worker'),
+                 'parse_pool': None,
+                 'per_table_workers': 1 if ordered else max(per_table_workers, 1),
+                 'ordered': ordered,
+                 'files_per_turn': files_per_turn,
+                 'tables': {},    # table folder -> {'files': heap of pending files, 'running': number of runners}
+                 'in_flight': set(),
+                 'sequence': 0,
+                 'lock': threading.Lock()}
+    scheduler['files_queued'] = threading.Condition(scheduler['lock'])   # batches waiting for more files are woken up by new files
+
+    if parse_processes > 0:
+        scheduler['parse_pool'] = concurrent.futures.ProcessPoolExecutor(max_workers=parse_processes)
+
+    return scheduler
+
+# Queue files of a table folder, task(file) is called for each of them on a worker thread. Files already queued or running are skipped.
+# With batching (see filebatcher.create_batching) files it accepts are taken together with the accepted files queued after them and handed to its task as a list.
+# Files are looked at (modified time, size) here, before the scheduler lock is taken, so a slow share does not hold up the workers.
+def submit_files(scheduler, table_folder, files, task, batching=None):
+    file_orders = {file: get_file_order(scheduler, file) for file in files}
+    batch_sizes = {file: get_batch_size(batching, file) for file in files}
+
+    with scheduler['lock']:
+        table = scheduler['tables'].setdefault(table_folder, {'files': [], 'running': 0})
+        table['batching'] = batching
+
+        for file in files:
+            if file in scheduler['in_flight']:
+                continue
+            scheduler['in_flight'].add(file)
+            scheduler['sequence'] += 1
+            heapq.heappush(table['files'], (file_orders[file], scheduler['sequence'], file, task, batch_sizes[file]))
+        scheduler['files_queued'].notify_all()
+
+        # Start runners for the table up to its concurrency
+        while table['running'] < scheduler['per_table_workers'] and table['running'] < len(table['files']):
+            table['running'] += 1
+            scheduler['executor'].submit(run_table_files, scheduler, table_folder)
+
+# Order files by modified time when loads are ordered, otherwise in the order they were queued
+def get_file_order(scheduler, file):
+    if not scheduler['ordered']:
+        return 0
+    try:
+        return os.path.getmtime(file)
+    except OSError:
+        return 0
+
+# Size of a file the batching of its table accepts, None when the file is loaded on its own
+def get_batch_size(batching, file):
+    if batching is None or not batching['accept'](file):
+        return None
+    return get_file_size(file)
+
+# Runner that keeps loading the next file of a table until there are none left. After files_per_turn files it queues itself again
+# behind the runners of other tables that are waiting for a worker, the table keeps its runner (and its order) meanwhile.
+def run_table_files(scheduler, table_folder):
+    table = scheduler['tables'][table_folder]
+    files_done = 0
+
+    while True:
+        with scheduler['lock']:
+            if len(table['files']) == 0:
+                table['running'] -= 1
+                return
+            if scheduler['files_per_turn'] > 0 and files_done >= scheduler['files_per_turn']:
+                scheduler['executor'].submit(run_table_files, scheduler, table_folder)
+                return
+            file, task, file_bytes = heapq.heappop(table['files'])[2:]
+            batching = table.get('batching')
+            files = take_batch(scheduler, table, file, file_bytes) if batching is not None and file_bytes is not None else [file]
+
+        try:
+            if len(files) > 1:
+                batching['task'](files)
+            else:
+                task(file)
+        except Exception as e:
+            logging.exception('An exception occurred while processing file %s: %s', file, e)
+        finally:
+            with scheduler['lock']:
+                scheduler['in_flight'].difference_update(files)
+        files_done += len(files)
+
+# Take the files queued after file into its batch, in queue order, up to the first file that is not accepted or does not fit.
+# When the batch is not full it waits up to wait_seconds for more files. Called with the scheduler lock held, it only uses the sizes recorded when files were queued.
+def take_batch(scheduler, table, file, file_bytes):
+    batching = table['batching']
+    files = [file]
+    batch_bytes = file_bytes
+    deadline = time.monotonic() + batching['wait_seconds']
+
+    while len(files) < batching['max_files']:
+        if table['files']:
+            next_file, next_bytes = table['files'][0][2], table['files'][0][4]
+            if next_bytes is None or batch_bytes + next_bytes > batching['max_bytes']:
+                break
+            heapq.heappop(table['files'])
+            files.append(next_file)
+            batch_bytes += next_bytes
+            continue
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        scheduler['files_queued'].wait(remaining)
+
+    return files
+
+def get_file_size(file):
+    try:
+        return os.path.getsize(file)
+    except OSError:
+        return 0
+
+# Run function in the parse process pool if there is one, otherwise on the calling thread
+def run_parse(scheduler, function, *args):
+    if scheduler is None or scheduler['parse_pool'] is None:
+        return function(*args)
+    return scheduler['parse_pool'].submit(function, *args).result()
+
+# Number of files queued or running
+def get_queue_depth(scheduler):
+    with scheduler['lock']:
+        return len(scheduler['in_flight'])
+
+# Number of files being loaded right now
+def get_running_count(scheduler):
+    with scheduler['lock']:
+        return sum(table['running'] for table in scheduler['tables'].values())
+
+# Lock for a schema.table, held while a file creates the table
+def get_table_lock(table_name):
+    with table_locks_lock:
+        return table_locks.setdefault(table_name, threading.Lock())
@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import compressedfiles
+import fileprocessing
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Memory all loads together may use, in bytes. 0 turns the governor off and every load is admitted as it is.
+budget_bytes = 0
+
+# Memory held by a streamed (or out of core) load, a few chunks at a time whatever the size of the file
+stream_reserve_bytes = 256 * 1024 * 1024
+
+# Seconds a deferred load waits before it checks memory again, it is woken up earlier when a load gives back its memory
+recheck_seconds = 5
+
+# In memory size of a dataframe per byte of file, by file type. Replaced per table by the ratio learned from its loads.
+default_ratios = {'.xlsx': 15.0, '.json': 4.0, '.xml': 3.0, '.parquet': 6.0, '.pq': 6.0, '.feather': 2.0, '.arrow': 2.0, '.orc': 6.0}
+default_ratio = 6.0          # delimited text
+compressed_ratio = 5.0       # data per byte of a compressed file
+learning_rate = 0.3          # weight of the newest load in the learned ratio
+
+governor_lock = threading.Condition()
+reserved_bytes = 0
+learned_ratios = {}   # (schema, table) -> in memory bytes per file byte
+base_rss = None       # memory of the process before any load, live memory above it counts against the budget
+counters = {'admitted': 0, 'downgraded': 0, 'deferred': 0}
+
+
+# This function admits a load, deferring it until its memory fits the budget. A load that does not fit as a whole dataframe
+# is downgraded to streaming (or out of core for large delimited files), which only needs the stream reserve.
+# Loads are deferred on memory reserved by running loads only. Live memory of the process rarely goes down after large loads
+# (freed memory is kept by the allocator), so it only decides if a load is downgraded, it never holds a load back.
+# Returns the grant, with the load options to load the file with. The grant is given back with release once the load is done.
+# file_bytes is the size to estimate the load with instead of the size of the file (a batch of files is admitted as one load).
+def admit(file_path, schema_name, table_name, load_options, file_bytes=None):
+    global reserved_bytes
+
+    grant = {'bytes': 0, 'load_options': load_options, 'mode': 'whole'}
+    if budget_bytes <= 0:
+        return grant
+
+    whole_bytes = estimate_footprint(file_path, schema_name, table_name, file_bytes)
+    deferred = False
+
+    with governor_lock:
+        while True:
+            available = get_available_bytes()
+            live_available = get_live_available_bytes()
+
+            if load_options.get('streaming') or fileprocessing.is_out_of_core(file_path, load_options):
+                needed, mode = min(whole_bytes, stream_reserve_bytes), 'stream'
+            elif whole_bytes <= available and (live_available is None or whole_bytes <= live_available):
+                needed, mode = whole_bytes, 'whole'
+            else:
+                needed, mode = min(whole_bytes, stream_reserve_bytes), get_downgrade_mode(file_path, whole_bytes)
+
+            # A load is always admitted when nothing else is running, otherwise one large file would wait forever
+            if needed <= available or reserved_bytes == 0:
+                break
+            if not deferred:
+                deferred = True
+                counters['deferred'] += 1
+                logging.info('Deferring load of %s, it needs %s MB and %s MB are available', file_path, needed // 2**20, max(available, 0) // 2**20)
+            governor_lock.wait(recheck_seconds)
+
+        reserved_bytes += needed
+        counters['admitted'] += 1
+        if mode != 'whole' and not load_options.get('streaming') and not fileprocessing.is_out_of_core(file_path, load_options):
+            counters['downgraded'] += 1
+            logging.info('Loading %s as %s, as a whole it would need %s MB', file_path, mode, whole_bytes // 2**20)
+            load_options = get_downgraded_options(load_options, mode)
+
+    grant.update({'bytes': needed, 'load_options': load_options, 'mode': mode})
+    return grant
+
+# Give back the memory of a load, deferred loads check again if they fit
+def release(grant):
+    global reserved_bytes
+
+    if grant['bytes'] == 0:
+        return
+    with governor_lock:
+        reserved_bytes -= grant['bytes']
+        governor_lock.notify_all()
+
+# Estimated memory of a file read as a whole dataframe, from its size and the ratio learned for its table (or the ratio of its file type)
+def estimate_footprint(file_path, schema_name, table_name, file_size=None):
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
+    ratio = learned_ratios.get((schema_name.lower(), table_name.lower()))
+
+    if ratio is None:
+        ratio = default_ratios.get(compressedfiles.get_data_extension(file_path), default_ratio)
+        if compressedfiles.get_compression(file_path) is not None:
+            ratio *= compressed_ratio
+
+    return int(file_size * ratio)
+
+# Learn the ratio of in memory size to file size of a table from a file that was read as a whole dataframe
+def learn_ratio(schema_name, table_name, file_path, df_object):
+    file_size = os.path.getsize(file_path)
+    if file_size == 0:
+        return
+
+    ratio = float(df_object.memory_usage(index=False, deep=True).sum()) / file_size
+    key = (schema_name.lower(), table_name.lower())
+    with governor_lock:
+        previous = learned_ratios.get(key)
+        learned_ratios[key] = ratio if previous is None else previous + learning_rate * (ratio - previous)
+
+# Budget left over the memory reserved by running loads
+def get_available_bytes():
+    return budget_bytes - reserved_bytes
+
+# Budget left over the live memory the process uses above its base memory, None when it can not be read
+def get_live_available_bytes():
+    rss = get_rss()
+    if rss is None or base_rss is None:
+        return None
+    return budget_bytes - (rss - base_rss)
+
+# Resident memory of the process in bytes, None when it can not be read (no psutil and no /proc)
+def get_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# Delimited files that would not fit in the whole budget go out of core (dask), everything else is streamed
+def get_downgrade_mode(file_path, whole_bytes):
+    if whole_bytes > budget_bytes and compressedfiles.get_data_extension(file_path) in ['.csv', '.txt', '.tsv', '.dat'] and compressedfiles.get_compression(file_path) is None:
+        return 'outofcore'
+    return 'stream'
+
+def get_downgraded_options(load_options, mode):
+    load_options = dict(load_options)
+    load_options['streaming'] = True   # also the fallback when an out of core file turns out not to be splittable
+    if mode == 'outofcore':
+        load_options['daskthreshold'] = 1
+    return load_options
+
+# Memory of the process before loads start
+def set_base_rss():
+    global base_rss
+    base_rss = get_rss()
+
+# Counters and reserved memory, for the metrics file
+def get_stats():
+    with governor_lock:
+        return dict(counters, reservedbytes=reserved_bytes)
@@ -0,0 +1,106 @@
+import threading
+import catalogcache
+import dataprofiler
+
+# Text columns with at most this many distinct values (and mostly repeated values) are parsed as categoricals
+category_limit = 1000
+
+# Parse types of each table, recorded from the profile of the last file loaded into it
+registry_lock = threading.Lock()
+table_schemas = {}   # (schema, table) -> {'columns': [names in file order], 'dtypes': {column: dtype}, 'parse_dates': [columns]}
+
+# Nullable integer types, smallest first. Smaller integer types are not used, a later file can easily outgrow them.
+integer_dtypes = [('Int32', -2**31, 2**31 - 1), ('Int64', -2**63, 2**63 - 1)]
+
+
+# This function returns the parse types recorded for schema.table, None when no file was loaded into it yet
+def get_table_schema(schema_name, table_name):
+    with registry_lock:
+        return table_schemas.get((schema_name.lower(), table_name.lower()))
+
+# Record parse types of schema.table from the profile of a file loaded into it. Types only widen, an integer column
+# stays Int64 once a file needed it and a text column stays text once a file had too many distinct values for a categorical.
+def register_profile(schema_name, table_name, profile):
+    key = (schema_name.lower(), table_name.lower())
+
+    with registry_lock:
+        previous = table_schemas.get(key)
+
+    table_schema = {'columns': list(profile['columns'].keys()), 'dtypes': {}, 'parse_dates': []}
+    non_null_records = {column: profile['totalrecords'] - statistics['nullcount'] for column, statistics in profile['columns'].items()}
+
+    for column, statistics in profile['columns'].items():
+        previous_dtype = previous['dtypes'].get(column) if previous is not None else None
+        dtype = get_parse_dtype(statistics, non_null_records[column], previous_dtype)
+        if dtype == 'datetime':
+            table_schema['parse_dates'].append(column)
+        elif dtype is not None:
+            table_schema['dtypes'][column] = dtype
+
+    with registry_lock:
+        table_schemas[key] = table_schema
+
+# Forget the parse types of a table (e.g. when a file could not be parsed or loaded with them)
+def forget_table(schema_name, table_name):
+    with registry_lock:
+        table_schemas.pop((schema_name.lower(), table_name.lower()), None)
+
+# Parse type of a column from its profile statistics, None leaves the column to pandas inference
+def get_parse_dtype(statistics, non_null_records, previous_dtype=None):
+    datatype = statistics['datatype']
+
+    if datatype.startswith('datetime64'):
+        return 'datetime'
+    if datatype.lower().startswith(('int', 'uint')):
+        return get_integer_dtype(statistics['minvalue'], statistics['maxvalue'], previous_dtype)
+    if datatype.startswith('float'):
+        return 'float64'
+    if datatype in ['bool', 'boolean']:
+        return 'boolean'
+    if datatype in ['object', 'category', 'string']:
+        is_low_cardinality = (get_distinct_estimate(statistics) <= category_limit
+                              and get_distinct_estimate(statistics) * 2 <= non_null_records)
+        if is_low_cardinality and previous_dtype in [None, 'category']:
+            return 'category'
+        return 'str'
+
+    return None
+
+# Smallest nullable integer type that holds the values seen, never smaller than the type used before
+def get_integer_dtype(minvalue, maxvalue, previous_dtype=None):
+    names = [name for name, low, high in integer_dtypes]
+    start = names.index(previous_dtype) if previous_dtype in names else 0
+
+    for name, low, high in integer_dtypes[start:]:
+        if minvalue is None or (low <= int(minvalue) and int(maxvalue) <= high):
+            return name
+
+    return None
+
+def get_distinct_estimate(statistics):
+    return dataprofiler.estimate_distinct(statistics['sketch'])
+
+# read_csv options (dtype, parse_dates) for a file of a table with a recorded schema. Returns None unless the file has exactly the recorded columns,
+# in which case pandas does no type inference at all.
+def get_read_options(table_schema, column_names):
+    if table_schema is None or [str(column).strip().lower() for column in column_names] != [column.lower() for column in table_schema['columns']]:
+        return None
+
+    file_columns = {str(column).strip().lower(): column for column in column_names}
+    return {'dtype': {file_columns[column.lower()]: dtype for column, dtype in table_schema['dtypes'].items()},
+            'parse_dates': [file_columns[column.lower()] for column in table_schema['parse_dates']]}
+
+# Create table statement for the load table of a file from the column types of its target table, so that the load table matches the target
+# whatever types pandas ended up with. Returns None when the columns of the file are not the columns of the target.
+def get_create_table_script(schema_name, table_name, load_table, column_names, connection):
+    target_columns = catalogcache.get_table_columns(schema_name, table_name, connection)
+
+    if [str(column).lower() for column in column_names] != [column['name'].lower() for column in target_columns]:
+        return None
+
+    if connection[2] == 'MSSQL':
+        column_definitions = ['[{}] {}'.format(column['name'].replace(']', ']]'), column['type_definition']) for column in target_columns]
+        return 'CREATE TABLE [{}].[{}] (\n\t{}\n)'.format(schema_name, load_table, ',\n\t'.join(column_definitions))
+
+    column_definitions = ['"{}" {}'.format(column['name'].replace('"', '""'), column['type_definition']) for column in target_columns]
+    return 'CREATE TABLE "{}"."{}" (\n\t{}\n)'.format(schema_name, load_table, ',\n\t'.join(column_definitions))
@@ -0,0 +1,162 @@
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+# Stage timing of every file when set, otherwise only of the folders (schema/table) in timed_folders
+enabled = False
+timed_folders = set()
+
+# Functions that give the current value of a gauge for the metrics file, metric name -> function
+gauges = {}
+
+# Totals over all timed files per stage, for the metrics file
+totals_lock = threading.Lock()
+stage_totals = {}   # stage -> {'seconds', 'calls', 'records', 'bytes'}
+files_timed = 0
+
+# Timing of the file the current thread works on and its open stages
+thread_state = threading.local()
+
+metrics_thread = None
+
+
+# Tells if stages of files of schema.table are timed
+def is_enabled(schema_name, table_name):
+    return enabled or (schema_name + '/' + table_name).lower() in timed_folders
+
+# This function sets up the stage timing of a file. Stages are added to it while it is the current timing of a thread (set_current).
+def create_timing(file_path):
+    global files_timed
+
+    with totals_lock:
+        files_timed += 1
+
+    return {'file': file_path,
+            'profile_hk': None,
+            'load_attempt': None,
+            'lock': threading.Lock(),
+            'stages': {}}   # stage -> {'seconds', 'calls', 'records', 'bytes'}, in the order stages were first seen
+
+# Make timing the timing of the current thread (None stops timing on this thread)
+def set_current(timing):
+    thread_state.timing = timing
+    thread_state.stack = []
+
+def get_current():
+    return getattr(thread_state, 'timing', None)
+
+# Key (datafilestagehk) and attempt (loadattempt) of the load the current timing belongs to, stage timings are written under them
+def set_profile_hk(profile_hk, load_attempt):
+    timing = get_current()
+    if timing is not None:
+        timing['profile_hk'] = profile_hk
+        timing['load_attempt'] = load_attempt
+
+# Context manager that times a stage of the current file, nothing is recorded when the thread has no timing.
+# The time of a stage excludes stages run inside it, so stages run on the same thread do not overlap. Records and bytes
+# can be set on the dictionary it gives.
+@contextlib.contextmanager
+def stage(name):
+    timing = get_current()
+    if timing is None:
+        yield {}
+        return
+
+    frame = {'records': None, 'bytes': None, 'inner_seconds': 0.0}
+    thread_state.stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield frame
+    finally:
+        seconds = time.perf_counter() - start
+        thread_state.stack.pop()
+        if thread_state.stack:
+            thread_state.stack[-1]['inner_seconds'] += seconds
+        add_stage(timing, name, seconds - frame['inner_seconds'], frame['records'], frame['bytes'])
+
+# Decorator that times each call of a function as a stage
+def timed(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Add time (and records/bytes) to a stage of a file and to the totals
+def add_stage(timing, name, seconds, records=None, bytes=None, calls=1):
+    for stages, lock in [(timing['stages'], timing['lock']), (stage_totals, totals_lock)]:
+        with lock:
+            statistics = stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'records': None, 'bytes': None})
+            statistics['seconds'] += seconds
+            statistics['calls'] += calls
+            if records is not None:
+                statistics['records'] = (statistics['records'] or 0) + records
+            if bytes is not None:
+                statistics['bytes'] = (statistics['bytes'] or 0) + bytes
+
+# Stages of a file as a list of rows (one per stage) for the stage timing table
+def get_stage_rows(timing):
+    with timing['lock']:
+        return [{'stagename': name,
+                 'ordinalposition': position,
+                 'seconds': round(statistics['seconds'], 6),
+                 'calls': statistics['calls'],
+                 'records': statistics['records'],
+                 'bytes': statistics['bytes']}
+                for position, (name, statistics) in enumerate(timing['stages'].items(), start=1)]
+
+# This function writes stage totals and gauges in prometheus text format. The file is replaced in one go, so a scraper never reads half a file.
+def write_metrics(metrics_file):
+    with totals_lock:
+        totals = {name: dict(statistics) for name, statistics in stage_totals.items()}
+        timed_count = files_timed
+
+    lines = ['# HELP datafilestage_files_timed_total Files whose stages were timed.',
+             '# TYPE datafilestage_files_timed_total counter',
+             'datafilestage_files_timed_total {}'.format(timed_count)]
+
+    for metric, key, description in [('datafilestage_stage_seconds_total', 'seconds', 'Seconds spent in a stage.'),
+                                      ('datafilestage_stage_calls_total', 'calls', 'Times a stage was run.'),
+                                      ('datafilestage_stage_records_total', 'records', 'Records handled by a stage.'),
+                                      ('datafilestage_stage_bytes_total', 'bytes', 'Bytes handled by a stage.')]:
+        lines.append('# HELP {} {}'.format(metric, description))
+        lines.append('# TYPE {} counter'.format(metric))
+        for name, statistics in totals.items():
+            if statistics[key] is not None:
+                lines.append('{}{{stage="{}"}} {}'.format(metric, name, statistics[key]))
+
+    for metric, function in gauges.items():
+        try:
+            value = function()
+        except Exception as e:
+            logging.warning('Could not read gauge %s: %s', metric, e)
+            continue
+        lines.append('# TYPE {} gauge'.format(metric))
+        lines.append('{} {}'.format(metric, value))
+
+    temporary_file = metrics_file + '.tmp'
+    with open(temporary_file, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    os.replace(temporary_file, metrics_file)
+
+# This function starts a thread (once) that writes the metrics file every interval_seconds
+def start_metrics_writer(metrics_file, interval_seconds=15):
+    global metrics_thread
+
+    if metrics_thread is not None and metrics_thread.is_alive():
+        return
+    metrics_thread = threading.Thread(target=run_metrics_writer, name='datafilestage_metrics_writer', args=(metrics_file, interval_seconds), daemon=True)
+    metrics_thread.start()
+
+def run_metrics_writer(metrics_file, interval_seconds):
+    while True:
+        try:
+            write_metrics(metrics_file)
+        except Exception as e:
+            logging.error('An exception occurred while writing metrics file %s: %s', metrics_file, e)
+        time.sleep(interval_seconds)
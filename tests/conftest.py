@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import pytest
+import sqlalchemy
+
+ddl_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'datastagerplusddl.sql')
+
+
+# SQLite part of the DDL script, the log tables without the ATTACH (the schemas are attached by the engine)
+def get_sqlite_ddl():
+    with open(ddl_file) as file:
+        script = file.read().split('-- SQLITE')[1]
+    return '\n'.join(line for line in script.splitlines()[1:] if not line.startswith('ATTACH'))
+
+# Set up a folder as the sqlite stand-in of the repo: the main database, the _admin schema with the log tables and an empty stage schema
+def create_sqlite_folder(folder):
+    sqlite3.connect(str(folder / 'stage.db')).close()
+    conn = sqlite3.connect(str(folder / 'main.db'))
+    try:
+        conn.execute("ATTACH DATABASE '{}' AS _admin".format(folder / '_admin.db'))
+        conn.executescript(get_sqlite_ddl())
+        conn.commit()
+    finally:
+        conn.close()
+    return folder
+
+# Connection ([engine, connection string, rdms]) to a sqlite folder, other .db files of the folder are attached as schemas
+def create_sqlite_connection(folder):
+    connectionstring = 'sqlite:///{}'.format(folder / 'main.db')
+    engine = sqlalchemy.create_engine(connectionstring)
+
+    @sqlalchemy.event.listens_for(engine, 'connect')
+    def attach_schemas(dbapi_connection, connection_record):
+        for schema_file in folder.glob('*.db'):
+            if schema_file.stem != 'main':
+                dbapi_connection.execute("ATTACH DATABASE '{}' AS \"{}\"".format(schema_file, schema_file.stem))
+
+    return [engine, connectionstring, 'sqlite']
+
+@pytest.fixture
+def sqlite_connection(tmp_path):
+    connection = create_sqlite_connection(create_sqlite_folder(tmp_path))
+    yield connection
+    connection[0].dispose()
@@ -0,0 +1,52 @@
+import io
+import pandas as pd
+import datacleaning
+
+all_options = {'trim': True, 'emptytonull': True, 'scrubcontrolcharacters': True}
+
+
+# Text cells are trimmed, other cells keep their value
+def test_trim_text_column():
+    df = pd.DataFrame({'name': [' a ', 'b ', None]})
+    df, invalid_records = datacleaning.clean_dataframe(df)
+
+    assert df['name'].tolist()[:2] == ['a', 'b']
+    assert pd.isna(df['name'][2])
+    assert invalid_records == 0
+
+# A True/False column with a blank cell is read as bools and NaN (object dtype), it is left as it is
+def test_bool_column_with_blank():
+    df = pd.read_csv(io.StringIO('id,flag,name\n1,True, x\n2,,y \n3,False,z'))
+    df, invalid_records = datacleaning.clean_dataframe(df, all_options)
+
+    assert df['flag'].tolist()[0] is True
+    assert pd.isna(df['flag'][1])
+    assert df['flag'].tolist()[2] is False
+    assert df['name'].tolist() == ['x', 'y', 'z']
+    assert invalid_records == 0
+
+# Only the text cells of a mixed column are cleaned and counted
+def test_mixed_column():
+    df = pd.DataFrame({'value': pd.Series([1, ' b\x01 ', None, 2.5, ''], dtype=object)})
+    df, invalid_records = datacleaning.clean_dataframe(df, all_options)
+
+    assert df['value'].tolist()[:2] == [1, 'b']
+    assert df['value'].tolist()[3] == 2.5
+    assert pd.isna(df['value'][4])   # empty text becomes null
+    assert invalid_records == 1
+
+# Records with control characters are counted without changing the dataframe, also in columns that are not all text
+def test_count_invalid_records():
+    df = pd.DataFrame({'text': ['a\x02', 'b', 'c'],
+                       'flag': pd.Series([True, None, 'x\x7f'], dtype=object)})
+
+    assert datacleaning.count_invalid_records(df) == 2
+    assert df['text'][0] == 'a\x02'
+
+# Categories are cleaned once, categories that become the same are merged
+def test_clean_categories():
+    df = pd.DataFrame({'code': pd.Categorical([' a', 'a ', 'b', None])})
+    df, invalid_records = datacleaning.clean_dataframe(df)
+
+    assert df['code'].tolist()[:3] == ['a', 'a', 'b']
+    assert list(df['code'].cat.categories) == ['a', 'b']
@@ -0,0 +1,53 @@
+import pandas as pd
+import dataprofiler
+
+
+def get_dataframe():
+    return pd.DataFrame({'id': [1, 2, 2, 3, None],
+                         'name': ['a', 'b', 'b', 'c', 'd'],
+                         'datafilestagehk': ['x'] * 5})
+
+# Duplicate records, null counts, distinct estimates and min/max of each column, meta columns are skipped
+def test_profile_dataframe():
+    profile = dataprofiler.finish_profile(dataprofiler.profile_dataframe(get_dataframe(), skip_columns=['datafilestagehk']))
+    rows = {row['columnname']: row for row in dataprofiler.get_column_rows(profile)}
+
+    assert profile['totalrecords'] == 5
+    assert profile['duplicaterecords'] == 1
+    assert list(rows) == ['id', 'name']
+    assert rows['id']['nullcount'] == 1
+    assert rows['id']['distinctestimate'] == 3
+    assert rows['name']['distinctestimate'] == 4
+    assert rows['name']['minvalue'] == 'a' and rows['name']['maxvalue'] == 'd'
+    assert rows['name']['maxlength'] == 1
+
+# A file profiled chunk by chunk gives the same counts as profiled as a whole, also for duplicates across chunks
+def test_profile_chunks():
+    df = get_dataframe()
+    profile = dataprofiler.create_profile()
+    for start in range(0, len(df), 2):
+        dataprofiler.profile_chunk(profile, df.iloc[start:start + 2], ['datafilestagehk'])
+    profile = dataprofiler.finish_profile(profile)
+
+    assert profile['totalrecords'] == 5
+    assert profile['duplicaterecords'] == 1
+
+# Profiles of partitions merge into the profile of the whole
+def test_merge_profiles():
+    df = get_dataframe()
+    profiles = [dataprofiler.profile_dataframe(df.iloc[:3]), dataprofiler.profile_dataframe(df.iloc[3:])]
+    profile = dataprofiler.finish_profile(dataprofiler.merge_profiles(profiles))
+    rows = {row['columnname']: row for row in dataprofiler.get_column_rows(profile)}
+
+    assert profile['totalrecords'] == 5
+    assert profile['duplicaterecords'] == 1
+    assert rows['id']['nullcount'] == 1
+    assert rows['name']['maxvalue'] == 'd'
+
+# Above the hash limit the duplicate count is estimated from the row sketch
+def test_approximate_duplicates():
+    df = pd.DataFrame({'id': list(range(1000)) * 2})
+    profile = dataprofiler.finish_profile(dataprofiler.profile_dataframe(df, hash_limit=100))
+
+    assert profile['approximate']
+    assert abs(profile['duplicaterecords'] - 1000) < 50
@@ -0,0 +1,66 @@
+import datetime
+import pandas as pd
+import pytest
+import sqlalchemy
+import dbwriters
+
+
+# Target table of the round trips, in the attached stage schema
+@pytest.fixture
+def target_table(sqlite_connection):
+    with sqlite_connection[0].connect() as conn:
+        conn.exec_driver_sql('CREATE TABLE stage.sales (id BIGINT, amount FLOAT, name TEXT, sold TIMESTAMP)')
+        conn.commit()
+    return 'sales'
+
+def get_sales():
+    return pd.DataFrame({'id': [1, 2, 3],
+                         'amount': [1.5, None, 3.25],
+                         'name': ['a', None, 'c'],
+                         'sold': pd.to_datetime(['2024-01-01 10:00:00', None, '2024-01-03 12:30:00'])})
+
+def read_sales(connection):
+    with connection[0].connect() as conn:
+        return conn.execute(sqlalchemy.text('SELECT id, amount, name, sold FROM stage.sales ORDER BY id')).fetchall()
+
+# Each backend is picked by database, to_sql when bulk load is off
+def test_get_writer_backend():
+    assert dbwriters.get_writer_backend('postgres') == 'copy'
+    assert dbwriters.get_writer_backend('MSSQL') == 'mssql_tvp'
+    assert dbwriters.get_writer_backend('sqlite') == 'sqlite'
+    assert dbwriters.get_writer_backend('MSSQL', bulk_load=False) == 'to_sql'
+
+# Rows written in a transaction of the caller read back the same, missing values as NULL
+@pytest.mark.parametrize('backend', ['sqlite', 'to_sql'])
+def test_write_dataframe_round_trip(sqlite_connection, target_table, backend):
+    with sqlite_connection[0].connect() as conn:
+        conn.begin()
+        rows = dbwriters.write_dataframe(get_sales(), target_table, 'stage', conn, backend, sqlite_connection)
+        conn.commit()
+
+    assert rows == 3
+    rows = read_sales(sqlite_connection)
+    assert [row[0] for row in rows] == [1, 2, 3]
+    assert [row[1] for row in rows] == [1.5, None, 3.25]
+    assert [row[2] for row in rows] == ['a', None, 'c']
+    assert rows[1][3] is None
+    assert str(rows[2][3]).startswith('2024-01-03 12:30:00')
+
+# Nothing is kept when the caller rolls the transaction back
+def test_write_dataframe_rollback(sqlite_connection, target_table):
+    with sqlite_connection[0].connect() as conn:
+        conn.begin()
+        dbwriters.write_dataframe(get_sales(), target_table, 'stage', conn, 'sqlite', sqlite_connection)
+        conn.rollback()
+
+    assert read_sales(sqlite_connection) == []
+
+# Rows are sent in batches of batch_size, with python datetimes and None for missing values
+def test_get_row_batches(monkeypatch):
+    monkeypatch.setattr(dbwriters, 'batch_size', 2)
+    batches = list(dbwriters.get_row_batches(get_sales()))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert batches[0][1] == (2, None, None, None)
+    assert batches[0][0][3] == datetime.datetime(2024, 1, 1, 10, 0)
+    assert type(batches[0][0][3]) is datetime.datetime
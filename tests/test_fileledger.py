@@ -0,0 +1,69 @@
+import pytest
+import sqlalchemy
+import fileledger
+
+
+# Log tables in sqlite, the ledger starts empty for each test
+@pytest.fixture
+def connection(sqlite_connection, monkeypatch):
+    for name, value in [('loaded_files', set()), ('loaded_contents', set()), ('pending_ids', {}), ('high_water_mark', 0), ('last_refresh', None)]:
+        monkeypatch.setattr(fileledger, name, value)
+    return sqlite_connection
+
+# Add a log row, returns its dataprofilingid
+def add_log_row(connection, file_name, status, content_hash=None):
+    with connection[0].connect() as conn:
+        row_id = conn.execute(sqlalchemy.text("INSERT INTO _admin.datafilestagelog (datafilestagehk, schemaname, targettablename, filename, contenthash, "
+                                              "loadsuccessstatus, filecreatetime, loadstarttime) "
+                                              "VALUES ('hk', 'stage', 'sales', :file, :hash, :status, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"),
+                              {'file': file_name, 'hash': content_hash, 'status': status}).lastrowid
+        conn.commit()
+    return row_id
+
+def set_loaded(connection, row_id):
+    with connection[0].connect() as conn:
+        conn.execute(sqlalchemy.text("UPDATE _admin.datafilestagelog SET loadsuccessstatus = 1 WHERE dataprofilingid = :id"), {'id': row_id})
+        conn.commit()
+
+# Successful loads are read, by name and content
+def test_refresh_reads_loaded_files(connection):
+    add_log_row(connection, 'a.csv', 1, 'abc')
+    fileledger.refresh_ledger(connection)
+
+    assert fileledger.is_loaded('a.csv', 'SALES', connection)
+    assert fileledger.is_content_loaded('abc', 'sales', connection)
+    assert not fileledger.is_loaded('b.csv', 'sales', connection)
+
+# A row that is still loading when the mark moves past it is found once it is loaded
+def test_pending_row_loaded_later(connection):
+    pending_id = add_log_row(connection, 'slow.csv', 0)
+    add_log_row(connection, 'fast.csv', 1)
+    fileledger.refresh_ledger(connection)
+
+    assert fileledger.high_water_mark > pending_id
+    assert not fileledger.is_loaded('slow.csv', 'sales', connection)
+
+    set_loaded(connection, pending_id)
+    fileledger.refresh_ledger(connection)
+
+    assert fileledger.is_loaded('slow.csv', 'sales', connection)
+    assert fileledger.pending_ids == {}
+
+# A row still loading after pending_seconds is not read again
+def test_abandoned_row_dropped(connection, monkeypatch):
+    add_log_row(connection, 'gone.csv', 0)
+    fileledger.refresh_ledger(connection)
+    assert len(fileledger.pending_ids) == 1
+
+    monkeypatch.setattr(fileledger, 'pending_seconds', 0)
+    fileledger.refresh_ledger(connection)
+
+    assert fileledger.pending_ids == {}
+
+# A refresh asked for with max_age is skipped when the ledger was just refreshed
+def test_refresh_max_age(connection):
+    fileledger.refresh_ledger(connection)
+    add_log_row(connection, 'a.csv', 1)
+    fileledger.refresh_ledger(connection, 60)
+
+    assert ('sales', 'a.csv') not in fileledger.loaded_files
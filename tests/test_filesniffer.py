@@ -0,0 +1,57 @@
+import pytest
+import filesniffer
+
+delimiters = [',', '\t', ';', '|']
+
+
+@pytest.fixture(autouse=True)
+def empty_dialect_cache(monkeypatch):
+    monkeypatch.setattr(filesniffer, 'dialect_cache', {})
+
+def write_file(folder, name, content, encoding='utf-8'):
+    file_path = folder / name
+    file_path.write_bytes(content.encode(encoding))
+    return str(file_path)
+
+# Delimiter, header and column names of a plain csv file
+def test_sniff_csv(tmp_path):
+    file_path = write_file(tmp_path, 'a.csv', 'id,name,amount\n1,a,1.5\n2,b,2.5\n')
+    dialect = filesniffer.sniff_file(file_path, delimiters)
+
+    assert dialect['delimiter'] == ','
+    assert dialect['header']
+    assert dialect['numberofcolumns'] == 3
+    assert dialect['columnnames'] == ['id', 'name', 'amount']
+
+# Other delimiters, quoted fields with the delimiter in them
+@pytest.mark.parametrize('delimiter', [';', '|', '\t'])
+def test_sniff_delimiter(tmp_path, delimiter):
+    rows = ['id', 'name', 'amount'], ['1', '"a{}b"'.format(delimiter), '1.5'], ['2', 'c', '2.5']
+    file_path = write_file(tmp_path, 'a.txt', '\n'.join(delimiter.join(row) for row in rows) + '\n')
+    dialect = filesniffer.sniff_file(file_path, delimiters)
+
+    assert dialect['delimiter'] == delimiter
+    assert dialect['numberofcolumns'] == 3
+
+# A file without a header gets column1, column2... as column names
+def test_sniff_no_header(tmp_path):
+    file_path = write_file(tmp_path, 'a.csv', '1,a,1.5\n2,b,2.5\n3,c,3.5\n')
+    dialect = filesniffer.sniff_file(file_path, delimiters)
+
+    assert not dialect['header']
+    assert dialect['columnnames'] == ['column1', 'column2', 'column3']
+
+# Encodings from the byte order mark, utf-8 and the cp1252 fallback
+def test_sniff_encoding(tmp_path):
+    assert filesniffer.sniff_file(write_file(tmp_path, 'a.csv', '﻿id,name\n1,é\n', 'utf-8'), delimiters)['encoding'].replace('-', '').lower().startswith('utf8')
+    assert filesniffer.sniff_file(write_file(tmp_path, 'b.csv', 'id,name\n1,é\n', 'utf-16'), delimiters)['encoding'].replace('-', '').lower().startswith('utf16')
+    assert filesniffer.sniff_file(write_file(tmp_path, 'c.csv', 'id,name\n1,é\n', 'cp1252'), delimiters)['encoding'].lower() in ['cp1252', 'latin-1']
+
+# The dialect of a folder is reused for its next file, unless it does not fit that file
+def test_dialect_cache(tmp_path):
+    filesniffer.sniff_file(write_file(tmp_path, 'a.csv', 'id;name\n1;a\n'), delimiters)
+    assert filesniffer.sniff_file(write_file(tmp_path, 'b.csv', 'id;name\n2;b\n'), delimiters)['delimiter'] == ';'
+
+    dialect = filesniffer.sniff_file(write_file(tmp_path, 'c.csv', 'id|name|amount\n1|a|1.5\n'), delimiters)
+    assert dialect['delimiter'] == '|'
+    assert dialect['numberofcolumns'] == 3
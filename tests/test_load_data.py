@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+import sqlalchemy
+from tests.conftest import create_sqlite_folder, create_sqlite_connection
+
+pytest.importorskip('pyodbc', exc_type=ImportError)   # fileprocessing needs it (and its odbc driver manager) to import
+import datastagerplus
+import catalogcache
+import ddlcoordinator
+
+
+# One sqlite folder for the module, the DDL coordinator is a single thread for the process
+@pytest.fixture(scope='module')
+def connection(tmp_path_factory):
+    connection = create_sqlite_connection(create_sqlite_folder(tmp_path_factory.mktemp('sqlite')))
+    ddlcoordinator.ddl_listeners.append(catalogcache.invalidate_table)
+    ddlcoordinator.start_ddl_coordinator(connection, 1, 0)
+    yield connection
+    ddlcoordinator.ddl_listeners.remove(catalogcache.invalidate_table)
+
+def read_table(connection, table_name):
+    with connection[0].connect() as conn:
+        return conn.execute(sqlalchemy.text('SELECT * FROM stage.{} ORDER BY id'.format(table_name))).fetchall()
+
+def table_exists(connection, table_name):
+    catalogcache.invalidate_table('stage', table_name)
+    return catalogcache.query_table_exists('stage', table_name, connection)
+
+# Chunks of a streamed file
+def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+# The first file creates the target table, the next one goes through its load table
+def test_new_table_then_load_table(connection):
+    status = datastagerplus.load_data(pd.DataFrame({'id': [1, 2], 'name': ['a', 'b']}), '/drop/stage/sales/a.csv', 'sales', 'stage', connection)
+
+    assert status[0] == 0
+    assert status[1] == 'NEW.TABLE'
+    assert status[2]['totalrecords'] == 2
+    assert status[2]['loadpath'] == 'newtable'
+
+    status = datastagerplus.load_data(pd.DataFrame({'id': [3, 4], 'name': ['c', None]}), '/drop/stage/sales/b.csv', 'sales', 'stage', connection)
+
+    assert status[0] == 0
+    assert status[1] == 'stage.sales_b'
+    assert status[2]['loadpath'] == 'loadtable'
+    assert read_table(connection, 'sales') == [(1, 'a'), (2, 'b'), (3, 'c'), (4, None)]
+
+    ddlcoordinator.submit_drop('stage', 'sales_b').result()
+    assert not table_exists(connection, 'sales_b')
+
+# A file that fits the target table is appended to it directly when direct append is on
+def test_direct_append(connection):
+    datastagerplus.load_data(pd.DataFrame({'id': [1], 'name': ['a']}), '/drop/stage/orders/a.csv', 'orders', 'stage', connection)
+    status = datastagerplus.load_data(pd.DataFrame({'id': [2], 'name': ['b']}), '/drop/stage/orders/b.csv', 'orders', 'stage', connection, {'directappend': True})
+
+    assert status[0] == 0
+    assert status[1] == 'DIRECT.APPEND'
+    assert not table_exists(connection, 'orders_b')
+    assert read_table(connection, 'orders') == [(1, 'a'), (2, 'b')]
+
+# All chunks of a streamed file are written in one load
+def test_streamed_chunks(connection):
+    status = datastagerplus.load_data(stream(pd.DataFrame({'id': [1, 2]}), pd.DataFrame({'id': [3, 4]})), '/drop/stage/events/a.csv', 'events', 'stage', connection)
+
+    assert status[0] == 0
+    assert status[2]['totalrecords'] == 4
+    assert read_table(connection, 'events') == [(1,), (2,), (3,), (4,)]
+
+# A later chunk with wider types than the first one is reported (status 3) and nothing of the file is kept, so it can be loaded as a whole
+def test_widening_chunk(connection):
+    status = datastagerplus.load_data(stream(pd.DataFrame({'id': [1, 2]}), pd.DataFrame({'id': [2.5]})), '/drop/stage/readings/a.csv', 'readings', 'stage', connection)
+
+    assert status[0] == 3
+    assert not table_exists(connection, 'readings')
@@ -0,0 +1,43 @@
+import threading
+import time
+import loadscheduler
+
+
+# Wait until all queued files were handled
+def wait_for_files(scheduler):
+    while loadscheduler.get_queue_depth(scheduler) > 0:
+        time.sleep(0.01)
+
+# A table with many files gives its worker back after files_per_turn files, the files of another table are loaded in between
+def test_files_per_turn():
+    scheduler = loadscheduler.create_scheduler(max_workers=1, files_per_turn=2)
+    loaded = []
+    started = threading.Event()
+    release = threading.Event()
+
+    # First file holds the only worker until both tables are queued
+    def task(file):
+        if file == 'a0':
+            started.set()
+            release.wait()
+        loaded.append(file)
+
+    loadscheduler.submit_files(scheduler, 'a', ['a{}'.format(i) for i in range(6)], task)
+    started.wait()
+    loadscheduler.submit_files(scheduler, 'b', ['b0', 'b1'], task)
+    release.set()
+    wait_for_files(scheduler)
+    scheduler['executor'].shutdown(wait=True)
+
+    assert sorted(loaded) == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'b0', 'b1']
+    assert loaded.index('b0') < loaded.index('a5')
+
+# Files of a table are loaded by more than one worker unless loads are ordered
+def test_per_table_workers():
+    unordered = loadscheduler.create_scheduler(max_workers=4, per_table_workers=2)
+    ordered = loadscheduler.create_scheduler(max_workers=4, per_table_workers=2, ordered=True)
+
+    assert unordered['per_table_workers'] == 2
+    assert ordered['per_table_workers'] == 1
+    unordered['executor'].shutdown()
+    ordered['executor'].shutdown()